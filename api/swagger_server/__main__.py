@@ -1,20 +1,43 @@
 #!/usr/bin/env python3
 
+import os
+
 import connexion
 from swagger_server import encoder
-from swagger_server.managers.mongodbmanager import MongoDBManager
-from swagger_server.managers.cachemanager import CacheManager
-from swagger_server.managers.workfloweventhandler import WorkflowEventHandler
+from swagger_server.managers.serviceregistry import ServiceUnavailable
+from swagger_server.services import services, service_unavailable
 
-cache_manager = CacheManager()
+# The service runs as one process: the event queue, dedupe and readiness state live in its memory and
+# the threads of that process share them. "dev" runs the Flask development server with the reloader.
+API_SERVER = os.getenv("API_SERVER", "waitress")
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_THREADS = int(os.getenv("API_THREADS", "16"))
 
-workflow_event_handler = WorkflowEventHandler(cache_manager)
 
-def main():
+def create_app():
+    """Creates the connexion app serving the API."""
     app = connexion.App(__name__, specification_dir='./swagger/')
     app.app.json_encoder = encoder.JSONEncoder
     app.add_api('swagger.yaml', arguments={'title': 'Replication API'}, pythonic_params=True)
-    app.run(port=8080, debug=True)
+    app.add_error_handler(ServiceUnavailable, service_unavailable)
+    return app
+
+
+def main():
+    # The reloader of "dev" serves from a child process; only that one needs the services
+    if API_SERVER != "dev" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        services.warm_up()
+    app = create_app()
+
+    if API_SERVER == "dev":
+        app.run(port=API_PORT, debug=True)
+        return
+
+    # Requests are handled by a pool of API_THREADS threads; see the README for sizing
+    from waitress import serve
+    print(f"[INFO] Serving on {API_HOST}:{API_PORT} with {API_THREADS} threads")
+    serve(app.app, host=API_HOST, port=API_PORT, threads=API_THREADS)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,58 @@
+from flask import jsonify
+from swagger_server.services import services
+from swagger_server.managers.cachemanager import STAGING
+
+
+def cache_reconcile_post():  # noqa: E501
+    """
+    Requests a background reconciliation of every known primary folder.
+
+    Returns:
+        202 - The reconciliation was requested
+    """
+    services.get().cache_reconciler.trigger()
+    return jsonify({"message": "Cache reconciliation requested"}), 202
+
+
+def cache_reconcile_get():  # noqa: E501
+    """
+    Returns the known primary folders and when they were last reconciled.
+
+    Returns:
+        200 - The reconciliation status
+    """
+    return jsonify(services.get().cache_reconciler.get_status()), 200
+
+
+def cache_stats_get():  # noqa: E501
+    """
+    Returns the cache statistics.
+
+    Returns:
+        200 - The cache statistics
+        500 - If the statistics could not be read
+    """
+    cache_manager = services.get().cache_manager
+    try:
+        return jsonify(cache_manager.get_stats()), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to read cache statistics: {str(e)}"}), 500
+
+
+def cache_ready_get(files):  # noqa: E501
+    """
+    Returns whether files can be read, so a workflow step can start as soon as its own inputs have arrived.
+
+    Args:
+        files (list): The files to check.
+
+    Returns:
+        200 - The state of every file ("ready", "staging" or "missing") and whether none is still staging
+        500 - If the state could not be read
+    """
+    cache_manager = services.get().cache_manager
+    try:
+        readiness = cache_manager.get_readiness(files)
+    except Exception as e:
+        return jsonify({"error": f"Failed to read file readiness: {str(e)}"}), 500
+    return jsonify({"files": readiness, "ready": STAGING not in readiness.values()}), 200
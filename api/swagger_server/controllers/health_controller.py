@@ -1,23 +1,56 @@
 from flask import jsonify
-import subprocess
+from swagger_server.services import services
+from swagger_server.managers.healthprober import HEALTHY, DEGRADED
+from swagger_server.managers.serviceregistry import READY
+
 
 def health_check():  # noqa: E501
     """
-    Health check endpoint for the replication service.
+    Health check endpoint for the replication service, answered like `health_ready_get`.
 
     Returns:
         200 - If the service is healthy
-        503 - If the service is unhealthy
+        503 - If the service is unhealthy, or still "warming" up (connecting to MongoDB and the remotes)
+    """
+    return health_ready_get()
+
+
+def health_live_get():  # noqa: E501
     """
-    try:
-        # Perform a basic system health check (modify this if needed)
-        rclone_status = subprocess.run(["rclone", "version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        rclone_healthy = rclone_status.returncode == 0
-
-        if rclone_healthy:
-            return jsonify({"status": "healthy"}), 200
-        else:
-            return jsonify({"status": "unhealthy", "error": "Rclone not working"}), 503
-
-    except Exception as e:
-        return jsonify({"status": "unhealthy", "error": str(e)}), 503
+    Liveness: whether the process is working. Failing dependencies do not make it fail, since restarting
+    the service would not fix them; only a health prober that stopped probing does.
+
+    Returns:
+        200 - The process is alive, also while it is still starting
+        503 - The health prober has not finished a probe for several intervals
+    """
+    startup = services.get_status()
+    if startup["state"] != READY:
+        return jsonify({"status": startup["state"], "startup": startup}), 200
+
+    prober = services.get().health_prober
+    snapshot = prober.get_snapshot()
+    if prober.is_stale():
+        return jsonify({"status": "stale", "checked_at": snapshot["checked_at"],
+                        "age_seconds": snapshot["age_seconds"]}), 503
+    return jsonify({"status": "alive", "checked_at": snapshot["checked_at"],
+                    "age_seconds": snapshot["age_seconds"]}), 200
+
+
+def health_ready_get():  # noqa: E501
+    """
+    Readiness: the latest results of the background health prober, with the latency of every dependency.
+    Nothing is probed while answering.
+
+    Returns:
+        200 - rclone and MongoDB work ("healthy", or "degraded" if a remote cannot be reached)
+        503 - The service is still starting, rclone or MongoDB do not work, or the results are outdated
+    """
+    startup = services.get_status()
+    if startup["state"] != READY:
+        return jsonify({"status": startup["state"], "error": startup["error"], "startup": startup}), 503
+
+    prober = services.get().health_prober
+    snapshot = prober.get_snapshot()
+    ready = snapshot["status"] in (HEALTHY, DEGRADED) and not prober.is_stale()
+    return jsonify(snapshot), 200 if ready else 503
@@ -9,13 +9,18 @@ from swagger_server.models.rclone_sync_request import RcloneSyncRequest
 from swagger_server.models.rclone_folder_request import RcloneFolderRequest
 
 from ..managers.rclonemanager import RcloneManager
+from ..managers.transferjobmanager import TransferQueueFull
+from swagger_server.services import services
 
-rclone = RcloneManager()
+
+def rclone() -> RcloneManager:
+    """The RcloneManager of the cache, created with the other services instead of on import."""
+    return services.get().cache_manager.rclone_manager
 
 
 def rclone_check_get(path, file=""):
     """Check if a file or directory exists in Rclone remote storage."""
-    success = rclone.check_data_exists(path, file)
+    success = rclone().check_data_exists(path, file)
     return jsonify({
         "message": f"'{path}':'{file}' exists" if success else f"'{path}':'{file}' does not exist'"
     }), 200 if success else 404
@@ -30,8 +35,8 @@ def rclone_copy_post():
     if not body.files:
         return jsonify({"error": "No files specified for copying"}), 400
 
-    success, message = rclone.copy_files(body.source, body.destination, body.parallel_files, body.files)
-    return jsonify({"message": message} if success else {"error": message}), 200 if success else 500
+    return submit_transfer("copy", body.source, body.destination, files=body.files,
+                           parallel_files=body.parallel_files)
 
 
 def rclone_sync_post():
@@ -40,13 +45,28 @@ def rclone_sync_post():
     if error:
         return error
 
-    success, message = rclone.sync_folders(body.source, body.destination, body.parallel_files, body.folders)
-    return jsonify({"message": message} if success else {"error": message}), 200 if success else 500
+    return submit_transfer("sync", body.source, body.destination, folders=body.folders,
+                           parallel_files=body.parallel_files)
+
+
+def submit_transfer(operation, source, destination, files=None, folders=None, parallel_files=None):
+    """Queues a transfer job and returns 202 with its ID, or 429 when too many jobs are queued."""
+    try:
+        job = services.get().transfer_job_manager.submit(operation, source, destination, files=files,
+                                                         folders=folders, parallel_files=parallel_files or 1)
+    except TransferQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+
+    return jsonify({
+        "message": f"Transfer job {job.id} queued",
+        "job_id": job.id,
+        "status_url": f"/transfers/{job.id}"
+    }), 202
 
 
 def rclone_get_endpoint_alias_get(endpoint):
     """Get Rclone remote alias from URL."""
-    alias = rclone.get_endpoint_name(endpoint)
+    alias = rclone().get_endpoint_name(endpoint)
 
     if alias:
         return jsonify({"alias": alias}), 200
@@ -59,7 +79,7 @@ def rclone_configure_post():
     if error:
         return error
 
-    success, message = rclone.configure_remote(
+    success, message = rclone().configure_remote(
         config_request.name, config_request.type, config_request.access_key,
         config_request.secret_key, config_request.endpoint, config_request.remote, config_request.additional_options
     )
@@ -68,7 +88,7 @@ def rclone_configure_post():
 
 def rclone_configure_get():
     """Retrieves configured Rclone remotes."""
-    success, config = rclone.get_remote()
+    success, config = rclone().get_remote()
 
     if success and config:
         try:
@@ -80,7 +100,7 @@ def rclone_configure_get():
 
 def rclone_configure_delete(remote_name):
     """Deletes an Rclone remote."""
-    success, message = rclone.delete_remote(remote_name)
+    success, message = rclone().delete_remote(remote_name)
 
     if success:
         return jsonify({"message": message}), 200
@@ -94,7 +114,7 @@ def rclone_create_folder():
     if error:
         return error
 
-    success, message = rclone.create_folder(folder_request.remote, folder_request.folder)
+    success, message = rclone().create_folder(folder_request.remote, folder_request.folder)
     return jsonify({"message": message} if success else {"error": message}), 201 if success else 500
 
 
@@ -105,7 +125,7 @@ def rclone_delete_folder():
     if error:
         return error
 
-    success, message = rclone.delete_folder(folder_request.remote, folder_request.folder)
+    success, message = rclone().delete_folder(folder_request.remote, folder_request.folder)
     return jsonify({"message": message} if success else {"error": message}), 200 if success else 500
 
 def rclone_list_folders():
@@ -115,7 +135,7 @@ def rclone_list_folders():
     if not remote:
         return jsonify({"error": "Remote name is required"}), 400
 
-    success, output = rclone.list_folders(remote)
+    success, output = rclone().list_folders(remote)
 
     if success:
         return jsonify({"folders": output}), 200
@@ -123,7 +143,7 @@ def rclone_list_folders():
 
 def rclone_list_files(remote, folder):
     """List files in a Rclone remote folder."""
-    success, files = rclone.list_files(remote, folder)
+    success, files = rclone().list_files(remote, folder)
     return jsonify(files) if success else jsonify({"error": files}), 200 if success else 500
 
 
@@ -143,7 +163,7 @@ def rclone_upload_file():
     file.save(local_path)
 
     # Now, success and message are properly handled
-    success, message = rclone.upload_file(remote, folder, local_path)
+    success, message = rclone().upload_file(remote, folder, local_path)
 
     os.remove(local_path)
 
@@ -152,7 +172,7 @@ def rclone_upload_file():
 
 def rclone_delete_file(remote, file_path):
     """Delete a file from a Rclone remote."""
-    success, message = rclone.delete_file(remote, file_path)
+    success, message = rclone().delete_file(remote, file_path)
     return jsonify({"message": message} if success else {"error": message}), 200 if success else 500
 
 
@@ -0,0 +1,63 @@
+from flask import jsonify
+from swagger_server.services import services
+from swagger_server.managers.transferjobmanager import RUNNING
+
+
+def transfer_list_get(state=None):  # noqa: E501
+    """
+    Lists the known transfer jobs.
+
+    Args:
+        state (str, optional): Only list jobs in this state (queued, running, succeeded, failed, cancelled).
+
+    Returns:
+        200 - The job statuses
+    """
+    return jsonify({"jobs": services.get().transfer_job_manager.list_jobs(state)}), 200
+
+
+def transfer_metrics_get():  # noqa: E501
+    """
+    Returns the throughput metrics of the finished transfers per endpoint and route, and the
+    combined rate of the running jobs.
+
+    Returns:
+        200 - The transfer metrics
+    """
+    transfer_job_manager = services.get().transfer_job_manager
+    running = transfer_job_manager.list_jobs(RUNNING)
+    metrics = transfer_job_manager.rclone_manager.get_transfer_metrics()
+    metrics["running"] = {"jobs": len(running), "speed": sum(job["speed"] or 0 for job in running)}
+    return jsonify(metrics), 200
+
+
+def transfer_status_get(job_id):  # noqa: E501
+    """
+    Returns the status of a transfer job: bytes done, rate, ETA and the state of every file.
+
+    Returns:
+        200 - The job status
+        404 - If the job is unknown
+    """
+    job = services.get().transfer_job_manager.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Transfer job '{job_id}' not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+def transfer_cancel_post(job_id):  # noqa: E501
+    """
+    Cancels a queued or running transfer job.
+
+    Returns:
+        202 - The job is being cancelled
+        404 - If the job is unknown
+        409 - If the job has already finished
+    """
+    transfer_job_manager = services.get().transfer_job_manager
+    job = transfer_job_manager.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Transfer job '{job_id}' not found"}), 404
+    if not transfer_job_manager.cancel(job_id):
+        return jsonify({"error": f"Transfer job '{job_id}' has already {job.state}"}), 409
+    return jsonify({"message": f"Transfer job '{job_id}' is being cancelled"}), 202
@@ -2,12 +2,46 @@ import connexion
 from flask import jsonify, request
 from swagger_server.models.workflow_event import WorkflowEvent  # noqa: E501
 from ..managers.workfloweventhandler import WorkflowEventHandler
-from swagger_server.__main__ import workflow_event_handler
+from swagger_server.services import services, service_unavailable
+from swagger_server.managers.eventqueue import EventQueueFull, EventQueueClosed
+from swagger_server.managers.readinesstracker import TooManyWaiters
+from swagger_server.managers.serviceregistry import ServiceUnavailable
 
 import json
 import yaml
 import base64
 
+def accepted_or_handled(job, message):
+    """Returns 202 with the transfer job ID when files are still being copied, 200 otherwise."""
+    if job is None:
+        return jsonify({"message": message}), 200
+    return jsonify({"message": f"{message}; files are being copied", "job_id": job.id}), 202
+
+
+def queue_or_handle(workflow_json, description):
+    """
+    Queues a workflow event and returns 202 with its tracking ID at once, or 429/503 if the queue
+    cannot take it. Without a queue the event is handled inline (see `accepted_or_handled`).
+    While the service is still starting, returns 503 so the sender retries the event.
+    """
+    try:
+        current = services.get()
+    except ServiceUnavailable as e:
+        return service_unavailable(e)
+    event_queue = current.event_queue
+    if event_queue is None:
+        job = current.workflow_event_handler.handle_workflow_event(workflow_json)
+        return accepted_or_handled(job, f"{description} handled successfully")
+
+    try:
+        task = event_queue.submit(workflow_json)
+    except EventQueueFull as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+    except EventQueueClosed as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"message": f"{description} queued", "event_id": task.id}), 202
+
+
 def workflow_event_handler_post():  # noqa: E501
     """Handle a workflow event"""
 
@@ -41,8 +75,7 @@ def workflow_event_handler_post():  # noqa: E501
         print(f"\n--- Handling event type: {event_type} ---")
 
         try:
-            workflow_event_handler.handle_workflow_event(workflow_event)
-            return jsonify({"message": f"Workflow {event_type} event handled successfully"}), 200
+            return queue_or_handle(workflow_event, f"Workflow {event_type} event")
         except Exception as e:
             return jsonify({"error": f"Failed to handle {event_type} workflow event: {str(e)}"}), 500
 
@@ -74,8 +107,7 @@ def workflow_event_handler_post():  # noqa: E501
 
                 # Pass decoded data to handler
                 try:
-                    workflow_event_handler.handle_workflow_event(decoded_data_json)
-                    return jsonify({"message": "Base64 decoded workflow event handled successfully"}), 200
+                    return queue_or_handle(decoded_data_json, "Base64 decoded workflow event")
                 except Exception as e:
                     return jsonify({"error": f"Failed to handle decoded workflow event: {str(e)}"}), 500
 
@@ -84,10 +116,70 @@ def workflow_event_handler_post():  # noqa: E501
 
         # Case 2.2: No `data` field, pass workflow_submission directly
         try:
-            workflow_event_handler.handle_workflow_event(workflow_submission)
-            return jsonify({"message": "Workflow submission handled successfully"}), 200
+            return queue_or_handle(workflow_submission, "Workflow submission")
         except Exception as e:
             return jsonify({"error": f"Failed to handle workflow submission: {str(e)}"}), 500
 
     # Fallback: Unrecognized structure
     return jsonify({"error": "Unsupported workflow event format"}), 400
+
+
+def workflow_ready_get(uid, files=None, timeout=30):  # noqa: E501
+    """
+    Waits until the input files of a workflow are on the primary endpoint (long poll).
+
+    Args:
+        uid (str): The workflow uid (`metadata.uid`).
+        files (list, optional): Only wait for these files instead of all files of the workflow.
+        timeout (float): Seconds to wait at most.
+
+    Returns:
+        200 - Whether the files are ready, the state of every file ("ready", "staging" or "missing") and
+              whether an event of the workflow is still to be handled ("pending"); "ready" is false if
+              the timeout passed first
+        404 - If neither files nor a queued event are known for the workflow
+        429 - If too many requests are already waiting
+    """
+    readiness_tracker = services.get().readiness_tracker
+    try:
+        result = readiness_tracker.wait(uid, files or None, timeout)
+    except TooManyWaiters as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+    if result is None:
+        return jsonify({"error": f"No files known for workflow '{uid}'"}), 404
+
+    ready, readiness, pending = result
+    return jsonify({"uid": uid, "ready": ready, "files": readiness, "pending": pending}), 200
+
+
+def workflow_event_stats_get():  # noqa: E501
+    """
+    Returns how many workflow events were handled, how many were skipped as repeated or unchanged,
+    how many were merged with other events of the same workflow and the state of the event queue.
+
+    Returns:
+        200 - The event statistics
+    """
+    current = services.get()
+    event_deduplicator, event_queue, event_coalescer = \
+        current.event_deduplicator, current.event_queue, current.event_coalescer
+    stats = dict(event_deduplicator.get_stats(), enabled=True) if event_deduplicator is not None else {"enabled": False}
+    stats["queue"] = dict(event_queue.get_stats(), enabled=True) if event_queue is not None else {"enabled": False}
+    stats["coalescing"] = dict(event_coalescer.get_stats(), enabled=True) if event_coalescer is not None \
+        else {"enabled": False}
+    return jsonify(stats), 200
+
+
+def workflow_event_get(event_id):  # noqa: E501
+    """
+    Returns the status of a queued workflow event.
+
+    Returns:
+        200 - The event status, with the ID of the transfer job staging its files once it has been handled
+        404 - If the event is unknown
+    """
+    event_queue = services.get().event_queue
+    task = event_queue.get_task(event_id) if event_queue is not None else None
+    if task is None:
+        return jsonify({"error": f"Workflow event '{event_id}' not found"}), 404
+    return jsonify(task.to_dict()), 200
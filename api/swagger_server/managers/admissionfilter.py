@@ -0,0 +1,107 @@
+import hashlib
+import threading
+
+
+class CountMinSketch:
+    """
+    Count-min sketch with small saturating counters and periodic halving.
+
+    Counters are kept in a single bytearray (`depth` rows of `width` counters, each capped
+    at 15), so the default 4 x 4096 sketch takes 16 KB regardless of the number of files.
+    After `sample_size` increments every counter is halved, so estimates reflect recent
+    popularity rather than all-time counts.
+    """
+
+    MAX_COUNT = 15
+
+    def __init__(self, width=4096, depth=4, sample_size=None, counters=None, additions=0):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or 10 * width
+        self.counters = bytearray(counters) if counters else bytearray(width * depth)
+        self.additions = additions
+
+        if len(self.counters) != width * depth:
+            raise ValueError("Counter data does not match the sketch dimensions")
+
+    def _indexes(self, key: str):
+        """Yields the counter index of `key` in every row (double hashing)."""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for row in range(self.depth):
+            yield row * self.width + (h1 + row * h2) % self.width
+
+    def increment(self, key: str) -> None:
+        """Counts one occurrence of `key` (conservative update: only the minimal counters grow)."""
+        indexes = list(self._indexes(key))
+        minimum = min(self.counters[i] for i in indexes)
+        if minimum < self.MAX_COUNT:
+            for i in indexes:
+                if self.counters[i] == minimum:
+                    self.counters[i] += 1
+
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._halve()
+
+    def estimate(self, key: str) -> int:
+        """Returns the estimated recent frequency of `key`."""
+        return min(self.counters[i] for i in self._indexes(key))
+
+    def _halve(self):
+        """Ages all counts by halving them."""
+        self.counters = bytearray(count >> 1 for count in self.counters)
+        self.additions //= 2
+
+    def to_state(self) -> dict:
+        """Returns a compact representation for the state store."""
+        return {"width": self.width, "depth": self.depth, "sample_size": self.sample_size,
+                "counters": bytes(self.counters), "additions": self.additions}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "CountMinSketch":
+        """Restores a sketch from `to_state` output."""
+        return cls(state["width"], state["depth"], state.get("sample_size"),
+                   state.get("counters"), state.get("additions", 0))
+
+
+class AdmissionFilter:
+    """
+    TinyLFU-style admission filter.
+
+    Every requested file is counted in a count-min sketch. When admitting a file would evict
+    other entries, the file is only admitted if its estimated frequency is at least that of
+    every victim. A large file that is read once therefore cannot push out files that are
+    requested more often.
+    """
+
+    def __init__(self, sketch: CountMinSketch = None):
+        self.sketch = sketch or CountMinSketch()
+        self._lock = threading.Lock()
+
+    def record(self, file_names) -> None:
+        """Counts a request for each of the given files."""
+        with self._lock:
+            for file_name in file_names:
+                self.sketch.increment(file_name)
+
+    def admit(self, candidate: str, victims) -> bool:
+        """
+        Decides whether `candidate` may replace `victims`.
+
+        Args:
+            candidate (str): The file to admit.
+            victims (list): Entries (with `file_name`) that would be evicted for it.
+
+        Returns:
+            bool: True if the candidate is at least as popular as each victim.
+        """
+        with self._lock:
+            candidate_frequency = self.sketch.estimate(candidate)
+            return all(self.sketch.estimate(victim["file_name"]) <= candidate_frequency for victim in victims)
+
+    def get_state(self) -> dict:
+        """Returns the sketch state to persist."""
+        with self._lock:
+            return self.sketch.to_state()
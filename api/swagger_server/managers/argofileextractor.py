@@ -25,7 +25,7 @@ def parse_argo_workflow(data):
     Parses an Argo workflow from a JSON or YAML string/dictionary.
 
     :param data: JSON/YAML string or dictionary.
-    :return: Extracted workflow details including unique ID, endpoints, files, event type, status, and folders.
+    :return: Extracted workflow details including unique ID, resource version, endpoints, files, event type, status, and folders.
     """
     try:
         data = clean_yaml_input(data)
@@ -43,6 +43,7 @@ def parse_argo_workflow(data):
         workflow_data = data.get("body", data)
 
         unique_id = workflow_data.get('metadata', {}).get('uid', None)
+        resource_version = workflow_data.get('metadata', {}).get('resourceVersion', None)
 
         files = []
         primary_endpoint = None
@@ -111,6 +112,7 @@ def parse_argo_workflow(data):
 
         return {
             'unique_id': unique_id,
+            'resource_version': resource_version,
             'event_type': event_type,
             'primary_endpoint': primary_endpoint,
             'secondary_endpoint': secondary_endpoint,
@@ -1,18 +1,46 @@
+import atexit
+import threading
 import time
 
 from .rclonemanager import RcloneManager
 from .mongodbmanager import MongoDBManager
 from .awssecretsmanager import get_aws_secret
+from .admissionfilter import AdmissionFilter, CountMinSketch
+from .evictionpolicy import create_eviction_policy
+from .prefetchmanager import PrefetchManager
+from .stagingcontext import StagingContext
+from .transferjobmanager import TransferQueueFull
+from .transfertuner import TransferTuner, split_into_windows
 from swagger_server.settings.settings_reader import SettingsReader
 
-from collections import OrderedDict
-from pymongo import MongoClient
+from pymongo import ASCENDING, UpdateOne
 from typing import Optional, Callable
 
+# Collection holding one document per cached file; the meta document (capacity/usage) stays in "cacheState".
+ENTRY_COLLECTION = "cacheEntries"
+
+# Settings section with per-cache options (keyed by cache id); it does not describe an Rclone remote.
+CACHE_SETTINGS_SECTION = "caches"
+
+# Entry fields needed by the eviction policies when an entry is accessed
+ENTRY_PROJECTION = {"file_name": 1, "size": 1, "hits": 1, "segment": 1, "priority": 1, "inserted_at": 1,
+                    "speculative": 1, "location": 1}
+
+# Readiness of a file on the primary endpoint, as reported by `get_readiness`
+READY = "ready"
+STAGING = "staging"
+MISSING = "missing"
+
+# Subtracted from the priority of prefetched entries so they are evicted before any requested file
+SPECULATIVE_PRIORITY_OFFSET = 1e12
+
+# Entries added this many seconds before a reconciliation listing may be missing from it and are kept
+RECONCILE_GRACE_PERIOD = 60
+
 
 class CacheManager:
     def __init__(self, eviction_callback: Optional[Callable[[str, int], None]] = None,
-                 settings_file='replication_settings.json.enc'):
+                 settings_file='replication_settings.json.enc', eviction_policy: Optional[str] = None):
         """
         Initialize the CacheManager with required primary and secondary storage names.
 
@@ -20,15 +48,27 @@ class CacheManager:
             primary (str): The primary storage location.
             secondary (str): The secondary storage location.
             eviction_callback (Optional[Callable[[str, int], None]]): Callback for evictions.
+            eviction_policy (Optional[str]): Eviction policy ("lru", "lfu", "gdsf" or "2q"). Overrides
+                the `eviction_policy` of this cache in the "caches" settings section.
         """
         self.document_id = "LRUCache"
         self.eviction_callback = eviction_callback
-        self.primary_endpoint = None
-        self.primary_folder = None
-        self.secondary_endpoint = None
-        self.secondary_folder = None
-        self.files = None
+        self.transfer_job_manager = None  # Set to run the Step 3 copies as background transfer jobs
+        self.readiness_tracker = None  # Set to let workflow steps wait for their files (see ReadinessTracker)
         self.initialized = False
+        self._last_stale_pin_sweep = 0
+        self._pins_refreshed = {}  # Workflow uid -> time its pins were last renewed
+        self._pin_lock = threading.Lock()
+
+        # Buffered touches (file name -> access time, hit count, entry), written back as one bulk update
+        self._pending_touches = {}
+        self._touch_lock = threading.Lock()
+        self._last_touch_flush = time.time()
+        self.touch_flush_interval = 5  # seconds
+        self.max_pending_touches = 1000
+
+        # Serializes admissions, so concurrent passes cannot both claim the same free space or victims
+        self._index_lock = threading.RLock()
 
         # Retrieve the decryption key.
         self.decryption_key = get_aws_secret("decryption_secret")["decryption-key"]
@@ -36,8 +76,10 @@ class CacheManager:
         self.settings_reader = SettingsReader(settings_file, self.decryption_key)
         self.rclone_manager = RcloneManager()
         self.mongoDB_manager = MongoDBManager()
+        self.entries = self.mongoDB_manager.get_collection(ENTRY_COLLECTION)
 
         self.configure_remotes_from_settings()
+        self.cache_settings = self.settings_reader.settings.get(CACHE_SETTINGS_SECTION, {}).get(self.document_id, {})
 
         # Ensure the cache document exists, if not present, create a default one
         cache_doc = self.mongoDB_manager.collection.find_one({"_id": self.document_id})
@@ -45,20 +87,50 @@ class CacheManager:
             self.mongoDB_manager.collection.insert_one({
                 "_id": self.document_id,
                 "capacity_bytes": 1000,
-                "current_bytes": 0,
-                "files": []
+                "current_bytes": 0
             })
 
+        self._ensure_indexes()
+        self._migrate_legacy_state()
+        self._load_eviction_policy(eviction_policy or self.cache_settings.get("eviction_policy", "lru"),
+                                   cache_doc or {})
+
+        # Companion files of recurring file sets are staged speculatively into spare capacity
+        prefetch_settings = dict(self.cache_settings.get("prefetch", {}))
+        self.prefetch_manager = None
+        if prefetch_settings.pop("enabled", True):
+            self.prefetch_manager = PrefetchManager(self.mongoDB_manager, **prefetch_settings)
+
+        # Frequency-based admission keeps one-off large files from flushing popular ones
+        self.admission_filter = None
+        self._last_admission_save = time.time()
+        admission_settings = dict(self.cache_settings.get("admission", {}))
+        if admission_settings.pop("enabled", True):
+            self.admission_filter = AdmissionFilter(self._load_admission_sketch(cache_doc or {}, admission_settings))
+
+        # rclone settings are chosen per copy from the sizes of the files; "transfers"/"checkers" apply without tuning
+        tuning_settings = dict(self.cache_settings.get("tuning", {}))
+        self.transfer_tuner = TransferTuner(**tuning_settings) if tuning_settings.pop("enabled", True) else None
+
+        # Pins not renewed by an event for this long are considered leaked (e.g. a missed terminal event)
+        self.pin_timeout = self.cache_settings.get("pin_timeout", 12 * 60 * 60)  # seconds
+
         # For now, assume a static cache size of 
         self.capacity = 1000000000  # 1 GB
         self.set_capacity_bytes(self.capacity)
 
+        # Make sure buffered state is not lost when the process exits
+        atexit.register(self.shutdown)
+
     def configure_remotes_from_settings(self):
         """
         Reads settings and configures Rclone remotes dynamically.
         """
         # Loop through each remote in settings
         for remote_name, config in self.settings_reader.settings.items():
+            if remote_name == CACHE_SETTINGS_SECTION:
+                continue
+
             # Mandatory fields
             remote_type = config.get('type')
             access_key = config.get('access_key_id')
@@ -92,175 +164,582 @@ class CacheManager:
 
             print(f"Remote '{remote_name}' configured!")
 
-    def set_primary_endpoint(self, primary):
-        """Updates the primary storage endpoint."""
-        self.primary_endpoint = primary
-
-    def set_secondary_endpoint(self, secondary):
-        """Updates the secondary storage endpoint."""
-        self.secondary_endpoint = secondary
-
-    def set_primary_folder(self, primary):
-        """Updates the primary storage folder."""
-        self.primary_folder = primary
-
-    def set_secondary_folder(self, secondary):
-        """Updates the secondary storage folder."""
-        self.secondary_folder = secondary
+    def sync_cache(self, primary_endpoint: str, primary_folder: str):
+        """
+        Synchronize the cache with the remote storage.
 
-    def set_files(self, files):
-        """Updates the list of files to be handled."""
-        self.files = files
+        This lists the whole primary folder, so it is run by the CacheReconciler in the
+        background rather than on the workflow event path.
 
-    def sync_cache(self):
-        """Synchronize the cache with the remote storage."""
-        _, remote_files = self.rclone_manager.list_files(self.primary_endpoint + self.primary_folder)
+        Args:
+            primary_endpoint (str): Primary endpoint to reconcile.
+            primary_folder (str): Primary folder to reconcile.
+        """
+        listed_at = time.time()
+        _, remote_files = self.rclone_manager.list_files(primary_endpoint + primary_folder)
 
         print(f"Remote files: {remote_files}")
 
         remote_file_set = {file_info["file_name"] for file_info in remote_files}
 
-        # Compare remote files with current cache and add any missing files
+        # Compare remote files with current cache and add any missing files; reconciling is not an access
+        cached = self._find_cached([f"/{file_info['file_name']}" for file_info in remote_files])
+        evicted = []
         for file_info in remote_files:
             name = file_info["file_name"]
             file_size = file_info["size"]
 
             # Check if file already exists in cache, add it otherwise
-            if self.get_file(f"/{name}") is None:
-                self.add_file(f"/{name}", file_size)
-
-        # Compare current cache with remote files and remove files that are no longer on the remote
-        cache_files = self.get_cached_file_names()
-        print(f"cached files: {cache_files}")
-
-        for cached_file in cache_files:
+            if f"/{name}" not in cached:
+                self.add_file(f"/{name}", file_size, location=primary_endpoint + primary_folder, evicted=evicted)
+
+        # Compare current cache with remote files and remove files that are no longer on the remote.
+        # Entries that are still being copied, pinned or just added are missing from the listing only because
+        # their copy has not finished; the conditions are part of the delete, so a concurrent pass is respected.
+        evictable = {"ready": {"$ne": False}, "pins.0": {"$exists": False},
+                "inserted_at": {"$not": {"$gt": listed_at - RECONCILE_GRACE_PERIOD}}}
+        for entry in self.entries.find({"cache_id": self.document_id}, {"file_name": 1}):
+            cached_file = entry["file_name"]
             # Remove leading slash to match remote file naming
-            clean_cached_file = cached_file.lstrip("/")
+            if cached_file.lstrip("/") not in remote_file_set:
+                if self._evict_matching(dict(self._entry_filter(cached_file), **evictable)):
+                    print(f"Evicting file no longer on remote: {cached_file}")
 
-            if clean_cached_file not in remote_file_set:
-                print(f"Evicting file no longer on remote: {cached_file}")
-                self.evict_file(cached_file)
+        # Files evicted to make room for untracked remote files are removed from the primary as well
+        self._delete_evicted_files(evicted, primary_endpoint + primary_folder)
 
-        _, used_storage = self.rclone_manager.get_remote_used_storage(self.primary_endpoint, self.primary_folder)
-        self.set_current_bytes(used_storage)
+        self._correct_current_bytes()
+        self.flush_access_log()
 
         print("Cache synchronization complete.")
 
-    def start(self):
+    def start(self, context: StagingContext):
         """
-        Initiates the cache synchronization process:
+        Initiates the cache synchronization process for one workflow event:
         1. Requests missing files.
         2. Updates the cache with available files.
-        3. Removes extra files in primary storage that are not in cache.
+        3. Removes the files evicted by this pass from primary storage.
         4. Syncs cache with primary storage.
+        5. Stages predicted companion files into spare capacity.
+
+        Only the requested files and their eviction victims are handled here; untracked or
+        vanished files on the primary are picked up by the background reconciliation (`sync_cache`).
+        Passes for different events may run at the same time; everything specific to the event
+        comes from its context.
+
+        Args:
+            context (StagingContext): The endpoints, folders, files and workflow uid of the event.
+
+        Returns:
+            TransferJob or None: The job copying the files when a `transfer_job_manager` is set;
+            otherwise the files are copied before this returns.
         """
 
         # Step 1: Request missing files
-        files_to_transfer = self.rclone_manager.get_files_to_transfer(self.primary_endpoint + self.primary_folder, self.files)
+        # With verify_transfers, primary copies whose size (or, with verify_modtime, age) differs
+        # from the secondary copy are transferred again
+        verify = self.cache_settings.get("verify_transfers", False)
+        files = list(context.files)
+        files_to_transfer = self.rclone_manager.get_files_to_transfer(
+            context.primary_path, files, compare_with=context.secondary_path if verify else None,
+            compare_modtime=self.cache_settings.get("verify_modtime", False)
+        )
 
         print(f"files to transfer {files_to_transfer}")        
 
-        for file in files_to_transfer:
-            file_size_success, file_size = self.rclone_manager.list_files(self.secondary_endpoint+self.secondary_folder, file)
+        # Pin what is already cached before anything is added, so this pass cannot evict it
+        if context.workflow_uid:
+            self.release_stale_pins()
+            self.pin_files(context.workflow_uid, files)
+            if self.readiness_tracker is not None:
+                self.readiness_tracker.register(context.workflow_uid, files)
+
+        if self.admission_filter:
+            self.admission_filter.record(files)
+
+        # One lookup for all requested files; this also records an access for every cached one
+        cached = self.get_files(files)
+        hits = [file for file in files if file not in files_to_transfer]
+        miss_bytes = 0
+        files_to_copy = []
+        file_sizes = {}  # Sizes from the secondary listings, used to tune the copy
+        restaged = []  # Cached files that are missing on the primary and are copied again
+        evicted = []  # Entries this pass evicted to make room
+
+        # One listing of the secondary folder for the sizes of all missing files
+        secondary_sizes = self.rclone_manager.get_file_sizes(context.secondary_path, files_to_transfer) \
+            if files_to_transfer else {}
+        if secondary_sizes is None:
+            print(f"[ERROR] Could not retrieve the file sizes from {context.secondary_path}. Skipping...")
+            secondary_sizes = {}
 
-            if not file_size_success:
-                print(f"[ERROR] Could not retrieve size for file: {file}. The error was {file_size}. Skipping...")
+        for file in files_to_transfer:
+            if file not in secondary_sizes:
+                print(f"[ERROR] Could not retrieve size for file: {file}. It is not on the secondary. Skipping...")
                 continue
 
+            miss_bytes += secondary_sizes[file]
+            file_sizes[file] = secondary_sizes[file]
+
             # Check if file already exists in cache, add it otherwise
-            if self.get_file(file) is not None:
+            if file in cached:
                 print(f"get file {file}")
-                continue
+                files_to_copy.append(file)
+                restaged.append(file)
             else:
                 print(f"add file {file}")
-                self.add_file(file, file_size[0]["size"])
+                if self.add_file(file, secondary_sizes[file], pin_uid=context.workflow_uid, ready=False,
+                                 location=context.primary_path, evicted=evicted):
+                    files_to_copy.append(file)
 
-        # Step 2: Remove files present in primary storage but not in the cache
-        success, remote_files = self.rclone_manager.list_files(self.primary_endpoint + self.primary_folder)
+        self._record_request_stats(len(hits), sum(cached.get(file, 0) for file in hits),
+                                   len(files_to_transfer), miss_bytes)
 
-        state = self._load_state()
-        cache_files = self._list_to_ordereddict(state["files"])
+        self.mark_staging(restaged)
 
-        if success:
-            print(f"remove these files: {remote_files}")
-            for file in remote_files:
-                name = file["file_name"]
-                if name not in cache_files.keys():
-                    print(f"[INFO] Removing {name} from primary storage (not in cache).")
-                    self.rclone_manager.delete_file(self.primary_endpoint, name)
-        else:
-            print("[INFO] Could not list remote files. Skipping cleanup step.")
+        # Step 2: Remove the files this pass evicted from the cache from primary storage
+        self._delete_evicted_files(evicted, context.primary_path)
 
-            
-        # Step 3: Sync cache with primary storage
+        # Step 3: Copy the admitted files to primary storage, in the order the workflow reads them
         print("[INFO] Syncing cache with primary storage...")
-        self.rclone_manager.copy_files(
-            source=self.secondary_endpoint+self.secondary_folder,
-            destination=self.primary_endpoint+self.primary_folder,
-            files=list(cache_files.keys())
-        )
-
+        try:
+            job = self._copy_files(context, files_to_copy, file_sizes) if files_to_copy else None
+        except TransferQueueFull:
+            # Nothing will copy the admitted files, so they leave the index again (with their pins);
+            # the event fails and is handled again later
+            self._evict_missing_copies(files_to_copy, {})
+            raise
+
+        # Step 5: Stage likely companion files. They are listed on the secondary only now, so the
+        # requested files are already on their way
+        companions = self._prefetch_companions(context, file_sizes)
+        if companions:
+            try:
+                self._copy_files(context, companions, file_sizes)
+            except TransferQueueFull:
+                self._evict_missing_copies(companions, {})
+
+        self.flush_access_log()
+        self._save_admission_state()
         print("[INFO] Cache synchronization complete.")
+        return job
 
-    def add_file(self, file_name: str, file_size: int) -> None:
-        """Add a file to the cache, evicting as needed."""
-        state = self._load_state()
-        if file_size > state["capacity_bytes"]:
-            print("File to large for cache")
-            return None
+    def _copy_files(self, context: StagingContext, files_to_copy: list, file_sizes: dict):
+        """
+        Copies admitted files from the secondary to the primary folder of a context. Every file is
+        marked ready as soon as it has arrived, so a step does not wait for the others; files that
+        did not arrive are evicted again.
 
-        files_dict = self._list_to_ordereddict(state["files"])
+        Returns:
+            TransferJob or None: The job copying the files when a `transfer_job_manager` is set;
+            otherwise the files are copied before this returns.
 
-        # If file already exists, remove it first
-        if file_name in files_dict:
-            old_size, _ = files_dict[file_name]
-            state["current_bytes"] -= old_size
-            del files_dict[file_name]
+        Raises:
+            TransferQueueFull: If the transfer job manager refuses the job.
+        """
+        source = context.secondary_path
+        destination = context.primary_path
+        batches = self._plan_copy(files_to_copy, file_sizes, source, destination)
+        copy_names = {file.lstrip("/"): file for file in files_to_copy}
+
+        def file_done(name, error=None):
+            if not error:
+                self.mark_ready([copy_names.get(name, name)])
+
+        if self.transfer_job_manager is not None:
+            job = self.transfer_job_manager.submit(
+                "copy", source, destination, batches=batches, on_file=file_done,
+                on_done=lambda finished: self._evict_missing_copies(files_to_copy, finished.results)
+            )
+            print(f"[INFO] Copying {len(files_to_copy)} files in transfer job {job.id}")
+            return job
+
+        arrived = {"copied": [], "unchanged": []}
+        try:
+            for batch in batches:
+                success, results = self.rclone_manager.copy_files_batch(
+                    source=source,
+                    destination=destination,
+                    files=batch["files"],
+                    parallel_files=batch["parallel_files"],
+                    checkers=batch["checkers"],
+                    options=batch["options"],
+                    file_done=file_done
+                )
+                arrived["copied"].extend(results["copied"])
+                arrived["unchanged"].extend(results["unchanged"])
+        finally:
+            self._evict_missing_copies(files_to_copy, arrived)
+        return None
+
+    def _plan_copy(self, files_to_copy, file_sizes, source, destination) -> list:
+        """
+        Splits the files to copy into batches with their rclone settings (see `TransferTuner.plan`),
+        keeping their order, and the batches into windows copied one after the other (see
+        `split_into_windows`; the window size is the `pipeline_window` setting).
+        Without tuning, the files are copied with the configured `transfers` and `checkers`.
+        """
+        if self.transfer_tuner is None:
+            batches = [{"files": files_to_copy, "parallel_files": self.cache_settings.get("transfers", 4),
+                        "checkers": self.cache_settings.get("checkers", 8), "options": {}}]
+        else:
+            batches = self.transfer_tuner.plan({file: file_sizes.get(file) for file in files_to_copy}, source,
+                                               destination, preserve_order=True)
+
+        batches = split_into_windows(batches, self.cache_settings.get("pipeline_window"))
+        for batch in batches:
+            print(f"[INFO] Copying {len(batch['files'])} files with {batch['parallel_files']} transfers "
+                  f"and options {batch['options']}")
+        return batches
+
+    def mark_staging(self, file_names) -> None:
+        """Marks cached files as not (yet) present on the primary endpoint."""
+        if file_names:
+            self.entries.update_many({"cache_id": self.document_id, "file_name": {"$in": list(file_names)}},
+                                     {"$set": {"ready": False}})
+            self._notify_readiness()
+
+    def mark_ready(self, file_names) -> None:
+        """Marks cached files as present on the primary endpoint."""
+        if file_names:
+            self.entries.update_many({"cache_id": self.document_id, "file_name": {"$in": list(file_names)}},
+                                     {"$set": {"ready": True}})
+            self._notify_readiness()
+
+    def _notify_readiness(self):
+        """Wakes the steps waiting for files, since the readiness of some file has changed."""
+        if self.readiness_tracker is not None:
+            self.readiness_tracker.notify()
+
+    def get_readiness(self, file_names) -> dict:
+        """
+        Returns whether files can be read from the primary endpoint, with a single lookup.
 
-        files_dict[file_name] = (file_size, time.time())
-        state["current_bytes"] += file_size
+        Returns:
+            dict: File name -> "ready" (on the primary), "staging" (admitted, still being copied) or
+            "missing" (not cached; the workflow reads it from the secondary endpoint).
+        """
+        readiness = {file_name: MISSING for file_name in file_names}
+        for entry in self.entries.find({"cache_id": self.document_id, "file_name": {"$in": list(file_names)}},
+                                       {"file_name": 1, "ready": 1}):
+            # Entries written before readiness was tracked are on the primary
+            readiness[entry["file_name"]] = READY if entry.get("ready", True) else STAGING
+        return readiness
+
+    def _evict_missing_copies(self, files_to_copy, results):
+        """
+        Removes the files that did not arrive on the primary from the cache, so they are neither reported
+        as staging nor counted as used: failed files, and files the copy never got to (e.g. it was
+        cancelled, raised or could not be queued).
 
-        # Evict old files if needed
-        while state["current_bytes"] > state["capacity_bytes"] and files_dict:
-            oldest_file, (old_size, _) = files_dict.popitem(last=False)
-            state["current_bytes"] -= old_size
-            if self.eviction_callback:
-                self.eviction_callback(oldest_file, old_size)
+        Args:
+            files_to_copy (list): The files of the copy.
+            results (dict): The `copied` and `unchanged` files of the copy.
+        """
+        arrived = set(results.get("copied", [])) | set(results.get("unchanged", []))
+        for file in files_to_copy:
+            if file.lstrip("/") not in arrived:
+                self.evict_file(file)
+
+    def add_file(self, file_name: str, file_size: int, pin_uid: Optional[str] = None,
+                 speculative: bool = False, ready: bool = True, location: Optional[str] = None,
+                 evicted: Optional[list] = None) -> bool:
+        """
+        Add a file to the cache, evicting as needed.
+
+        Args:
+            file_name (str): The file to add.
+            file_size (int): Size of the file in bytes.
+            pin_uid (str, optional): Workflow uid to pin the file for.
+            speculative (bool): Whether the file is prefetched without being requested. Speculative
+                files only use spare capacity (nothing is evicted for them) and are evicted first.
+            ready (bool): Whether the file is already on the primary endpoint; pass False for a file
+                that is still to be copied, and call `mark_ready` once it has arrived.
+            location (str, optional): The primary endpoint and folder holding the file, from which it is
+                deleted once it is evicted.
+            evicted (list, optional): Receives the entries evicted to make room, which the caller deletes
+                from the primary endpoint with `_delete_evicted_files`.
+
+        Returns:
+            bool: False if the file was not admitted, because it is larger than the cache or
+            because pinned files leave too little evictable space.
+        """
+        # The free space and the victims are read and claimed under one lock
+        with self._index_lock:
+            state = self._load_state()
+            if file_size > state["capacity_bytes"]:
+                print("File to large for cache")
+                return False
+
+            now = time.time()
+            existing = self.entries.find_one(self._entry_filter(file_name), ENTRY_PROJECTION)
+            size_delta = file_size - (existing["size"] if existing else 0)
+            current_bytes = state["current_bytes"] + size_delta
+
+            if speculative and (existing or current_bytes > state["capacity_bytes"]):
+                return False
+
+            # Select victims before writing anything, so a rejected file leaves the cache untouched
+            victims = []
+            if current_bytes > state["capacity_bytes"]:
+                victims = self._select_victims(current_bytes - state["capacity_bytes"], exclude=file_name)
+                if victims is None:
+                    print(f"[INFO] Not caching {file_name}: pinned files leave too little space")
+                    return False
+
+                # Rejected files stay on the secondary endpoint, where the workflow can still read them
+                if not existing and self.admission_filter and not self.admission_filter.admit(file_name, victims):
+                    print(f"[INFO] Not caching {file_name}: less popular than the files it would evict")
+                    self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {"$inc": {
+                        "stats.admission_rejected": 1, "stats.admission_rejected_bytes": file_size
+                    }})
+                    return False
+
+            if existing:
+                # Re-adding counts as an access; only the size difference is accounted
+                entry = dict(existing, size=file_size, hits=existing.get("hits", 0) + 1)
+                fields = {"size": file_size, "last_access_time": now, "hits": entry["hits"], "speculative": False,
+                          **self.eviction_policy.on_access(entry, now)}
+            else:
+                entry = {"file_name": file_name, "size": file_size}
+                fields = {"size": file_size, "last_access_time": now, "inserted_at": now, "hits": 1, "pins": [],
+                          "speculative": speculative, **self.eviction_policy.on_insert(entry, now)}
+                if speculative:
+                    fields["priority"] -= SPECULATIVE_PRIORITY_OFFSET
+
+            fields["ready"] = ready
+            if location is not None:
+                fields["location"] = location
+            self.entries.update_one(self._entry_filter(file_name), {"$set": fields}, upsert=True)
+            self._inc_current_bytes(size_delta)
+            if pin_uid:
+                self.pin_files(pin_uid, [file_name])
+
+            # Evict files chosen by the eviction policy if needed
+            if victims:
+                removed = self._evict_entries(victims)
+                if evicted is not None:
+                    evicted.extend(removed)
+            return True
+
+    def pin_files(self, workflow_uid: str, file_names) -> None:
+        """
+        Pins cached files for a workflow. Pins are reference counted per workflow uid:
+        a file can only be evicted once every workflow that pinned it has released it.
+        """
+        if not workflow_uid or not file_names:
+            return
+
+        self.entries.update_many(
+            {"cache_id": self.document_id, "file_name": {"$in": list(file_names)}, "pins.uid": {"$ne": workflow_uid}},
+            {"$push": {"pins": {"uid": workflow_uid, "pinned_at": time.time()}}}
+        )
+
+    def release_pins(self, workflow_uid: str) -> None:
+        """Releases all pins held by a workflow (e.g. when it reached a terminal phase)."""
+        if not workflow_uid:
+            return
+
+        result = self.entries.update_many(
+            {"cache_id": self.document_id, "pins.uid": workflow_uid},
+            {"$pull": {"pins": {"uid": workflow_uid}}}
+        )
+        with self._pin_lock:
+            self._pins_refreshed.pop(workflow_uid, None)
+        print(f"[INFO] Released pins of workflow {workflow_uid} on {result.modified_count} files")
+
+    def refresh_pins(self, workflow_uid: str) -> None:
+        """
+        Renews the pins of a workflow that is still sending events, so `release_stale_pins` only
+        releases the pins of workflows that went quiet (e.g. a missed terminal event) and not those
+        of a long-running one. Runs at most once per minute per workflow.
+        """
+        if not workflow_uid:
+            return
+
+        now = time.time()
+        with self._pin_lock:
+            if now - self._pins_refreshed.get(workflow_uid, 0) < 60:
+                return
+            self._pins_refreshed[workflow_uid] = now
+
+        # `pin_files` adds at most one pin per workflow to an entry, so the positional operator finds it
+        self.entries.update_many(
+            {"cache_id": self.document_id, "pins.uid": workflow_uid},
+            {"$set": {"pins.$.pinned_at": now}}
+        )
 
-        self._save_state(state["capacity_bytes"], state["current_bytes"], self._ordereddict_to_list(files_dict))
+    def release_stale_pins(self) -> None:
+        """Releases pins not renewed for `pin_timeout` (see `refresh_pins`). Runs at most once per minute."""
+        now = time.time()
+        if now - self._last_stale_pin_sweep < 60:
+            return
+        self._last_stale_pin_sweep = now
+
+        cutoff = now - self.pin_timeout
+        with self._pin_lock:
+            self._pins_refreshed = {uid: refreshed for uid, refreshed in self._pins_refreshed.items()
+                                    if refreshed >= cutoff}
+        self.entries.update_many(
+            {"cache_id": self.document_id, "pins.pinned_at": {"$lt": cutoff}},
+            {"$pull": {"pins": {"pinned_at": {"$lt": cutoff}}}}
+        )
 
     def get_file(self, file_name: str):
-        """Access a file, updating its LRU status."""
-        state = self._load_state()
-        files_dict = self._list_to_ordereddict(state["files"])
+        """Access a file, updating its eviction priority."""
+        entry = self.entries.find_one(self._entry_filter(file_name), ENTRY_PROJECTION)
 
-        if file_name not in files_dict:
+        if entry is None:
             return None
 
-        file_size, _ = files_dict[file_name]
-        files_dict[file_name] = (file_size, time.time())
+        self.record_access(file_name, entry=entry)
+        return file_name, entry["size"]
+
+    def get_files(self, file_names) -> dict:
+        """
+        Access several files with a single lookup, updating their eviction priority.
+
+        Returns:
+            dict: Mapping of the cached file names to their size; missing files are left out.
+        """
+        if not file_names:
+            return {}
+
+        entries = list(self.entries.find(
+            {"cache_id": self.document_id, "file_name": {"$in": list(file_names)}},
+            ENTRY_PROJECTION
+        ))
+
+        now = time.time()
+        for entry in entries:
+            self.record_access(entry["file_name"], now, entry)
+        return {entry["file_name"]: entry["size"] for entry in entries}
 
-        self._save_state(state["capacity_bytes"], state["current_bytes"], self._ordereddict_to_list(files_dict))
-        return file_name, file_size
+    def _find_cached(self, file_names) -> dict:
+        """
+        Looks up which files are cached with a single query, without recording an access: a file that
+        is only checked (e.g. a prefetch candidate) must not count as requested.
+
+        Returns:
+            dict: Mapping of the cached file names to their size; missing files are left out.
+        """
+        if not file_names:
+            return {}
+
+        return {entry["file_name"]: entry["size"] for entry in self.entries.find(
+            {"cache_id": self.document_id, "file_name": {"$in": list(file_names)}}, {"file_name": 1, "size": 1}
+        )}
+
+    def record_access(self, file_name: str, access_time: Optional[float] = None, entry: Optional[dict] = None):
+        """
+        Buffers a touch in memory. The buffer is written back by `flush_access_log`,
+        which runs when it grows too large, when the flush interval has passed, at the end
+        of each event, before eviction and on shutdown.
+
+        Args:
+            file_name (str): The accessed file.
+            access_time (float, optional): Time of the access (default: now).
+            entry (dict, optional): The entry as read from MongoDB, used to recompute its priority.
+        """
+        with self._touch_lock:
+            access_time = access_time or time.time()
+            touch = self._pending_touches.setdefault(file_name, {"time": 0, "hits": 0, "entry": None})
+            touch["time"] = max(access_time, touch["time"])
+            touch["hits"] += 1
+            touch["entry"] = entry or touch["entry"]
+            flush_due = (len(self._pending_touches) >= self.max_pending_touches or
+                         access_time - self._last_touch_flush >= self.touch_flush_interval)
+
+        if flush_due:
+            self.flush_access_log()
+
+    def flush_access_log(self):
+        """Writes all buffered touches back to MongoDB as one unordered bulk write."""
+        with self._touch_lock:
+            pending, self._pending_touches = self._pending_touches, {}
+            self._last_touch_flush = time.time()
+
+        if not pending:
+            return
+
+        requests = []
+        prefetch_hits = prefetch_hit_bytes = 0
+        for file_name, touch in pending.items():
+            entry = dict(touch["entry"] or {"file_name": file_name})
+            entry["hits"] = entry.get("hits", 0) + touch["hits"]
+            entry["last_access_time"] = touch["time"]
+            fields = self.eviction_policy.on_access(entry, touch["time"])
+
+            # A request for a prefetched file turns it into a regular entry
+            if entry.get("speculative"):
+                fields["speculative"] = False
+                prefetch_hits += 1
+                prefetch_hit_bytes += entry.get("size", 0)
+
+            # $max keeps the newest access time if another writer touched the entry in the meantime
+            requests.append(UpdateOne(self._entry_filter(file_name), {
+                "$set": fields,
+                "$inc": {"hits": touch["hits"]},
+                "$max": {"last_access_time": touch["time"]}
+            }))
+
+        self.entries.bulk_write(requests, ordered=False)
+
+        if prefetch_hits:
+            self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {"$inc": {
+                "stats.prefetch_hits": prefetch_hits, "stats.prefetch_hit_bytes": prefetch_hit_bytes
+            }})
 
     def evict_file(self, file_name: str) -> None:
         """Manually evict a file."""
-        state = self._load_state()
-        files_dict = self._list_to_ordereddict(state["files"])
+        self._evict_matching(self._entry_filter(file_name))
+
+    def _evict_matching(self, query: dict) -> Optional[dict]:
+        """
+        Deletes the entry matching `query`, if any, and accounts for it. Returns the deleted entry.
+
+        The eviction policy did not choose this entry (it vanished from the primary or its copy failed),
+        so its state, e.g. the aging clock or the ghost entries, is left alone; see `_evict_entries`.
+        """
+        with self._index_lock:
+            entry = self.entries.find_one_and_delete(query)
+            if entry:
+                self._inc_current_bytes(-entry["size"])
 
-        if file_name in files_dict:
-            file_size, _ = files_dict[file_name]
-            del files_dict[file_name]
-            state["current_bytes"] -= file_size
+        if entry:
             if self.eviction_callback:
-                self.eviction_callback(file_name, file_size)
+                self.eviction_callback(entry["file_name"], entry["size"])
+            self._notify_readiness()
+        return entry
+
+    def get_stats(self) -> dict:
+        """
+        Returns the request statistics of this cache.
 
-        self._save_state(state["capacity_bytes"], state["current_bytes"], self._ordereddict_to_list(files_dict))
+        A hit is a requested file that was already on the primary endpoint; the byte-hit ratio
+        is the share of requested bytes that did not have to be copied from the secondary.
+        """
+        state = self._load_state() or {}
+        stats = dict(state.get("stats", {}))
+        requested_bytes = stats.get("hit_bytes", 0) + stats.get("miss_bytes", 0)
+        stats["byte_hit_ratio"] = stats.get("hit_bytes", 0) / requested_bytes if requested_bytes else None
+        prefetched = stats.get("prefetch_staged", 0)
+        stats["prefetch_hit_rate"] = stats.get("prefetch_hits", 0) / prefetched if prefetched else None
+        stats["eviction_policy"] = self.eviction_policy.name
+        return stats
+
+    def shutdown(self):
+        """Writes buffered touches and the admission sketch back to MongoDB."""
+        self.flush_access_log()
+        self._save_admission_state(force=True)
 
     def list_files(self):
         """List files in LRU order."""
-        state = self._load_state()
-        return state["files"]
+        self.flush_access_log()
+        return list(self.entries.find(
+            {"cache_id": self.document_id},
+            {"_id": 0, "file_name": 1, "size": 1, "last_access_time": 1}
+        ).sort("last_access_time", ASCENDING))
 
     def set_capacity_bytes(self, capacity: int):
         """
@@ -305,29 +784,245 @@ class CacheManager:
         print(f"[INFO] Current cache usage updated to {current} bytes")
 
     def _load_state(self):
-        """Load the cache state from MongoDB."""
+        """Load the cache meta document (capacity and usage) from MongoDB."""
         return self.mongoDB_manager.collection.find_one({"_id": self.document_id})
 
-    def _save_state(self, capacity_bytes, current_bytes, files_list):
-        """Save the cache state back to MongoDB."""
+    def _correct_current_bytes(self):
+        """
+        Corrects drift between the recorded usage and the sizes of the entries (e.g. after a crash between
+        writing an entry and its usage). The difference is applied with $inc, like every other change of the
+        usage, so updates of concurrent passes are not overwritten.
+        """
+        # Admissions and evictions write the entry and the usage under this lock, so both match here
+        with self._index_lock:
+            totals = list(self.entries.aggregate([
+                {"$match": {"cache_id": self.document_id}},
+                {"$group": {"_id": None, "bytes": {"$sum": "$size"}}}
+            ]))
+            state = self._load_state() or {}
+            drift = (totals[0]["bytes"] if totals else 0) - state.get("current_bytes", 0)
+            if drift:
+                print(f"[WARNING] Recorded cache usage was off by {-drift} bytes; corrected")
+                self._inc_current_bytes(drift)
+
+    def _inc_current_bytes(self, delta: int):
+        """Atomically adjusts the recorded cache usage."""
+        if delta:
+            self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {"$inc": {"current_bytes": delta}})
+
+    def _entry_filter(self, file_name: str) -> dict:
+        """Filter selecting the entry document of a single cached file."""
+        return {"cache_id": self.document_id, "file_name": file_name}
+
+    def _select_victims(self, bytes_to_free: int, exclude: Optional[str] = None):
+        """
+        Selects the unpinned entries with the lowest policy priority until at least
+        `bytes_to_free` bytes would be released.
+
+        Candidates are read lazily from the (cache_id, priority) index, so only the selected
+        documents are visited.
+
+        Returns:
+            list or None: The victims, or None if the unpinned entries cannot free enough space.
+        """
+        # Buffered touches must be visible to the ordering before picking victims
+        self.flush_access_log()
+
+        query = {"cache_id": self.document_id, "pins.0": {"$exists": False}}
+        if exclude is not None:
+            query["file_name"] = {"$ne": exclude}
+
+        victims = []
+        freed = 0
+        for entry in self.entries.find(query, ENTRY_PROJECTION).sort("priority", ASCENDING):
+            if freed >= bytes_to_free:
+                break
+            victims.append(entry)
+            freed += entry["size"]
+
+        return victims if freed >= bytes_to_free else None
+
+    def _evict_entries(self, victims) -> list:
+        """
+        Removes the given entries from the cache and updates usage and policy state.
+
+        Each victim is deleted only if it is still unpinned: another request thread may have pinned
+        it since it was selected. Usage is reduced by what was actually deleted; if a victim was kept,
+        the cache stays above capacity until the next admission evicts again.
+
+        All victims are deleted in one round trip. Only if some were kept is a second one needed to
+        learn which; entries cannot be added back in between, since admissions hold the index lock.
+
+        Returns:
+            list: The deleted entries; their files are still on the primary endpoint.
+        """
+        names = [entry["file_name"] for entry in victims]
+        result = self.entries.delete_many({"cache_id": self.document_id, "file_name": {"$in": names},
+                                           "pins.0": {"$exists": False}})
+        if result.deleted_count < len(victims):
+            kept = {entry["file_name"] for entry in self.entries.find(
+                {"cache_id": self.document_id, "file_name": {"$in": names}}, {"file_name": 1})}
+            victims = [entry for entry in victims if entry["file_name"] not in kept]
+        if not victims:
+            return victims
+        freed = sum(entry["size"] for entry in victims)
+
+        for entry in victims:
+            self.eviction_policy.on_evict(entry)
+
+        # Usage, policy state (e.g. the aging clock) and prefetch accounting are written together
+        increments = {"current_bytes": -freed}
+        unused_prefetches = sum(1 for entry in victims if entry.get("speculative"))
+        if unused_prefetches:
+            increments["stats.prefetch_evicted_unused"] = unused_prefetches
         self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {
-            "$set": {"capacity_bytes": capacity_bytes, "current_bytes": current_bytes, "files": files_list}
+            "$inc": increments,
+            "$set": {"policy_state": self.eviction_policy.get_state()}
         })
 
-    def _list_to_ordereddict(self, files_list):
-        """Convert list to OrderedDict sorted by access time (oldest first)."""
-        sorted_files = sorted(files_list, key=lambda x: x["last_access_time"])
-        return OrderedDict((f["file_name"], (f["size"], f["last_access_time"])) for f in sorted_files)
+        if self.eviction_callback:
+            for entry in victims:
+                self.eviction_callback(entry["file_name"], entry["size"])
+        return victims
 
-    def _ordereddict_to_list(self, od):
-        """Convert OrderedDict to list format."""
-        return [{"file_name": k, "size": v[0], "last_access_time": v[1]} for k, v in od.items()]
-    
-    def get_cached_file_names(self):
-        """Retrieve a list of cached file names in LRU order."""
-        state = self._load_state()
+    def _delete_evicted_files(self, evicted, primary_path: str):
+        """
+        Deletes evicted entries from the primary folder they were staged into; entries written before
+        the folder was recorded are deleted from `primary_path`, the folder of the evicting pass.
+        """
+        for entry in evicted:
+            location = entry.get("location") or primary_path
+            print(f"[INFO] Removing {entry['file_name']} from {location} (evicted from cache).")
+            self.rclone_manager.delete_file(location, entry["file_name"])
+
+    def _load_eviction_policy(self, policy_name: str, cache_doc: dict):
+        """
+        Creates the configured eviction policy and restores its persisted state.
+        When the policy differs from the one that computed the stored priorities,
+        all entries are re-prioritized once.
+        """
+        same_policy = cache_doc.get("policy", "lru") == policy_name.lower()
+        self.eviction_policy = create_eviction_policy(
+            policy_name,
+            cache_doc.get("policy_state") if same_policy else None,
+            **self.cache_settings.get("policy_options", {})
+        )
+
+        if not same_policy:
+            now = time.time()
+            requests = [
+                UpdateOne({"_id": entry["_id"]}, {"$set": self.eviction_policy.on_access(
+                    dict(entry, hits=entry.get("hits", 1)), entry.get("last_access_time", now))})
+                for entry in self.entries.find({"cache_id": self.document_id},
+                                               dict(ENTRY_PROJECTION, last_access_time=1))
+            ]
+            if requests:
+                self.entries.bulk_write(requests, ordered=False)
+
+            self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {"$set": {
+                "policy": self.eviction_policy.name, "policy_state": self.eviction_policy.get_state()
+            }})
+            print(f"[INFO] Eviction policy set to '{self.eviction_policy.name}' ({len(requests)} entries re-prioritized)")
+
+    def _load_admission_sketch(self, cache_doc: dict, admission_settings: dict) -> CountMinSketch:
+        """Restores the persisted admission sketch, or creates an empty one if its dimensions changed."""
+        state = cache_doc.get("admission_sketch")
+        sketch = CountMinSketch(**admission_settings)
+        if state and state.get("width") == sketch.width and state.get("depth") == sketch.depth:
+            return CountMinSketch.from_state(dict(state, sample_size=sketch.sample_size))
+        return sketch
+
+    def _save_admission_state(self, force: bool = False):
+        """Persists the admission sketch, at most every 30 seconds unless forced."""
+        if self.admission_filter is None or (not force and time.time() - self._last_admission_save < 30):
+            return
+
+        self._last_admission_save = time.time()
+        self.mongoDB_manager.collection.update_one(
+            {"_id": self.document_id}, {"$set": {"admission_sketch": self.admission_filter.get_state()}}
+        )
+
+    def _prefetch_companions(self, context: StagingContext, file_sizes: Optional[dict] = None) -> list:
+        """
+        Records the requested file set and stages its predicted companion files as speculative
+        entries, as long as they fit in the spare capacity of the cache.
+
+        Args:
+            context (StagingContext): The event whose files are staged.
+            file_sizes (dict, optional): Receives the sizes of the staged files.
+
+        Returns:
+            list: The admitted companion files, which still have to be copied.
+        """
+        if self.prefetch_manager is None:
+            return []
+
+        candidates = self.prefetch_manager.predict(list(context.files))
+        self.prefetch_manager.record_file_set(context.workflow_uid, list(context.files))
+
+        cached = self._find_cached(candidates)
+        candidates = [file for file in candidates if file not in cached]
+        staged = []
+        staged_bytes = 0
+        # One listing of the secondary folder for the sizes of all candidates
+        sizes = self.rclone_manager.get_file_sizes(context.secondary_path, candidates) if candidates else {}
+        for file in candidates:
+            if not sizes or file not in sizes:
+                continue
+
+            if self.add_file(file, sizes[file], speculative=True, ready=False, location=context.primary_path):
+                staged.append(file)
+                staged_bytes += sizes[file]
+                if file_sizes is not None:
+                    file_sizes[file] = sizes[file]
+
+        if staged:
+            print(f"[INFO] Prefetching {len(staged)} companion files ({staged_bytes} bytes)")
+            self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {"$inc": {
+                "stats.prefetch_staged": len(staged), "stats.prefetch_staged_bytes": staged_bytes
+            }})
+        return staged
+
+    def _record_request_stats(self, hits: int, hit_bytes: int, misses: int, miss_bytes: int):
+        """Adds the outcome of one event to the cache statistics with a single update."""
+        self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {"$inc": {
+            "stats.hits": hits, "stats.hit_bytes": hit_bytes,
+            "stats.misses": misses, "stats.miss_bytes": miss_bytes
+        }})
+
+    def _ensure_indexes(self):
+        """Creates the indexes used for LRU ordering and per-file lookups."""
+        self.entries.create_index([("cache_id", ASCENDING), ("last_access_time", ASCENDING)])
+        self.entries.create_index([("cache_id", ASCENDING), ("priority", ASCENDING)])
+        self.entries.create_index([("cache_id", ASCENDING), ("pins.uid", ASCENDING)])
+        self.entries.create_index([("cache_id", ASCENDING), ("file_name", ASCENDING)], unique=True)
+
+    def _migrate_legacy_state(self):
+        """
+        Moves the `files` array of the old single-document layout into per-file entries.
+        Safe to run repeatedly; the array is removed once its entries are written.
+        """
+        legacy = self.mongoDB_manager.collection.find_one(
+            {"_id": self.document_id, "files": {"$exists": True}}, {"files": 1}
+        )
+        if not legacy:
+            return
+
+        requests = [
+            UpdateOne(
+                self._entry_filter(f["file_name"]),
+                {"$set": {"size": f["size"], "last_access_time": f["last_access_time"],
+                          "inserted_at": f["last_access_time"], "hits": 1, "priority": f["last_access_time"]}},
+                upsert=True
+            )
+            for f in legacy.get("files") or []
+        ]
+        if requests:
+            self.entries.bulk_write(requests, ordered=False)
 
-        if not state or "files" not in state:
-            return []  # Return an empty list if cache is empty or doesn't exist
+        self.mongoDB_manager.collection.update_one({"_id": self.document_id}, {"$unset": {"files": ""}})
+        print(f"[INFO] Migrated {len(requests)} cache entries to the '{ENTRY_COLLECTION}' collection")
 
-        return [file["file_name"] for file in state["files"]]
+    def get_cached_file_names(self):
+        """Retrieve a list of cached file names in LRU order."""
+        return [entry["file_name"] for entry in self.list_files()]
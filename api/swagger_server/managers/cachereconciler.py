@@ -0,0 +1,98 @@
+import threading
+import time
+
+
+class CacheReconciler:
+    """
+    Keeps the cache index in line with the primary endpoints in the background.
+
+    Reconciling a primary folder (`CacheManager.sync_cache`) lists the whole folder and
+    walks its size, which is far too slow for the workflow event path. Instead, every primary
+    folder seen in an event is registered here and reconciled every `interval` seconds, or
+    immediately when it is first registered or when `trigger` is called.
+    """
+
+    def __init__(self, cache_manager, interval=300):
+        """
+        Args:
+            cache_manager (CacheManager): The cache to reconcile.
+            interval (int): Seconds between two reconciliation rounds.
+        """
+        self.cache_manager = cache_manager
+        self.interval = interval
+        self.targets = {}  # (primary endpoint, primary folder) -> time of the last reconciliation
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the background reconciliation thread."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-reconciler", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Cache reconciler started (interval: {self.interval}s)")
+
+    def stop(self, timeout=None):
+        """Stops the background thread after the current round."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def register(self, primary_endpoint, primary_folder) -> bool:
+        """
+        Adds a primary folder to the reconciliation rounds.
+
+        Returns:
+            bool: True if the folder was not known yet; a round is then triggered right away.
+        """
+        target = (primary_endpoint, primary_folder)
+        with self._lock:
+            if target in self.targets:
+                return False
+            self.targets[target] = None
+
+        self.trigger()
+        return True
+
+    def trigger(self):
+        """Requests a reconciliation round without waiting for the interval."""
+        self._wakeup.set()
+
+    def reconcile_all(self):
+        """Reconciles every registered primary folder once."""
+        with self._lock:
+            targets = list(self.targets)
+
+        for primary_endpoint, primary_folder in targets:
+            try:
+                self.cache_manager.sync_cache(primary_endpoint, primary_folder)
+                with self._lock:
+                    self.targets[(primary_endpoint, primary_folder)] = time.time()
+            except Exception as e:
+                print(f"[ERROR] Reconciling {primary_endpoint}{primary_folder} failed: {e}")
+
+    def get_status(self) -> dict:
+        """Returns the registered folders and when they were last reconciled."""
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "targets": [
+                    {"primary_endpoint": endpoint, "primary_folder": folder, "last_reconciled": last}
+                    for (endpoint, folder), last in self.targets.items()
+                ]
+            }
+
+    def _run(self):
+        """Background loop: one round per interval or trigger."""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            self.reconcile_all()
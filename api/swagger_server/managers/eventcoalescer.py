@@ -0,0 +1,154 @@
+import threading
+import time
+
+
+def merge_workflow_data(older: dict, newer: dict) -> dict:
+    """
+    Merges two parsed events of the same workflow: the files of both (in the order they were
+    first requested) and, for everything else, the latest known value, including the phase.
+    """
+    merged = dict(older)
+    merged.update({key: value for key, value in newer.items() if value is not None})
+    merged["files"] = list(older.get("files") or [])
+    merged["files"] += [file for file in newer.get("files") or [] if file not in merged["files"]]
+    return merged
+
+
+class _Batch:
+    """Events of one workflow collected in a coalescing window."""
+
+    def __init__(self, data, now, window, max_delay):
+        self.data = data
+        self.events = 1
+        self.opened = now
+        self.deadline = now + min(window, max_delay)
+        self.ticket = None
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class EventCoalescer:
+    """
+    Merges bursts of events of the same workflow into one staging pass.
+
+    The first event of a workflow opens a window of `window` seconds; every further event of
+    the workflow within the window is merged into it (see `merge_workflow_data`) and extends the
+    window, but never beyond `max_delay` seconds after the first event, which bounds the delay
+    added to the time to the first file. When the window closes, one pass runs for the merged
+    event and all callers of the window get its result. Passes of the same workflow never
+    overlap and run in the order their windows opened: events arriving during a pass are
+    collected for the next one.
+    """
+
+    def __init__(self, window=0.2, max_delay=0.5):
+        """
+        Args:
+            window (float): Seconds to wait for further events after the last one.
+            max_delay (float): Seconds after the first event of a window at which the pass starts at the latest.
+        """
+        self.window = window
+        self.max_delay = max_delay
+        self.pending = {}  # workflow uid -> _Batch collecting events
+        self.stats = {"events": 0, "passes": 0, "merged": 0}
+
+        self._lock = threading.Lock()  # Guards the stats
+        self._condition = threading.Condition()
+        self._tickets = {}  # workflow uid -> [next ticket to hand out, ticket whose pass may run]
+
+    def collect(self, batch, workflow_data: dict):
+        """
+        Adds an event to a window without waiting; callers that run the passes themselves (e.g. a
+        queue) serialize the calls for a batch and start its pass once `batch.deadline` has passed.
+
+        Args:
+            batch (_Batch): The open window of the workflow, or None to open a new one.
+            workflow_data (dict): The parsed event.
+
+        Returns:
+            _Batch: The window holding the event.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.stats["events"] += 1
+            if batch is None:
+                return _Batch(workflow_data, now, self.window, self.max_delay)
+            self.stats["merged"] += 1
+
+        batch.data = merge_workflow_data(batch.data, workflow_data)
+        batch.events += 1
+        batch.deadline = min(now + self.window, batch.opened + self.max_delay)
+        return batch
+
+    def count_pass(self, uid, batch) -> None:
+        """Records that the pass of a window runs."""
+        with self._lock:
+            self.stats["passes"] += 1
+        if batch.events > 1:
+            print(f"[INFO] Merged {batch.events} events of workflow {uid} into one pass")
+
+    def submit(self, uid, workflow_data: dict, process):
+        """
+        Adds an event and waits for the pass that handles it.
+
+        Args:
+            uid (str): The workflow uid.
+            workflow_data (dict): The parsed event.
+            process (callable): Runs the pass for a (merged) parsed event.
+
+        Returns:
+            The result of `process` for the window the event was merged into.
+
+        Raises:
+            Exception: Whatever `process` raised.
+        """
+        with self._condition:
+            opened = uid not in self.pending
+            batch = self.pending[uid] = self.collect(self.pending.get(uid), workflow_data)
+            if opened:
+                # The first event of a window runs the pass; the others wait for its result
+                tickets = self._tickets.setdefault(uid, [0, 0])
+                batch.ticket = tickets[0]
+                tickets[0] += 1
+
+        if opened:
+            return self._run(uid, batch, process)
+
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+
+    def _run(self, uid, batch, process):
+        """Closes the window of a batch, waits for the earlier passes of the workflow and runs the merged event."""
+        while True:
+            with self._condition:
+                remaining = batch.deadline - time.monotonic()
+                if remaining <= 0:
+                    self.pending.pop(uid, None)
+                    break
+            time.sleep(remaining)
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._tickets[uid][1] == batch.ticket)
+
+        try:
+            self.count_pass(uid, batch)
+            batch.result = process(batch.data)
+            return batch.result
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            with self._condition:
+                tickets = self._tickets[uid]
+                tickets[1] += 1
+                if tickets[0] == tickets[1]:
+                    del self._tickets[uid]
+                self._condition.notify_all()
+            batch.done.set()
+
+    def get_stats(self) -> dict:
+        """Returns the number of events, of passes run for them and of events merged into another one."""
+        with self._lock:
+            return dict(self.stats, window=self.window, max_delay=self.max_delay)
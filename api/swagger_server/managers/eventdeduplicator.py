@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Outcome of an event whose handling has started but not finished yet
+PENDING = object()
+
+
+def fingerprint_event(workflow_data: dict, terminal: bool) -> str:
+    """
+    Returns a hash of the parts of a parsed workflow event that decide what is staged: the
+    endpoints, folders and files, and whether the workflow has finished. Node status changes
+    that Argo reports in UPDATE events do not change it.
+    """
+    relevant = {key: workflow_data.get(key) for key in
+                ("primary_endpoint", "secondary_endpoint", "primary_folder", "secondary_folder", "files")}
+    relevant["terminal"] = terminal
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class EventDeduplicator:
+    """
+    Skips workflow events that cannot change what is staged.
+
+    Argo sends an UPDATE event for every node status change of a workflow. An event is a
+    duplicate if its `metadata.resourceVersion` was already seen for the workflow uid, or if
+    its fingerprint (see `fingerprint_event`) equals that of the last handled event of the uid
+    and that event was handled less than `ttl` seconds ago. A duplicate is answered with the
+    outcome of the event it repeats. After `ttl` an unchanged event is handled again, so files
+    evicted in the meantime are staged again.
+    """
+
+    def __init__(self, ttl=300, max_workflows=10000, versions_per_workflow=64):
+        """
+        Args:
+            ttl (float): Seconds during which an unchanged event is skipped.
+            max_workflows (int): Number of workflows remembered (least recently seen are dropped).
+            versions_per_workflow (int): Number of resource versions remembered per workflow.
+        """
+        self.ttl = ttl
+        self.max_workflows = max_workflows
+        self.versions_per_workflow = versions_per_workflow
+        self.workflows = OrderedDict()  # uid -> {"versions", "fingerprint", "outcome", "handled_at"}
+        self.stats = {"handled": 0, "duplicate_version": 0, "unchanged": 0}
+        self._lock = threading.Lock()
+
+    def begin(self, uid, resource_version, fingerprint):
+        """
+        Checks an event and, unless it is a duplicate, reserves it for handling; the caller then
+        calls `complete` with the outcome, or `abort` if handling failed.
+
+        Returns:
+            tuple(bool, object): (True and the outcome of the repeated event (None while that one is
+            still being handled) if the event is a duplicate, otherwise False and None)
+        """
+        if not uid:
+            return False, None
+
+        with self._lock:
+            state = self.workflows.get(uid)
+            if state is not None:
+                self.workflows.move_to_end(uid)
+                if resource_version is not None and resource_version in state["versions"]:
+                    self.stats["duplicate_version"] += 1
+                    return True, self._outcome(state)
+                if state["fingerprint"] == fingerprint and (
+                        state["outcome"] is PENDING or time.time() - state["handled_at"] < self.ttl):
+                    self._add_version(state, resource_version)
+                    self.stats["unchanged"] += 1
+                    return True, self._outcome(state)
+            else:
+                state = {"versions": deque(maxlen=self.versions_per_workflow)}
+                self.workflows[uid] = state
+                while len(self.workflows) > self.max_workflows:
+                    self.workflows.popitem(last=False)
+
+            self._add_version(state, resource_version)
+            state.update(fingerprint=fingerprint, outcome=PENDING, handled_at=time.time())
+            self.stats["handled"] += 1
+            return False, None
+
+    def complete(self, uid, outcome) -> None:
+        """Stores the outcome of a handled event, returned for its duplicates."""
+        with self._lock:
+            state = self.workflows.get(uid)
+            if state is not None:
+                state.update(outcome=outcome, handled_at=time.time())
+
+    def abort(self, uid) -> None:
+        """Forgets a workflow whose event could not be handled, so the next event is handled again."""
+        with self._lock:
+            self.workflows.pop(uid, None)
+
+    def get_stats(self) -> dict:
+        """Returns the number of handled and skipped events."""
+        with self._lock:
+            return dict(self.stats, workflows=len(self.workflows))
+
+    @staticmethod
+    def _add_version(state, resource_version):
+        if resource_version is not None and resource_version not in state["versions"]:
+            state["versions"].append(resource_version)
+
+    @staticmethod
+    def _outcome(state):
+        return None if state["outcome"] is PENDING else state["outcome"]
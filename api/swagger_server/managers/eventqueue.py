@@ -0,0 +1,314 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .argofileextractor import parse_argo_workflow
+from .eventcoalescer import EventCoalescer
+from .transferjobmanager import QUEUED, RUNNING, SUCCEEDED, FAILED, FINISHED_STATES
+
+
+class EventQueueFull(Exception):
+    """Raised when no more workflow events can be queued."""
+
+
+class EventQueueClosed(Exception):
+    """Raised when an event is submitted after the queue was shut down."""
+
+
+class EventTask:
+    """One workflow event accepted by the EventQueue, tracked by its ID until it has been handled."""
+
+    def __init__(self, workflow_uid, event_id=None):
+        self.id = event_id or uuid.uuid4().hex
+        self.workflow_uid = workflow_uid
+        self.state = QUEUED
+        self.error = None
+        self.job_id = None  # The transfer job staging the files of the event, if any
+        self.merged_events = 1  # Number of events handled in the same pass
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        """Returns the task status."""
+        return {
+            "event_id": self.id,
+            "workflow_uid": self.workflow_uid,
+            "state": self.state,
+            "error": self.error,
+            "job_id": self.job_id,
+            "merged_events": self.merged_events,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class EventQueue:
+    """
+    Accepts workflow events at once and handles them on a bounded pool of worker threads.
+
+    Events of the same workflow uid are handled one after the other in the order they arrived,
+    events of different workflows in parallel. Events of a workflow that arrive while an earlier
+    one is still queued or being handled are merged into its next pass by the coalescer (see
+    `EventCoalescer.collect`), whose window delays that pass. At most `max_queued` events wait
+    at a time; further submissions are refused, so the sender backs off instead of piling up work.
+
+    With an event store, every accepted event is also stored durably and only deleted once it has
+    been handled and the transfer job staging its files has finished. While this process works on
+    an event it keeps extending the event's lease; events whose lease expired (their process died,
+    or handling them failed) and, on start, the events of the previous run of this service are
+    replayed, so a restart in the middle of staging resumes the copy instead of losing the event.
+    """
+
+    def __init__(self, workflow_event_handler, event_coalescer=None, event_store=None, max_workers=4,
+                 max_queued=1000, history_size=1000):
+        """
+        Args:
+            workflow_event_handler (WorkflowEventHandler): Handles the (merged) parsed events.
+            event_coalescer (EventCoalescer, optional): Merges events of a workflow; without one, the
+                events waiting for the same workflow are merged without a window.
+            event_store (EventStore, optional): Durable copy of the queued events.
+            max_workers (int): Number of events handled at the same time.
+            max_queued (int): Maximum number of events waiting to be handled.
+            history_size (int): Number of handled events kept for status queries.
+        """
+        self.workflow_event_handler = workflow_event_handler
+        self.event_coalescer = event_coalescer or EventCoalescer(window=0, max_delay=0)
+        self.event_store = event_store
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.history_size = history_size
+
+        self.pending = OrderedDict()  # workflow uid -> (batch, tasks) waiting, in the order they arrived
+        self.running = set()  # workflow uids with a pass in progress
+        self.tasks = OrderedDict()  # event ID -> EventTask
+        self.queued = 0
+        self.unacked = set()  # IDs of stored events whose lease this process keeps extending
+        self.stats = {"accepted": 0, "rejected": 0, "replayed": 0, "handled": 0, "failed": 0}
+
+        self._condition = threading.Condition()
+        self._closed = False
+        self._workers = []
+
+    def start(self) -> None:
+        """Replays the events interrupted by the previous run and starts the worker threads (once)."""
+        with self._condition:
+            if self._workers:
+                return
+            self._workers = [threading.Thread(target=self._work, name=f"event-worker-{index}", daemon=True)
+                             for index in range(self.max_workers)]
+
+        if self.event_store is not None:
+            self._recover(include_owned=True)
+            self._workers.append(threading.Thread(target=self._maintain, name="event-leases", daemon=True))
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, workflow_json: dict) -> EventTask:
+        """
+        Parses a workflow event and queues it.
+
+        Args:
+            workflow_json (dict): The Argo workflow of the event.
+
+        Returns:
+            EventTask: The queued event.
+
+        Raises:
+            EventQueueFull: If `max_queued` events are already waiting.
+            EventQueueClosed: If the queue has been shut down.
+        """
+        workflow_data = parse_argo_workflow(workflow_json)
+        task = EventTask(workflow_data.get("unique_id"))
+
+        # The slot is reserved together with the check, so concurrent submissions cannot overfill the queue
+        with self._condition:
+            if self._closed:
+                raise EventQueueClosed("The event queue is shutting down")
+            if self.queued >= self.max_queued:
+                self.stats["rejected"] += 1
+                raise EventQueueFull(f"{self.queued} workflow events are already queued")
+            self.queued += 1
+
+        # The event is accepted only once it is stored
+        if self.event_store is not None:
+            try:
+                self.event_store.put(task.id, task.workflow_uid, workflow_data)
+            except Exception:
+                with self._condition:
+                    self.queued -= 1
+                raise
+        self._enqueue(task, workflow_data, reserved=True)
+        with self._condition:
+            self.stats["accepted"] += 1
+
+        self.start()
+        return task
+
+    def get_task(self, event_id):
+        """Returns the event with the given ID, or None."""
+        with self._condition:
+            return self.tasks.get(event_id)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the number of waiting and running events, of accepted, refused, replayed, handled and
+        failed ones and, with an event store, of the stored ones.
+        """
+        with self._condition:
+            stats = dict(self.stats, queued=self.queued, running=len(self.running), workers=self.max_workers,
+                         max_queued=self.max_queued)
+        if self.event_store is not None:
+            try:
+                stats["stored"] = self.event_store.count()
+            except Exception as e:
+                print(f"[ERROR] Failed to count the stored workflow events: {e}")
+        return stats
+
+    def shutdown(self, wait=True) -> None:
+        """Refuses further events; the workers exit once the queued ones have been handled."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _enqueue(self, task, workflow_data, reserved=False):
+        """Adds an event to the pending pass of its workflow; `reserved` if `submit` already counted it."""
+        with self._condition:
+            # Events without a uid cannot belong to the same workflow as another one
+            key = task.workflow_uid or task.id
+            batch, tasks = self.pending.get(key, (None, []))
+            self.pending[key] = (self.event_coalescer.collect(batch, workflow_data), tasks + [task])
+            self.tasks[task.id] = task
+            if not reserved:
+                self.queued += 1
+            self.workflow_event_handler.expect(task.workflow_uid)
+            if self.event_store is not None:
+                self.unacked.add(task.id)
+            self._prune()
+            self._condition.notify()
+
+    def _recover(self, include_owned=False):
+        """Queues the stored events that no process is working on any more."""
+        try:
+            events = self.event_store.recover(include_owned)
+        except Exception as e:
+            print(f"[ERROR] Failed to recover stored workflow events: {e}")
+            return
+
+        for event_id, workflow_uid, workflow_data in events:
+            with self._condition:
+                task = self.tasks.get(event_id)
+                if task is not None and task.state not in FINISHED_STATES:
+                    continue
+                self.stats["replayed"] += 1
+            print(f"[INFO] Replaying stored event {event_id} of workflow {workflow_uid}")
+            self._enqueue(EventTask(workflow_uid, event_id), workflow_data)
+
+    def _maintain(self):
+        """Extends the leases of the events of this process and replays expired ones, until shut down."""
+        interval = self.event_store.visibility_timeout / 3
+        while True:
+            with self._condition:
+                if self._condition.wait_for(lambda: self._closed, interval):
+                    return
+                event_ids = list(self.unacked)
+            try:
+                self.event_store.extend(event_ids)
+            except Exception as e:
+                print(f"[ERROR] Failed to extend the leases of stored workflow events: {e}")
+            self._recover()
+
+    def _ack(self, event_ids):
+        """Deletes the stored copies of handled events."""
+        try:
+            self.event_store.ack(event_ids)
+        except Exception as e:
+            # The events are replayed once their lease has expired; handling them again is harmless
+            print(f"[ERROR] Failed to ack stored workflow events: {e}")
+        with self._condition:
+            self.unacked.difference_update(event_ids)
+
+    def _work(self):
+        """Handles the passes that are due, one workflow at a time per worker."""
+        while True:
+            with self._condition:
+                while True:
+                    key, wait = self._next_due()
+                    if key is not None:
+                        break
+                    if self._closed and not self.pending:
+                        return
+                    self._condition.wait(wait)
+
+                batch, tasks = self.pending.pop(key)
+                self.running.add(key)
+                self.queued -= len(tasks)
+
+            try:
+                self._handle(key, batch, tasks)
+            finally:
+                with self._condition:
+                    self.running.discard(key)
+                    self._condition.notify_all()
+
+    def _next_due(self):
+        """
+        Returns the workflow whose pass is due and not blocked by a running one, oldest first, or
+        None and the seconds until the next one is due. The caller holds the lock.
+        """
+        now = time.monotonic()
+        wait = None
+        for key, (batch, _) in self.pending.items():
+            if key in self.running:
+                continue
+            remaining = batch.deadline - now
+            if remaining <= 0:
+                return key, None
+            wait = remaining if wait is None else min(wait, remaining)
+        return None, wait
+
+    def _handle(self, key, batch, tasks):
+        """Runs the pass of a batch and records its outcome in all of its events."""
+        started_at = time.time()
+        for task in tasks:
+            task.state, task.started_at, task.merged_events = RUNNING, started_at, len(tasks)
+
+        self.event_coalescer.count_pass(key, batch)
+        try:
+            job = self.workflow_event_handler.handle_workflow_data(batch.data)
+            state, error, job_id = SUCCEEDED, None, job.id if job is not None else None
+        except Exception as e:
+            print(f"[ERROR] Failed to handle event of workflow {key}: {e}")
+            state, error, job_id = FAILED, str(e), None
+        for task in tasks:
+            self.workflow_event_handler.settle(task.workflow_uid)
+
+        finished_at = time.time()
+        with self._condition:
+            for task in tasks:
+                task.state, task.error, task.job_id, task.finished_at = state, error, job_id, finished_at
+            self.stats["handled" if state == SUCCEEDED else "failed"] += len(tasks)
+
+        if self.event_store is None:
+            return
+        event_ids = [task.id for task in tasks]
+        if state == FAILED:
+            # The lease runs out and the events are replayed, up to the attempts of the store
+            with self._condition:
+                self.unacked.difference_update(event_ids)
+        elif job is None:
+            self._ack(event_ids)
+        else:
+            # The events stay stored until their files are staged, so an interrupted copy is resumed
+            job.add_done_callback(lambda _: self._ack(event_ids))
+
+    def _prune(self):
+        """Forgets the oldest handled events beyond `history_size`. The caller holds the lock."""
+        finished = [event_id for event_id, task in self.tasks.items() if task.state in FINISHED_STATES]
+        for event_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self.tasks[event_id]
@@ -0,0 +1,208 @@
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+from pymongo import ASCENDING, ReturnDocument
+
+# Collection holding the workflow events that have not been fully handled yet
+EVENT_COLLECTION = "workflowEvents"
+
+
+class EventStore:
+    """
+    Durable copy of the workflow events an EventQueue holds in memory.
+
+    Every stored event is leased by the process that holds it: it is stored with a lease of
+    `visibility_timeout` seconds, which the process extends as long as it still works on the
+    event, and deleted (acked) once the event has been handled and its files are staged. An
+    event whose lease ran out, because its process died or gave up on it, becomes visible and is
+    claimed by the next `recover` of any process. On boot, a process additionally claims the
+    events of its `owner` name (by default the host name), so a restarted service resumes its
+    interrupted events without waiting for their leases to expire. Events that were claimed more
+    than `max_attempts` times are marked dead and left for inspection.
+    """
+
+    def __init__(self, visibility_timeout=300, max_attempts=3, owner=None):
+        """
+        Args:
+            visibility_timeout (float): Seconds after which an event that was not extended or acked is replayed.
+            max_attempts (int): Number of times an event is handled before it is given up.
+            owner (str, optional): Name identifying this service instance across restarts (default: host name).
+        """
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.owner = owner or socket.gethostname()
+
+    def put(self, event_id, workflow_uid, workflow_data: dict) -> None:
+        """Stores a new event, leased by this process."""
+        raise NotImplementedError
+
+    def extend(self, event_ids) -> None:
+        """Renews the leases of events this process is still working on."""
+        raise NotImplementedError
+
+    def ack(self, event_ids) -> None:
+        """Deletes handled events."""
+        raise NotImplementedError
+
+    def recover(self, include_owned=False) -> list:
+        """
+        Claims the events whose lease has expired (and, with `include_owned`, those of this owner).
+
+        Returns:
+            list: (event_id, workflow_uid, workflow_data) of the claimed events, oldest first.
+        """
+        raise NotImplementedError
+
+    def count(self) -> dict:
+        """Returns the number of stored events that are pending and that were given up."""
+        raise NotImplementedError
+
+
+class MongoEventStore(EventStore):
+    """EventStore keeping the events in a collection of the state store."""
+
+    def __init__(self, mongoDB_manager, collection_name=EVENT_COLLECTION, **settings):
+        """
+        Args:
+            mongoDB_manager (MongoDBManager): Manager providing the state store.
+            collection_name (str): Collection holding the events.
+            **settings: See `EventStore`.
+        """
+        super().__init__(**settings)
+        self.events = mongoDB_manager.get_collection(collection_name)
+        self.events.create_index([("dead", ASCENDING), ("leased_until", ASCENDING)])
+
+    def put(self, event_id, workflow_uid, workflow_data: dict) -> None:
+        now = time.time()
+        self.events.insert_one({
+            "_id": event_id, "workflow_uid": workflow_uid, "data": workflow_data, "created_at": now,
+            "owner": self.owner, "leased_until": now + self.visibility_timeout, "attempts": 1, "dead": False,
+        })
+
+    def extend(self, event_ids) -> None:
+        if event_ids:
+            self.events.update_many({"_id": {"$in": list(event_ids)}, "dead": False},
+                                    {"$set": {"owner": self.owner,
+                                              "leased_until": time.time() + self.visibility_timeout}})
+
+    def ack(self, event_ids) -> None:
+        if event_ids:
+            self.events.delete_many({"_id": {"$in": list(event_ids)}})
+
+    def recover(self, include_owned=False) -> list:
+        now = time.time()
+        visible = [{"leased_until": {"$lt": now}}] + ([{"owner": self.owner}] if include_owned else [])
+        query = {"dead": False, "$or": visible}
+
+        claimed = []
+        for candidate in list(self.events.find(query, {"_id": 1}).sort("created_at", ASCENDING)):
+            # Claiming one event at a time is atomic, so concurrent recoveries never share an event
+            event = self.events.find_one_and_update(
+                dict(query, _id=candidate["_id"]),
+                {"$set": {"owner": self.owner, "leased_until": now + self.visibility_timeout},
+                 "$inc": {"attempts": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if event is None:
+                continue
+            if event["attempts"] > self.max_attempts:
+                print(f"[WARNING] Giving up workflow event {event['_id']} after {self.max_attempts} attempts")
+                self.events.update_one({"_id": event["_id"]}, {"$set": {"dead": True}})
+                continue
+            claimed.append((event["_id"], event.get("workflow_uid"), event["data"]))
+        return claimed
+
+    def count(self) -> dict:
+        return {"pending": self.events.count_documents({"dead": False}),
+                "dead": self.events.count_documents({"dead": True})}
+
+
+class SQLiteEventStore(EventStore):
+    """EventStore keeping the events in a local SQLite file, for local runs without the state store."""
+
+    def __init__(self, path="workflow_events.sqlite", **settings):
+        """
+        Args:
+            path (str): The SQLite database file.
+            **settings: See `EventStore`.
+        """
+        super().__init__(**settings)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS events (id TEXT PRIMARY KEY, workflow_uid TEXT, data TEXT NOT NULL, "
+            "created_at REAL NOT NULL, owner TEXT, leased_until REAL NOT NULL, attempts INTEGER NOT NULL, "
+            "dead INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def put(self, event_id, workflow_uid, workflow_data: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO events (id, workflow_uid, data, created_at, owner, leased_until, attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1)",
+                (event_id, workflow_uid, json.dumps(workflow_data), now, self.owner, now + self.visibility_timeout)
+            )
+
+    def extend(self, event_ids) -> None:
+        event_ids = list(event_ids)
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE events SET owner = ?, leased_until = ? WHERE id = ? AND dead = 0",
+                [(self.owner, time.time() + self.visibility_timeout, event_id) for event_id in event_ids]
+            )
+
+    def ack(self, event_ids) -> None:
+        with self._lock:
+            self._connection.executemany("DELETE FROM events WHERE id = ?", [(event_id,) for event_id in event_ids])
+
+    def recover(self, include_owned=False) -> list:
+        now = time.time()
+        with self._lock:
+            # An immediate transaction keeps other processes using the same file from claiming the same events
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    "SELECT id, workflow_uid, data, attempts FROM events "
+                    "WHERE dead = 0 AND (leased_until < ? OR (? AND owner = ?)) ORDER BY created_at",
+                    (now, include_owned, self.owner)
+                ).fetchall()
+
+                claimed = []
+                for event_id, workflow_uid, data, attempts in rows:
+                    if attempts + 1 > self.max_attempts:
+                        print(f"[WARNING] Giving up workflow event {event_id} after {self.max_attempts} attempts")
+                        self._connection.execute("UPDATE events SET dead = 1 WHERE id = ?", (event_id,))
+                        continue
+                    self._connection.execute(
+                        "UPDATE events SET owner = ?, leased_until = ?, attempts = attempts + 1 WHERE id = ?",
+                        (self.owner, now + self.visibility_timeout, event_id)
+                    )
+                    claimed.append((event_id, workflow_uid, json.loads(data)))
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def count(self) -> dict:
+        with self._lock:
+            pending, dead = self._connection.execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM events").fetchone()
+        return {"pending": pending, "dead": dead}
+
+
+def create_event_store(mongoDB_manager, backend="mongo", **settings) -> EventStore:
+    """
+    Creates the event store configured in the cache settings, e.g.
+    `"event_store": {"backend": "sqlite", "path": "/data/events.sqlite", "visibility_timeout": 120}`.
+    """
+    if backend == "sqlite":
+        return SQLiteEventStore(**settings)
+    if backend == "mongo":
+        return MongoEventStore(mongoDB_manager, **settings)
+    raise ValueError(f"Unknown event store backend '{backend}'")
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+
+
+class EvictionPolicy:
+    """
+    Base class for cache eviction policies.
+
+    A policy turns cache events into a numeric `priority` that is stored on every cache entry.
+    The CacheManager evicts entries in ascending priority order through the (cache_id, priority)
+    index, so a policy never needs to see the whole cache. Policy-wide state (such as an aging
+    clock) is exposed through `get_state` and persisted in the cache meta document.
+    """
+
+    name = None
+
+    def __init__(self, state: dict = None, **options):
+        self.options = options
+        self.load_state(state or {})
+
+    def on_insert(self, entry: dict, now: float) -> dict:
+        """
+        Returns the fields to store on a newly admitted entry.
+
+        Args:
+            entry (dict): The new entry, containing at least `file_name` and `size`.
+            now (float): The insertion time.
+        """
+        raise NotImplementedError
+
+    def on_access(self, entry: dict, now: float) -> dict:
+        """
+        Returns the fields to update when an entry is accessed.
+
+        Args:
+            entry (dict): The entry as stored, with `hits` already including this access.
+            now (float): The access time.
+        """
+        raise NotImplementedError
+
+    def on_evict(self, entry: dict) -> None:
+        """Updates the policy state after `entry` has been evicted."""
+
+    def load_state(self, state: dict) -> None:
+        """Restores policy state previously returned by `get_state`."""
+
+    def get_state(self) -> dict:
+        """Returns the policy state that must survive restarts."""
+        return {}
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least recently used: the priority is the last access time."""
+
+    name = "lru"
+
+    def on_insert(self, entry, now):
+        return {"priority": now}
+
+    def on_access(self, entry, now):
+        return {"priority": now}
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least frequently used with dynamic aging (LFU-DA).
+
+    The priority is `clock + hits`, where the clock is raised to the priority of every evicted
+    entry. Entries that were popular long ago therefore age out instead of staying forever.
+    """
+
+    name = "lfu"
+
+    def load_state(self, state):
+        self.clock = state.get("clock", 0.0)
+
+    def get_state(self):
+        return {"clock": self.clock}
+
+    def on_insert(self, entry, now):
+        return {"priority": self.clock + 1}
+
+    def on_access(self, entry, now):
+        return {"priority": self.clock + entry.get("hits", 1)}
+
+    def on_evict(self, entry):
+        self.clock = max(self.clock, entry.get("priority", self.clock))
+
+
+class GDSFPolicy(LFUPolicy):
+    """
+    GreedyDual-Size-Frequency.
+
+    The priority is `clock + hits * cost / size`, with the cost of a miss modelled as the time
+    needed to fetch the file from the secondary endpoint: a fixed per-transfer overhead plus
+    the size divided by the transfer bandwidth. Small, frequently used files get the highest
+    priority, while large files are kept only when they are requested repeatedly.
+
+    Options:
+        fixed_cost (float): Per-transfer overhead in seconds (default: 1.0).
+        bandwidth (float): Secondary to primary throughput in bytes per second (default: 50 MB/s).
+    """
+
+    name = "gdsf"
+
+    def _value(self, entry):
+        size = max(entry.get("size", 1), 1)
+        fixed_cost = float(self.options.get("fixed_cost", 1.0))
+        bandwidth = float(self.options.get("bandwidth", 50_000_000))
+        cost = fixed_cost + size / bandwidth
+        return entry.get("hits", 1) * cost / size
+
+    def on_insert(self, entry, now):
+        return {"priority": self.clock + self._value(dict(entry, hits=1))}
+
+    def on_access(self, entry, now):
+        return {"priority": self.clock + self._value(entry)}
+
+
+class TwoQPolicy(EvictionPolicy):
+    """
+    Simplified 2Q.
+
+    New files enter the probationary `a1in` segment and are evicted in FIFO order before any
+    file of the protected `am` segment. A file is promoted to `am` when it is accessed again,
+    or when it is re-admitted while it is still remembered in the bounded list of files
+    recently evicted from `a1in` (the ghost entries). One-off sweeps therefore only churn the probationary segment.
+
+    Options:
+        ghost_entries (int): Number of evicted probationary file names to remember (default: 1000).
+    """
+
+    name = "2q"
+
+    # Added to the priority of protected entries so they always sort after probationary ones
+    PROTECTED_OFFSET = 1e11
+
+    def load_state(self, state):
+        self.ghosts = OrderedDict((name, None) for name in state.get("ghosts", []))
+
+    def get_state(self):
+        return {"ghosts": list(self.ghosts)}
+
+    def on_insert(self, entry, now):
+        if self.ghosts.pop(entry["file_name"], False) is None:
+            return {"priority": now + self.PROTECTED_OFFSET, "segment": "am"}
+        return {"priority": now, "segment": "a1in"}
+
+    def on_access(self, entry, now):
+        return {"priority": now + self.PROTECTED_OFFSET, "segment": "am"}
+
+    def on_evict(self, entry):
+        if entry.get("segment") == "a1in":
+            self.ghosts[entry["file_name"]] = None
+            self.ghosts.move_to_end(entry["file_name"])
+            while len(self.ghosts) > int(self.options.get("ghost_entries", 1000)):
+                self.ghosts.popitem(last=False)
+
+
+EVICTION_POLICIES = {policy.name: policy for policy in (LRUPolicy, LFUPolicy, GDSFPolicy, TwoQPolicy)}
+
+
+def create_eviction_policy(name: str = "lru", state: dict = None, **options) -> EvictionPolicy:
+    """
+    Creates an eviction policy by name.
+
+    Args:
+        name (str): One of "lru", "lfu", "gdsf" or "2q".
+        state (dict, optional): Previously persisted policy state.
+        options: Policy specific options.
+
+    Returns:
+        EvictionPolicy: The policy instance.
+    """
+    try:
+        policy_class = EVICTION_POLICIES[(name or "lru").lower()]
+    except KeyError:
+        raise ValueError(f"Unknown eviction policy '{name}'. Available: {', '.join(EVICTION_POLICIES)}")
+    return policy_class(state, **options)
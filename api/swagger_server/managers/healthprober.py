@@ -0,0 +1,153 @@
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Overall states of a probe snapshot
+HEALTHY = "healthy"
+DEGRADED = "degraded"  # rclone and MongoDB work, but a remote cannot be reached
+UNHEALTHY = "unhealthy"
+UNKNOWN = "unknown"  # Not probed yet
+
+
+class HealthProber:
+    """
+    Checks the dependencies of the service on a background thread and keeps the latest results,
+    so health requests are answered from memory instead of forking rclone on every probe.
+
+    Every `interval` seconds it checks rclone (through the daemon, or the binary when the daemon is
+    not used), pings MongoDB and lists the top level of every configured remote, recording whether
+    each one works and how long it took. Checks run in parallel and are given up after `timeout`
+    seconds; a check that still hangs from an earlier round is not started again until it returns.
+    """
+
+    def __init__(self, rclone_manager, mongoDB_manager, interval=15, timeout=5, max_workers=8):
+        """
+        Args:
+            rclone_manager (RcloneManager): Provides the rclone daemon and the configured remotes.
+            mongoDB_manager (MongoDBManager): Provides the MongoDB client.
+            interval (float): Seconds between two probes.
+            timeout (float): Seconds after which a check counts as failed.
+            max_workers (int): Number of checks run at the same time.
+        """
+        self.rclone_manager = rclone_manager
+        self.mongoDB_manager = mongoDB_manager
+        self.interval = interval
+        self.timeout = timeout
+
+        self._snapshot = {"status": UNKNOWN, "checked_at": None, "duration_ms": None, "dependencies": {}}
+        self._running = {}  # (group, name) -> future of a check that had not returned in its round
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="health-probe")
+        self._thread = None
+
+    def start(self) -> None:
+        """Probes once, so a snapshot exists, and then keeps probing in the background (once)."""
+        if self._thread is not None:
+            return
+        self.probe()
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops probing."""
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+    def get_snapshot(self) -> dict:
+        """Returns the results of the latest probe and their age in seconds."""
+        with self._lock:
+            snapshot = self._snapshot
+        age = None if snapshot["checked_at"] is None else round(time.time() - snapshot["checked_at"], 3)
+        return dict(snapshot, age_seconds=age)
+
+    def is_stale(self) -> bool:
+        """Returns True if no probe finished for several intervals, i.e. the prober is stuck."""
+        with self._lock:
+            checked_at = self._snapshot["checked_at"]
+        return checked_at is None or time.time() - checked_at > 3 * self.interval + self.timeout
+
+    def probe(self) -> dict:
+        """Runs all checks and stores their results as the new snapshot."""
+        started = time.time()
+        checks = {("rclone", None): self._check_rclone, ("mongodb", None): self._check_mongodb}
+        for remote in list(self.rclone_manager.endpoints):
+            checks[("remotes", remote)] = lambda remote=remote: self._check_remote(remote)
+
+        futures = {}
+        for key, check in checks.items():
+            future = self._running.get(key)
+            if future is None or future.done():
+                future = self._executor.submit(self._timed, check)
+            futures[key] = future
+        wait(futures.values(), timeout=self.timeout)
+
+        dependencies = {"remotes": {}}
+        self._running = {}
+        for (group, name), future in futures.items():
+            if future.done():
+                result = future.result()
+            else:
+                self._running[(group, name)] = future
+                result = {"healthy": False, "latency_ms": None, "error": f"No answer within {self.timeout}s"}
+            if name is None:
+                dependencies[group] = result
+            else:
+                dependencies[group][name] = result
+
+        if not (dependencies["rclone"]["healthy"] and dependencies["mongodb"]["healthy"]):
+            status = UNHEALTHY
+        elif not all(result["healthy"] for result in dependencies["remotes"].values()):
+            status = DEGRADED
+        else:
+            status = HEALTHY
+
+        snapshot = {"status": status, "checked_at": time.time(),
+                    "duration_ms": round((time.time() - started) * 1000, 1), "dependencies": dependencies}
+        with self._lock:
+            self._snapshot = snapshot
+        if status != HEALTHY:
+            print(f"[WARNING] Health probe: service is {status}")
+        return snapshot
+
+    def _run(self):
+        """Probes every `interval` seconds until stopped."""
+        while not self._stop.wait(self.interval):
+            try:
+                self.probe()
+            except Exception as e:
+                print(f"[ERROR] Health probe failed: {e}")
+
+    @staticmethod
+    def _timed(check) -> dict:
+        """Runs a check and returns whether it passed, its latency and its error."""
+        started = time.perf_counter()
+        try:
+            detail = check()
+            result = {"healthy": True, "error": None}
+        except Exception as e:
+            detail, result = None, {"healthy": False, "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if detail:
+            result["detail"] = detail
+        return result
+
+    def _check_rclone(self):
+        daemon = self.rclone_manager.daemon
+        if daemon is not None and daemon.is_running():
+            return f"rclone rcd {daemon.call('core/version').get('version', '')}".strip()
+
+        result = subprocess.run(["rclone", "version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or "Rclone not working")
+        return result.stdout.split("\n", 1)[0]
+
+    def _check_mongodb(self):
+        self.mongoDB_manager.client.admin.command("ping")
+
+    def _check_remote(self, remote):
+        success, output = self.rclone_manager.list_folders(remote)
+        if not success:
+            raise RuntimeError(output)
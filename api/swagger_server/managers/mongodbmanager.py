@@ -1,30 +1,86 @@
 import os
-from pymongo import MongoClient
+import threading
+from pymongo import MongoClient, ReadPreference
 from .awssecretsmanager import get_aws_secret  # Import AWS Secrets Manager function
 
-class MongoDBManager:
-    def __init__(self, db_name=None, collection_name=None):
-        """
-        Initializes MongoDB connection using credentials from AWS Secrets Manager.
-        """
-        try:
+# Pool, timeout and server selection settings of the shared clients, read from the environment
+CLIENT_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", 50),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", 0),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", 300000),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", 5000),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", 30000),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+    "localThresholdMS": ("MONGO_LOCAL_THRESHOLD_MS", 15),
+}
+
+_shared_clients = {}  # AWS secret name -> (MongoClient, default database name)
+_shared_clients_lock = threading.Lock()
+
+
+def get_client_options() -> dict:
+    """Returns the MongoClient pool and timeout options, e.g. `MONGO_MAX_POOL_SIZE=100` for maxPoolSize."""
+    return {option: int(os.getenv(variable, default)) for option, (variable, default) in CLIENT_OPTIONS.items()}
+
+
+def get_shared_client(secret_name="replicationDB_secret"):
+    """
+    Returns the process-wide MongoClient for a database secret, and the database named in the secret.
+
+    The client is created, and the connection checked, on first use. All MongoDBManager instances, and so
+    the cache state, the cache entries, the stored events and the file sets, share its connection pool
+    instead of each opening their own connections with a TLS handshake and replica set discovery.
+    """
+    with _shared_clients_lock:
+        if secret_name not in _shared_clients:
             # Fetch credentials from AWS Secrets Manager
-            secret_data = get_aws_secret("replicationDB_secret")  # Replace with your AWS secret name
+            secret_data = get_aws_secret(secret_name)
 
             # Construct MongoDB connection URI
             mongo_uri = f"mongodb://{secret_data['username']}:{secret_data['password']}@{secret_data['host']}:27017/?tls=true&tlsCAFile=global-bundle.pem&replicaSet=rs0&readPreference=secondaryPreferred&retryWrites=false"
 
-            # Establish connection
-            self.client = MongoClient(mongo_uri, tls=True, retryWrites=False)
-            self.db = self.client[db_name or secret_data.get("database", "replicationDB")]
-            self.collection = self.db[collection_name or "cacheState"]
+            options = get_client_options()
+            client = MongoClient(mongo_uri, tls=True, retryWrites=False, **options)
+            try:
+                client.admin.command("ping")
+            except Exception as e:
+                client.close()
+                print("Connection failed:", e)
+                raise
+
+            print(f"Successfully connected to AWS DocumentDB! (pool of up to {options['maxPoolSize']} connections)")
+            _shared_clients[secret_name] = (client, secret_data.get("database", "replicationDB"))
+        return _shared_clients[secret_name]
 
-            print("Successfully connected to AWS DocumentDB!")
-            print("Databases:", self.client.list_database_names())
 
-        except Exception as e:
-            print("Connection failed:", e)
-            raise
+def close_shared_clients() -> None:
+    """Closes the shared clients, e.g. on shutdown; the next use connects again."""
+    with _shared_clients_lock:
+        clients = list(_shared_clients.values())
+        _shared_clients.clear()
+    for client, _ in clients:
+        client.close()
+
+
+class MongoDBManager:
+    def __init__(self, db_name=None, collection_name=None):
+        """
+        Provides a database and collection of the shared MongoDB client (see `get_shared_client`).
+
+        Reads go to the primary, whatever the read preference of the URI: the cache state, entries and
+        stored events are read to decide what to write next, so a lagging secondary could e.g. report
+        a file as cached after it was evicted, or a stored event as unclaimed.
+        """
+        self.client, default_db_name = get_shared_client()
+        self.db = self.client.get_database(db_name or default_db_name, read_preference=ReadPreference.PRIMARY)
+        self.collection = self.db[collection_name or "cacheState"]
+
+    def get_collection(self, collection_name):
+        """
+        Returns another collection from the same database (e.g. per-file cache entries).
+        """
+        return self.db[collection_name]
 
     def insert_event(self, event_data):
         """
@@ -50,6 +106,6 @@ class MongoDBManager:
 
     def close_connection(self):
         """
-        Closes the MongoDB connection.
+        Closes the MongoDB connections of this process, which all managers share.
         """
-        self.client.close()
+        close_shared_clients()
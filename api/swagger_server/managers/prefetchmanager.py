@@ -0,0 +1,119 @@
+import time
+import threading
+from collections import Counter, defaultdict
+
+from pymongo import DESCENDING
+
+# Collection holding the file set requested by each workflow
+FILE_SET_COLLECTION = "fileSets"
+
+
+class PrefetchManager:
+    """
+    Predicts which files are likely to be requested together, based on the file sets of
+    earlier workflow events.
+
+    Every workflow's file set is recorded once (keyed by its uid) in the state store. An
+    in-memory co-occurrence model is built from the most recent sets: for a requested set S,
+    a file c is predicted when, for some a in S, the confidence count(a, c) / count(a) reaches
+    `min_confidence` and a occurred in at least `min_support` sets.
+    """
+
+    def __init__(self, mongoDB_manager, history_size=500, min_support=2, min_confidence=0.5,
+                 max_files=20, refresh_interval=300, max_set_size=200):
+        """
+        Args:
+            mongoDB_manager (MongoDBManager): Manager providing the state store.
+            history_size (int): Number of most recent file sets the model is built from.
+            min_support (int): Minimum number of sets a requested file must occur in.
+            min_confidence (float): Minimum conditional probability of a companion file.
+            max_files (int): Maximum number of files predicted per event.
+            refresh_interval (int): Seconds after which the model is rebuilt from the state store.
+            max_set_size (int): Larger file sets are stored but left out of the (quadratic) pair counts.
+        """
+        self.file_sets = mongoDB_manager.get_collection(FILE_SET_COLLECTION)
+        self.history_size = history_size
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self.max_files = max_files
+        self.refresh_interval = refresh_interval
+        self.max_set_size = max_set_size
+
+        self._lock = threading.Lock()
+        self._known_sets = set()
+        self._file_counts = Counter()
+        self._pair_counts = defaultdict(Counter)
+        self._last_refresh = 0
+
+        self.file_sets.create_index([("recorded_at", DESCENDING)])
+
+    def record_file_set(self, workflow_uid, files) -> None:
+        """
+        Stores the file set of a workflow and adds it to the model. Repeated events of the same
+        workflow are recorded once.
+        """
+        files = sorted(set(files or []))
+        if len(files) < 2 or not workflow_uid:
+            return
+
+        self.file_sets.update_one(
+            {"_id": workflow_uid},
+            {"$set": {"files": files, "recorded_at": time.time()}},
+            upsert=True
+        )
+
+        with self._lock:
+            if workflow_uid not in self._known_sets:
+                self._add_to_model(workflow_uid, files)
+
+    def predict(self, requested_files) -> list:
+        """
+        Returns the likely companion files of a request, most confident first.
+
+        Args:
+            requested_files (list): The files requested by a workflow.
+
+        Returns:
+            list: Predicted files that are not part of the request.
+        """
+        self._refresh_if_stale()
+        requested = set(requested_files or [])
+
+        with self._lock:
+            confidence = {}
+            for file_name in requested:
+                support = self._file_counts.get(file_name, 0)
+                if support < self.min_support:
+                    continue
+                for companion, count in self._pair_counts.get(file_name, {}).items():
+                    if companion not in requested:
+                        confidence[companion] = max(confidence.get(companion, 0), count / support)
+
+        predicted = [name for name, value in confidence.items() if value >= self.min_confidence]
+        predicted.sort(key=lambda name: (-confidence[name], name))
+        return predicted[:self.max_files]
+
+    def _refresh_if_stale(self):
+        """Rebuilds the model from the most recent file sets in the state store."""
+        if time.time() - self._last_refresh < self.refresh_interval:
+            return
+
+        recent = list(self.file_sets.find({}, {"files": 1}).sort("recorded_at", DESCENDING).limit(self.history_size))
+
+        with self._lock:
+            self._known_sets = set()
+            self._file_counts = Counter()
+            self._pair_counts = defaultdict(Counter)
+            for file_set in recent:
+                self._add_to_model(file_set["_id"], file_set.get("files", []))
+            self._last_refresh = time.time()
+
+    def _add_to_model(self, set_id, files):
+        """Counts a file set in the co-occurrence model. The caller holds the lock."""
+        self._known_sets.add(set_id)
+        if len(files) > self.max_set_size:
+            return
+
+        self._file_counts.update(files)
+        for file_name in files:
+            self._pair_counts[file_name].update(other for other in files if other != file_name)
@@ -0,0 +1,240 @@
+import atexit
+import base64
+import http.client
+import json
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import threading
+import time
+
+
+class RcloneDaemonError(Exception):
+    """Raised when the rclone remote control daemon cannot be reached."""
+
+
+class RcloneDaemonNoAnswer(RcloneDaemonError):
+    """Raised when a command was sent to the daemon but no answer came back; the daemon may have run it."""
+
+
+class RcloneDaemon:
+    """
+    Long-lived `rclone rcd` process driven through its remote control HTTP API.
+
+    Running every operation in one daemon avoids forking a new rclone process per call, which
+    re-reads the config file and re-establishes the TLS connections to the remotes each time.
+    Requests are sent over a small pool of keep-alive connections, so concurrent callers do
+    not serialize on a single socket.
+
+    When `address` is given, an already running daemon (e.g. a sidecar) is used instead of
+    starting one.
+    """
+
+    def __init__(self, address=None, user=None, password=None, pool_size=4, start_timeout=10, timeout=3600,
+                 retry_interval=60, idle_timeout=30):
+        """
+        Args:
+            address (str, optional): host:port of a running daemon; a local one is started if omitted.
+            user (str, optional): rc user of the running daemon.
+            password (str, optional): rc password of the running daemon.
+            pool_size (int): Maximum number of idle keep-alive connections kept in the pool.
+            start_timeout (int): Seconds to wait for a started daemon to answer.
+            timeout (int): Socket timeout in seconds of a single call (copies can take long).
+            retry_interval (int): Seconds to wait before starting the daemon again after a failed start.
+            idle_timeout (int): Seconds a pooled connection may be idle before it is closed instead of
+                reused; keep it below the idle timeout of the daemon.
+        """
+        self.external = address is not None
+        self.address = address
+        self.user = user
+        self.password = password
+        self.pool_size = pool_size
+        self.start_timeout = start_timeout
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.idle_timeout = idle_timeout
+
+        self.process = None
+        self._failed_at = None
+        self._stop_registered = False
+        self._pool = queue.LifoQueue(maxsize=pool_size)  # (connection, time it became idle)
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the local daemon if needed and waits until it answers.
+
+        Raises:
+            RcloneDaemonError: If the daemon cannot be started or does not answer in time.
+        """
+        with self._lock:
+            if self.external or self.is_running():
+                return
+
+            port = _free_port()
+            self.address = f"127.0.0.1:{port}"
+            self.user = "replication"
+            self.password = secrets.token_urlsafe(24)
+
+            # The credentials are passed in the environment, where `ps` does not show them
+            env = dict(os.environ, RCLONE_S3_NO_CHECK_BUCKET="true", RCLONE_RC_USER=self.user,
+                       RCLONE_RC_PASS=self.password)
+            try:
+                self.process = subprocess.Popen(
+                    ["rclone", "rcd", f"--rc-addr={self.address}"],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+                )
+            except OSError as e:
+                raise RcloneDaemonError(f"Failed to start rclone rcd: {e}")
+            if not self._stop_registered:
+                atexit.register(self.stop)
+                self._stop_registered = True
+
+        deadline = time.time() + self.start_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RcloneDaemonError(f"rclone rcd exited with code {self.process.returncode}")
+            try:
+                self.call("rc/noop")
+                print(f"[INFO] rclone rcd listening on {self.address}")
+                return
+            except RcloneDaemonError:
+                time.sleep(0.1)
+
+        self.stop()
+        raise RcloneDaemonError(f"rclone rcd did not answer within {self.start_timeout}s")
+
+    def ensure_started(self):
+        """
+        Starts the daemon on first use, or again after it died. A failed start is not retried
+        for `retry_interval` seconds, so callers can fall back without waiting on every call.
+
+        Raises:
+            RcloneDaemonError: If the daemon is not available.
+        """
+        if self.is_running():
+            return
+        if self._failed_at and time.time() - self._failed_at < self.retry_interval:
+            raise RcloneDaemonError("rclone rcd is unavailable")
+
+        try:
+            self.start()
+            self._failed_at = None
+        except RcloneDaemonError as e:
+            self._failed_at = time.time()
+            print(f"[WARNING] {e}; falling back to one rclone process per operation")
+            raise
+
+    def stop(self):
+        """Closes the pooled connections and terminates a daemon started by this instance."""
+        while True:
+            try:
+                self._pool.get_nowait()[0].close()
+            except queue.Empty:
+                break
+
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def is_running(self) -> bool:
+        """Returns True if the daemon is (assumed to be) reachable."""
+        if self.external:
+            return True
+        return self.process is not None and self.process.poll() is None
+
+    def call(self, command: str, **params) -> dict:
+        """
+        Runs a remote control command, e.g. `call("operations/list", fs="remote:", remote="")`.
+
+        Returns:
+            dict: The decoded response.
+
+        Raises:
+            RcloneDaemonError: If the daemon cannot be reached, so the command was not sent.
+            RcloneDaemonNoAnswer: If the command was sent but its answer was lost or timed out.
+            RuntimeError: If rclone reports an error for the command.
+        """
+        if self.address is None:
+            raise RcloneDaemonError("rclone rcd is not started")
+
+        body = json.dumps(params).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.user:
+            token = base64.b64encode(f"{self.user}:{self.password}".encode("utf-8")).decode("ascii")
+            headers["Authorization"] = f"Basic {token}"
+
+        # A pooled connection may have been closed by the daemon. Only a request that could not be sent on
+        # such a connection is retried on a fresh one: once it was sent, the daemon may be running it (e.g. a
+        # copy), so a read timeout or a lost response is raised instead of running the command twice.
+        connection, reused = self._get_connection()
+        try:
+            connection.request("POST", f"/{command}", body=body, headers=headers)
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            if not reused:
+                raise RcloneDaemonError(f"rclone rcd at {self.address} is unreachable: {e}")
+            connection, _ = self._get_connection(fresh=True)
+            try:
+                connection.request("POST", f"/{command}", body=body, headers=headers)
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise RcloneDaemonError(f"rclone rcd at {self.address} is unreachable: {e}")
+
+        try:
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            raise RcloneDaemonNoAnswer(f"No answer from rclone rcd at {self.address} to {command}: {e}")
+
+        self._release_connection(connection, response)
+        try:
+            result = json.loads(payload) if payload else {}
+        except json.JSONDecodeError:
+            result = {"error": payload.decode("utf-8", "replace")}
+
+        if response.status != 200:
+            raise RuntimeError(result.get("error", f"HTTP {response.status}"))
+        return result
+
+    def _get_connection(self, fresh=False):
+        """
+        Returns an idle pooled connection, or a new one. Connections idle for longer than `idle_timeout`
+        are closed rather than reused, since the daemon may have closed them already.
+
+        Returns:
+            tuple: The connection and whether it was reused from the pool.
+        """
+        while not fresh:
+            try:
+                connection, idle_since = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - idle_since < self.idle_timeout:
+                return connection, True
+            connection.close()
+        host, port = self.address.rsplit(":", 1)
+        return http.client.HTTPConnection(host, int(port), timeout=self.timeout), False
+
+    def _release_connection(self, connection, response):
+        """Returns a connection to the pool unless the daemon asked to close it."""
+        if response.will_close:
+            connection.close()
+            return
+        try:
+            self._pool.put_nowait((connection, time.monotonic()))
+        except queue.Full:
+            connection.close()
+
+
+def _free_port() -> int:
+    """Returns a currently unused local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
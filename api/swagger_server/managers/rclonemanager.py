@@ -1,10 +1,177 @@
 import json
+import os
+import posixpath
 import subprocess
+import tempfile
+import threading
+import time
+import uuid
 import colorama
+from dateutil import parser as date_parser
 from pathlib import Path
+from urllib.parse import urlsplit
+
+from .rclonedaemon import RcloneDaemon, RcloneDaemonError, RcloneDaemonNoAnswer
+from .transfermetrics import TransferMetrics
 
 colorama.init(autoreset=True)
 
+# "rc" runs operations in a persistent `rclone rcd`, "subprocess" forks rclone for every operation
+RCLONE_BACKEND = os.getenv("RCLONE_BACKEND", "rc")
+
+_shared_daemon = None
+_shared_daemon_lock = threading.Lock()
+_shared_metrics = TransferMetrics()
+
+
+def get_shared_daemon() -> RcloneDaemon:
+    """
+    Returns the process-wide rclone daemon, shared by all RcloneManager instances.
+
+    The daemon is started on first use. Set `RCLONE_RC_ADDR` (and `RCLONE_RC_USER` /
+    `RCLONE_RC_PASS`) to use an already running `rclone rcd` instead.
+    """
+    global _shared_daemon
+    with _shared_daemon_lock:
+        if _shared_daemon is None:
+            _shared_daemon = RcloneDaemon(address=os.getenv("RCLONE_RC_ADDR"), user=os.getenv("RCLONE_RC_USER"),
+                                          password=os.getenv("RCLONE_RC_PASS"))
+        return _shared_daemon
+
+
+def get_shared_metrics() -> TransferMetrics:
+    """Returns the process-wide transfer metrics, fed by the transfers of all RcloneManager instances."""
+    return _shared_metrics
+
+
+def parse_stats(stats: dict) -> dict:
+    """
+    Converts rclone accounting stats (the `stats` object of a `--use-json-log` stats line, or the
+    `core/stats` response) into the progress reported to callers.
+
+    Returns:
+        dict: `bytes`, `total_bytes`, `speed` (bytes/s), `eta` (s), `errors`, `retries`, `transfers`,
+        `checks` and the files currently `transferring`.
+    """
+    return {
+        "bytes": stats.get("bytes", 0),
+        "total_bytes": stats.get("totalBytes", 0),
+        "speed": stats.get("speed", 0),
+        "eta": stats.get("eta"),
+        "errors": stats.get("errors", 0),
+        "retries": stats.get("retries", 0),
+        "transfers": stats.get("transfers", 0),
+        "checks": stats.get("checks", 0),
+        "transferring": stats.get("transferring") or [],
+    }
+
+
+def parse_json_log(lines, files=None, succeeded=True, error="Transfer failed") -> dict:
+    """
+    Extracts per-file results from rclone `--use-json-log` output.
+
+    Args:
+        lines (iterable): Log lines; lines that are not JSON are ignored.
+        files (list, optional): The files of the transfer. When the transfer succeeded, files without a
+            log entry are reported as unchanged, since rclone only logs the files it had to copy.
+            When it failed, rclone may never have attempted them, so they are reported as failed.
+        succeeded (bool): Whether rclone exited successfully.
+        error (str): Error reported for the files without a log entry of a failed transfer.
+
+    Returns:
+        dict: {"copied": [...], "unchanged": [...], "failed": {file: error}}
+    """
+    copied, failed = [], {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if not isinstance(entry, dict) or not entry.get("object") or "stats" in entry:
+            continue
+
+        name = entry["object"]
+        if entry.get("level") == "error":
+            failed[name] = entry.get("msg", "")
+        elif entry.get("msg", "").startswith("Copied") and name not in copied:
+            copied.append(name)
+
+    copied = [name for name in copied if name not in failed]
+    unlogged = [name for name in files or [] if name not in failed and name not in copied]
+    if not succeeded:
+        failed.update({name: error for name in unlogged})
+        unlogged = []
+    return {"copied": copied, "unchanged": unlogged, "failed": failed}
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Transfer options holding a size in bytes
+SIZE_OPTIONS = ("multi_thread_cutoff", "s3_chunk_size")
+
+# Transfer options set through the `_config` of an rc call
+RC_CONFIG_OPTIONS = {"multi_thread_streams": "MultiThreadStreams", "multi_thread_cutoff": "MultiThreadCutoff"}
+
+
+def normalize_endpoint(endpoint_url: str):
+    """
+    Normalizes an endpoint URL for alias lookups: the scheme and host are lower-cased, default
+    ports and trailing slashes are dropped, e.g. "HTTPS://MinIO.example.org:443/" -> "https://minio.example.org".
+
+    Returns:
+        tuple(str, str): The normalized URL and the same URL without its scheme.
+    """
+    url = (endpoint_url or "").strip()
+    if "://" not in url:
+        url = f"//{url}"
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    host = (parts.hostname or "").lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    location = host + parts.path.rstrip("/")
+    return (f"{scheme}://{location}" if scheme else location), location
+
+
+def _is_stale(entry: dict, reference: dict, compare_modtime: bool = False) -> bool:
+    """Returns True if a copy differs in size from its reference, or is older when `compare_modtime` is set."""
+    if entry.get("Size") != reference.get("Size"):
+        return True
+    if compare_modtime and entry.get("ModTime") and reference.get("ModTime"):
+        # Allow for remotes that store modification times with a one second precision
+        age = date_parser.isoparse(reference["ModTime"]) - date_parser.isoparse(entry["ModTime"])
+        return age.total_seconds() > 1
+    return False
+
+
+def split_remote_path(path: str):
+    """
+    Splits a remote path into its parent directory and its last element, the form taken by the
+    rc API (`fs` and `remote`), e.g. "minio:bucket/folder/file.csv" -> ("minio:bucket/folder", "file.csv").
+    """
+    prefix, separator, rest = path.partition(":")
+    if not separator:
+        prefix, rest = "", path
+    else:
+        prefix += separator
+
+    parent, _, name = rest.rstrip("/").rpartition("/")
+    if not parent and rest.startswith("/"):
+        parent = "/"
+    return prefix + parent, name
+
+
+def _endpoint_of(path: str) -> str:
+    """Returns the remote name of a remote path ("local" for local paths)."""
+    remote, separator, _ = path.partition(":")
+    return remote if separator else "local"
+
 
 def handle_rclone_command(command):
     """
@@ -25,32 +192,147 @@ def handle_rclone_command(command):
 
 
 class RcloneManager:
-    def __init__(self):
+    def __init__(self, backend=None, daemon=None, metrics=None):
         """
         Initializes the RcloneManager by loading configured endpoints.
         Calls `update_endpoints()` to retrieve current Rclone configurations.
+
+        Args:
+            backend (str, optional): "rc" or "subprocess" (default: the RCLONE_BACKEND environment variable).
+            daemon (RcloneDaemon, optional): Daemon for the rc backend (default: the shared daemon).
+            metrics (TransferMetrics, optional): Receives the stats of finished transfers (default: the shared metrics).
         """
+        backend = backend or RCLONE_BACKEND
+        self.daemon = (daemon or get_shared_daemon()) if backend == "rc" else None
+        self.metrics = metrics or get_shared_metrics()
         self.endpoints = {}
+        self.poll_interval = 1  # Seconds between two progress checks of a running transfer
+
+        # Endpoint URL -> alias, rebuilt when this manager changes a remote or the config file changes
+        self._alias_index = None
+        self._alias_lock = threading.Lock()
+        self._config_file = None
+        self._config_mtime = None
+
         self.update_endpoints()
 
+    def _rc(self, command, **params):
+        """
+        Runs a command on the rclone daemon.
+
+        Returns:
+            tuple(bool, dict or str) or None: (Success, response or error message), or None when the
+            daemon is unavailable and the subprocess backend has to be used instead. A command that was
+            sent but not answered fails instead: the daemon may be running it, so running it again
+            through a subprocess could e.g. copy the same files twice.
+        """
+        if self.daemon is None:
+            return None
+        try:
+            self.daemon.ensure_started()
+            return True, self.daemon.call(command, **params)
+        except RcloneDaemonNoAnswer as e:
+            return False, str(e)
+        except RcloneDaemonError:
+            return None
+        except RuntimeError as e:
+            return False, str(e)
+
+    def _rc_stat(self, path):
+        """Returns the rc listing item of a file or directory, or None if it does not exist."""
+        fs, remote = split_remote_path(path)
+        if not remote:
+            return {"IsDir": True}
+        rc = self._rc("operations/stat", fs=fs, remote=remote)
+        if rc is None:
+            raise RcloneDaemonError("rclone rcd is unavailable")
+        success, result = rc
+        return result.get("item") if success else None
+
     def update_endpoints(self):
         """
         Retrieves and updates the configured endpoints using `rclone config dump`.
         Parses the JSON output and stores the endpoint configurations.
         """
-        success, output = handle_rclone_command(["rclone", "config", "dump"])
-        if success and output:
-            try:
-                self.endpoints = json.loads(output)
-            except json.JSONDecodeError:
-                self.endpoints = {}
+        config_mtime = self._get_config_mtime()
+
+        rc = self._rc("config/dump")
+        if rc is not None:
+            success, output = rc
+            endpoints = output if success else {}
         else:
-            self.endpoints = {}
+            success, output = handle_rclone_command(["rclone", "config", "dump"])
+            endpoints = {}
+            if success and output:
+                try:
+                    endpoints = json.loads(output)
+                except json.JSONDecodeError:
+                    endpoints = {}
+
+        self.endpoints = endpoints
+        self._alias_index = self._build_alias_index(endpoints)
+        self._config_mtime = config_mtime
+
+    @staticmethod
+    def _build_alias_index(endpoints) -> dict:
+        """Maps every alias to itself and every normalized endpoint URL (with and without scheme) to its alias."""
+        index = {}
+        for alias, config in endpoints.items():
+            if config.get("endpoint"):
+                for key in filter(None, normalize_endpoint(config["endpoint"])):
+                    index.setdefault(key, alias)
+        # Aliases take precedence over endpoint URLs, as in the original linear lookup
+        index.update({alias: alias for alias in endpoints})
+        return index
+
+    def invalidate_endpoints(self):
+        """Drops the alias index; it is rebuilt on the next lookup."""
+        self._alias_index = None
+
+    def _get_config_file(self):
+        """Returns the path of the rclone config file, or None if it cannot be determined."""
+        if self._config_file is None:
+            config_file = os.getenv("RCLONE_CONFIG")
+            if not config_file:
+                rc = self._rc("config/paths")
+                if rc is not None:
+                    config_file = rc[1].get("config") if rc[0] else None
+                else:
+                    success, output = handle_rclone_command(["rclone", "config", "file"])
+                    config_file = output.splitlines()[-1].strip() if success and output else None
+            self._config_file = config_file or ""
+        return self._config_file or None
+
+    def _get_config_mtime(self):
+        """Returns the modification time of the rclone config file, or None if it does not exist."""
+        config_file = self._get_config_file()
+        try:
+            return os.stat(config_file).st_mtime_ns if config_file else None
+        except OSError:
+            return None
 
     def configure_remote(self, name, remote_type, access_key, secret_key, endpoint, remote="", additional_options=None):
         """
         Configures a Rclone remote dynamically.
         """
+        if self.daemon is not None:
+            parameters = {"access_key_id": access_key, "secret_access_key": secret_key, "endpoint": endpoint}
+            if remote:
+                parameters["remote"] = remote
+            for key, value in (additional_options or {}).items():
+                parameters[key] = " ".join(map(str, value)) if isinstance(value, (list, tuple)) else str(value)
+
+            rc = self._rc("config/create", name=name, type=remote_type, parameters=parameters,
+                          opt={"nonInteractive": True})
+            if rc is not None:
+                success, output = rc
+                if not success:
+                    return False, output
+                # Drop remotes the daemon already opened under this name
+                self._rc("fscache/clear")
+                self.invalidate_endpoints()
+                return True, f"Remote '{name}' configured"
+
         cmd = [
             "rclone", "config", "create", name, remote_type,
             "access_key_id", access_key,
@@ -70,19 +352,29 @@ class RcloneManager:
                 else:
                     cmd.extend([key, str(value)])
 
-        return handle_rclone_command(cmd)
+        result = handle_rclone_command(cmd)
+        self.invalidate_endpoints()
+        return result
 
     def get_remote(self):
         """
         Retrieves configured Rclone remotes.
         """
+        rc = self._rc("config/dump")
+        if rc is not None:
+            success, output = rc
+            return (True, json.dumps(output, indent=4)) if success else (False, output)
         return handle_rclone_command(["rclone", "config", "dump"])
 
     def delete_remote(self, remote_name):
         """
         Deletes a Rclone remote configuration.
         """
-        success, output = handle_rclone_command(["rclone", "config", "delete", remote_name])
+        rc = self._rc("config/delete", name=remote_name)
+        if rc is not None and rc[0]:
+            self._rc("fscache/clear")
+        success, output = rc if rc is not None else handle_rclone_command(["rclone", "config", "delete", remote_name])
+        self.invalidate_endpoints()
         if success:
             return True, f"Remote '{remote_name}' deleted successfully"
         return False, output
@@ -91,7 +383,9 @@ class RcloneManager:
         """
         Creates a new folder in a Rclone remote.
         """
-        success, output = handle_rclone_command(["rclone", "mkdir", f"{remote}{folder}", "--s3-no-check-bucket"])
+        rc = self._rc("operations/mkdir", fs=f"{remote}{folder}", remote="")
+        success, output = rc if rc is not None else \
+            handle_rclone_command(["rclone", "mkdir", f"{remote}{folder}", "--s3-no-check-bucket"])
 
         if success:
             return True, f"Folder '{folder}' created in '{remote}'"
@@ -101,7 +395,9 @@ class RcloneManager:
         """
         Deletes a folder in a Rclone remote.
         """
-        success, output = handle_rclone_command(["rclone", "purge", f"{remote}{folder}", "--s3-no-check-bucket"])
+        rc = self._rc("operations/purge", fs=f"{remote}{folder}", remote="")
+        success, output = rc if rc is not None else \
+            handle_rclone_command(["rclone", "purge", f"{remote}{folder}", "--s3-no-check-bucket"])
 
         if success:
             return True, f"Folder '{folder}' deleted in '{remote}'"
@@ -111,6 +407,12 @@ class RcloneManager:
         """
         Lists files in a Rclone remote folder.
         """
+        if self.daemon is not None:
+            try:
+                return self._rc_list_files(f"{remote}{folder}")
+            except RcloneDaemonError:
+                pass
+
         success, output = handle_rclone_command(["rclone", "ls", f"{remote}{folder}", "--s3-no-check-bucket"])
         if success and output:
             files = []
@@ -121,6 +423,27 @@ class RcloneManager:
             return True, files
         return False, output
 
+    def _rc_list_files(self, path):
+        """
+        Lists the files below `path` through the daemon, in the same form as `rclone ls`.
+        A path naming a single file lists just that file.
+        """
+        item = self._rc_stat(path)
+        if item is None:
+            return False, f"'{path}' not found"
+        if not item.get("IsDir"):
+            return True, [{"file_name": item["Name"], "size": item["Size"]}]
+
+        rc = self._rc("operations/list", fs=path, remote="", opt={"recurse": True, "filesOnly": True})
+        if rc is None:
+            raise RcloneDaemonError("rclone rcd is unavailable")
+        success, result = rc
+        if not success:
+            return False, result
+
+        files = [{"file_name": entry["Path"], "size": entry["Size"]} for entry in result.get("list", [])]
+        return (True, files) if files else (False, "")
+
     def list_folders(self, remote):
         """
         Lists all folders in a Rclone remote.
@@ -131,7 +454,12 @@ class RcloneManager:
         Returns:
             tuple: (success: bool, folders: list or error message)
         """
-        success, output = handle_rclone_command(["rclone", "lsd", f"{remote}:"], "--s3-no-check-bucket")
+        rc = self._rc("operations/list", fs=f"{remote}:", remote="", opt={"dirsOnly": True})
+        if rc is not None:
+            success, output = rc
+            return (True, [entry["Name"] for entry in output.get("list", [])]) if success else (False, output)
+
+        success, output = handle_rclone_command(["rclone", "lsd", f"{remote}:", "--s3-no-check-bucket"])
 
         if success:
             folders = [line.split()[-1] for line in output.split("\n") if line.strip()]
@@ -148,7 +476,12 @@ class RcloneManager:
         file_name = Path(file_path).name
         remote_path = f"{remote}{folder}/{file_name}"
 
-        success, message = handle_rclone_command(["rclone", "copyto", file_path, remote_path, "--s3-no-check-bucket"])
+        local_folder, local_name = os.path.split(os.path.abspath(file_path))
+        destination_fs, destination_name = split_remote_path(remote_path)
+        rc = self._rc("operations/copyfile", srcFs=local_folder, srcRemote=local_name,
+                      dstFs=destination_fs, dstRemote=destination_name)
+        success, message = rc if rc is not None else \
+            handle_rclone_command(["rclone", "copyto", file_path, remote_path, "--s3-no-check-bucket"])
 
         if success:
             return True, f"File '{file_name}' uploaded to '{remote}/{folder}'"
@@ -158,6 +491,11 @@ class RcloneManager:
         """
         Deletes a file from a Rclone remote.
         """
+        fs, remote_name = split_remote_path(f"{remote}{file_path}")
+        rc = self._rc("operations/deletefile", fs=fs, remote=remote_name)
+        if rc is not None:
+            return rc[0]
+
         success, _ = handle_rclone_command(["rclone", "delete", f"{remote}{file_path}", "--s3-no-check-bucket"])
         return success
 
@@ -180,6 +518,13 @@ class RcloneManager:
         if path:
             full_path = f"{remote}{path}"
 
+        if self.daemon is not None:
+            try:
+                success, files = self._rc_list_files(full_path)
+                return success and bool(files)
+            except RcloneDaemonError:
+                pass
+
         success, existing_file = handle_rclone_command(["rclone", "ls", full_path, "--s3-no-check-bucket"])
 
         if not success or not existing_file:
@@ -191,13 +536,23 @@ class RcloneManager:
         Returns the alias matching the given endpoint URL.
         If the passed string is itself an alias, it also returns that alias.
         If none is found, returns None.
+
+        URLs are compared after normalization (see `normalize_endpoint`); a URL without a scheme
+        matches an endpoint with any scheme. Lookups use an in-memory index that is only rebuilt
+        after `configure_remote`/`delete_remote` or when the rclone config file changes.
         """
-        self.update_endpoints()
-        for alias, config in self.endpoints.items():
-            # If endpoint_url matches the alias or the endpoint value, return alias
-            if alias == endpoint_url or config.get("endpoint") == endpoint_url:
-                return alias
-        return None
+        index = self._alias_index
+        if index is None or self._get_config_mtime() != self._config_mtime:
+            with self._alias_lock:
+                # Another thread may have rebuilt the index while this one waited
+                if self._alias_index is None or self._get_config_mtime() != self._config_mtime:
+                    self.update_endpoints()
+                index = self._alias_index
+
+        if endpoint_url in index:
+            return index[endpoint_url]
+        normalized, without_scheme = normalize_endpoint(endpoint_url)
+        return index.get(normalized) or index.get(without_scheme)
 
     def sync_folders(self, source, destination, parallel_files=1, folders=None):
         """
@@ -219,21 +574,25 @@ class RcloneManager:
             for folder in folders:
                 folder_source = f"{source}{folder}"
                 folder_destination = f"{destination}{folder}"
-                success, output = handle_rclone_command([
-                    "rclone", "sync", folder_source, folder_destination,
-                    "--progress", f"--transfers={parallel_files}", "--s3-no-check-bucket"
-                ])
+                success, output = self._transfer("sync", folder_source, folder_destination, parallel_files)
                 if not success:
                     return False, f"Failed to sync {folder}: {output}"
             return True, "All folders synchronized successfully."
 
-        success, output = handle_rclone_command([
-            "rclone", "sync", source, destination,
-            "--progress", f"--transfers={parallel_files}", "--s3-no-check-bucket"
-        ])
+        success, output = self._transfer("sync", source, destination, parallel_files)
 
         return (success, "Folders synchronized successfully.") if success else (False, f"Sync failed: {output}")
 
+    def _transfer(self, operation, source, destination, parallel_files=1):
+        """
+        Runs `rclone sync` or `rclone copy` between two folders.
+
+        Returns:
+            tuple(bool, str): (Success, error message)
+        """
+        success, results = self.transfer(operation, source, destination, parallel_files=parallel_files)
+        return success, "; ".join(f"{name}: {error}" for name, error in results["failed"].items())
+
     def copy_folders(self, source, destination, parallel_files=1, folders=None):
         """
         Copies folders from a source to a destination using `rclone copy`.
@@ -242,17 +601,11 @@ class RcloneManager:
             for folder in folders:
                 folder_source = f"{source}{folder}"
                 folder_destination = f"{destination}{folder}"
-                handle_rclone_command([
-                    "rclone", "copy", folder_source, folder_destination,
-                    "--progress", f"--transfers={parallel_files}", "--s3-no-check-bucket"
-                ])
+                self._transfer("copy", folder_source, folder_destination, parallel_files)
         else:
-            handle_rclone_command([
-                "rclone", "copy", source, destination,
-                "--progress", f"--transfers={parallel_files}", "--s3-no-check-bucket"
-            ])
+            self._transfer("copy", source, destination, parallel_files)
 
-    def copy_files(self, source, destination, parallel_files=1, files=None):
+    def copy_files(self, source, destination, parallel_files=1, files=None, batch=False):
         """
         Copies files between a source and a destination using `rclone copy`.
 
@@ -261,29 +614,309 @@ class RcloneManager:
             destination (str): The destination remote.
             parallel_files (int): Number of parallel file transfers.
             files (list, optional): List of files to copy.
+            batch (bool): Copy the files in one transfer (see `copy_files_batch`) instead of one by one.
 
         Returns:
             tuple(bool, str): (Success, message)
         """
+        if files and batch:
+            success, results = self.copy_files_batch(source, destination, files, parallel_files)
+            if success:
+                return True, f"All files copied successfully ({len(results['copied'])} copied, " \
+                             f"{len(results['unchanged'])} unchanged)."
+            return False, "Failed to copy " + ", ".join(f"{file}: {error}" for file, error in results["failed"].items())
+
         if files:
             for file in files:
                 file_source = f"{source}{file}"
                 file_destination = f"{destination}{file}"
-                success, output = handle_rclone_command([
-                    "rclone", "copyto", file_source, file_destination,
-                    "--progress", f"--transfers={parallel_files}", "--s3-no-check-bucket"
+                source_fs, source_name = split_remote_path(file_source)
+                destination_fs, destination_name = split_remote_path(file_destination)
+                rc = self._rc("operations/copyfile", srcFs=source_fs, srcRemote=source_name,
+                              dstFs=destination_fs, dstRemote=destination_name)
+                success, output = rc if rc is not None else handle_rclone_command([
+                    "rclone", "copyto", file_source, file_destination, "--s3-no-check-bucket"
                 ])
                 if not success:
                     return False, f"Failed to copy {file}: {output}"
             return True, "All files copied successfully."
 
-        success, output = handle_rclone_command([
-            "rclone", "copy", source, destination,
-            "--progress", f"--transfers={parallel_files}", "--s3-no-check-bucket"
-        ])
+        success, output = self._transfer("copy", source, destination, parallel_files)
 
         return (success, "Files copied successfully.") if success else (False, f"Copy failed: {output}")
 
+    def copy_files_batch(self, source, destination, files, parallel_files=4, checkers=8, progress=None,
+                         cancel_event=None, options=None, file_done=None):
+        """
+        Copies a list of files with a single `rclone copy --files-from`, so up to `parallel_files`
+        files are transferred at the same time.
+
+        Args:
+            source (str): The source folder; the files are relative to it.
+            destination (str): The destination folder.
+            files (list): The files to copy.
+            parallel_files (int): Number of parallel file transfers (`--transfers`).
+            checkers (int): Number of parallel existence checks (`--checkers`).
+            progress (callable, optional): See `transfer`.
+            cancel_event (threading.Event, optional): See `transfer`.
+            options (dict, optional): See `transfer`.
+            file_done (callable, optional): See `transfer`.
+
+        Returns:
+            tuple(bool, dict): (True if no file failed, {"copied": [...], "unchanged": [...], "failed": {file: error}})
+        """
+        if not files:
+            return True, {"copied": [], "unchanged": [], "failed": {}}
+        return self.transfer("copy", source, destination, files, parallel_files, checkers, progress, cancel_event,
+                             options, file_done)
+
+    def transfer(self, operation, source, destination, files=None, parallel_files=4, checkers=8, progress=None,
+                 cancel_event=None, options=None, file_done=None):
+        """
+        Runs one `rclone copy` or `rclone sync` between two folders, optionally limited to a list of files.
+
+        Args:
+            operation (str): "copy" or "sync".
+            source (str): The source folder; the files are relative to it.
+            destination (str): The destination folder.
+            files (list, optional): The files to transfer (`--files-from`); the whole folder if omitted.
+            parallel_files (int): Number of parallel file transfers (`--transfers`).
+            checkers (int): Number of parallel existence checks (`--checkers`).
+            progress (callable, optional): Called about every second while the transfer runs with the
+                stats of the transfer (see `parse_stats`).
+            cancel_event (threading.Event, optional): Stops the transfer when set.
+            options (dict, optional): Further tuning (see `TransferTuner`): `multi_thread_streams`,
+                `multi_thread_cutoff`, `s3_chunk_size` and `s3_upload_concurrency` (sizes in bytes).
+            file_done (callable, optional): Called with (file, error) once per file of `files`: as soon as
+                rclone reports a copied file, and at the end for unchanged (error None) and failed files.
+
+        Returns:
+            tuple(bool, dict): (True if nothing failed, {"copied": [...], "unchanged": [...], "failed": {file: error}}).
+            Without `files`, a failure of the whole transfer is reported under the source path.
+        """
+        files = [file.lstrip("/") for file in files] if files is not None else None
+        options = options or {}
+
+        # The last stats reported by rclone are the totals of the transfer
+        final_stats = {}
+
+        def report(stats):
+            final_stats.update(stats)
+            if progress is not None:
+                progress(stats)
+
+        reported = set()
+
+        def report_file(name, error=None):
+            if name in reported or file_done is None:
+                return
+            reported.add(name)
+            try:
+                file_done(name, error)
+            except Exception as e:
+                print(f"[WARNING] File callback for '{name}' failed: {e}")
+
+        files_from = None
+        if files is not None:
+            with tempfile.NamedTemporaryFile("w", prefix="rclone-files-", suffix=".txt", delete=False) as list_file:
+                list_file.write("\n".join(files) + "\n")
+            files_from = list_file.name
+        started = time.time()
+        try:
+            results = self._rc_transfer(operation, source, destination, files, files_from, parallel_files, checkers,
+                                        report, cancel_event, options, report_file)
+            if results is None:
+                results = self._subprocess_transfer(operation, source, destination, files, files_from,
+                                                    parallel_files, checkers, report, cancel_event, options,
+                                                    report_file)
+        finally:
+            if files_from:
+                os.unlink(files_from)
+
+        self.metrics.record(_endpoint_of(source), _endpoint_of(destination), final_stats, time.time() - started)
+
+        # Files rclone did not log (unchanged ones) and failures are only known once the transfer has ended
+        if files is not None:
+            for name in results["copied"] + results["unchanged"]:
+                report_file(name)
+            for name, error in results["failed"].items():
+                report_file(name, error)
+
+        if results["failed"]:
+            print(f"[WARNING] Failed to {operation} {len(results['failed'])} files: {results['failed']}")
+        return not results["failed"], results
+
+    def _subprocess_transfer(self, operation, source, destination, files, files_from, parallel_files, checkers,
+                             progress=None, cancel_event=None, options=None, file_done=None):
+        """
+        Runs a transfer in a new rclone process. Its JSON log is read line by line while the
+        transfer runs: stats lines (written every second) are passed to `progress`, copied files
+        to `file_done`, and the other lines are kept to extract the per-file results.
+        """
+        command = ["rclone", operation, source, destination, f"--transfers={parallel_files}",
+                   f"--checkers={checkers}", "--use-json-log", "--log-level=INFO", "--stats=1s",
+                   "--s3-no-check-bucket"]
+        if files_from:
+            command += [f"--files-from-raw={files_from}", "--no-traverse"]
+        for option, value in (options or {}).items():
+            # Sizes are passed in bytes; rclone reads numbers without a suffix as KiB
+            suffix = "B" if option in SIZE_OPTIONS else ""
+            command.append(f"--{option.replace('_', '-')}={value}{suffix}")
+
+        # The JSON log is written to stderr, also when the transfer succeeds; stdout carries nothing we use
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        log_lines = []
+        reader = threading.Thread(target=self._read_json_log, args=(process.stderr, log_lines, progress, file_done),
+                                  name="rclone-log-reader", daemon=True)
+        reader.start()
+        while True:
+            try:
+                process.wait(timeout=self.poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_event is not None and cancel_event.is_set():
+                    process.terminate()
+        reader.join()
+
+        succeeded = process.returncode == 0
+        error = "Transfer cancelled" if cancel_event is not None and cancel_event.is_set() else \
+            "\n".join(log_lines).strip() or f"rclone exited with code {process.returncode}"
+        results = parse_json_log(log_lines, files, succeeded, error)
+        if not succeeded and files is None and not results["failed"]:
+            results["failed"] = {source: error}
+        return results
+
+    def _with_backend_options(self, path, options):
+        """Adds the `s3_*` options to the connection string of an S3 remote path ("remote,chunk_size=...:path")."""
+        remote, separator, rest = path.partition(":")
+        backend_options = {option[3:]: value for option, value in options.items() if option.startswith("s3_")}
+        if not separator or not backend_options or self.endpoints.get(remote.split(",")[0], {}).get("type") != "s3":
+            return path
+        parameters = ",".join(f"{name}={value}{'B' if f's3_{name}' in SIZE_OPTIONS else ''}"
+                              for name, value in backend_options.items())
+        return f"{remote},{parameters}:{rest}"
+
+    @staticmethod
+    def _read_json_log(stream, log_lines, progress=None, file_done=None):
+        """Reads rclone's JSON log until the process exits, reporting stats lines and copied files as they arrive."""
+        for line in stream:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = None
+            if isinstance(entry, dict) and isinstance(entry.get("stats"), dict):
+                if progress is not None:
+                    try:
+                        progress(parse_stats(entry["stats"]))
+                    except Exception as e:
+                        print(f"[WARNING] Progress callback failed: {e}")
+                continue
+            # Failures are only final at the end, since rclone may retry the whole transfer
+            if file_done is not None and isinstance(entry, dict) and entry.get("object") and \
+                    entry.get("msg", "").startswith("Copied"):
+                file_done(entry["object"])
+            log_lines.append(line.rstrip("\n"))
+        stream.close()
+
+    def _rc_transfer(self, operation, source, destination, files, files_from, parallel_files, checkers,
+                     progress=None, cancel_event=None, options=None, file_done=None):
+        """
+        Runs a transfer as an asynchronous daemon job in its own stats group, reporting its progress
+        and the files that have arrived, and stopping it on cancellation. The per-file results are read
+        from the group's transfer log; files it does not list are looked up on the destination.
+
+        Returns:
+            dict or None: The per-file results, or None if the subprocess backend has to be used.
+        """
+        # The daemon reads the file list from the local disk of this process, which a daemon on another
+        # host cannot see; it would copy nothing. The list is then handed to a local rclone process.
+        if files_from and self.daemon is not None and self.daemon.external:
+            return None
+
+        options = dict(options or {})
+        group = f"transfer-{uuid.uuid4().hex}"
+        config = {"Transfers": parallel_files, "Checkers": checkers}
+        for option, key in RC_CONFIG_OPTIONS.items():
+            if option in options:
+                config[key] = options.pop(option)
+
+        # Backend options cannot be set per call; they are passed in the connection string of the S3 destination
+        params = {"srcFs": source, "dstFs": self._with_backend_options(destination, options), "_group": group,
+                  "_async": True, "_config": config}
+        if files_from:
+            params["_filter"] = {"FilesFromRaw": [files_from]}
+            params["_config"]["NoTraverse"] = True
+
+        rc = self._rc(f"sync/{operation}", **params)
+        if rc is None:
+            return None
+
+        success, output = rc
+        if success:
+            job_id = output.get("jobid")
+            stopped = False
+            while True:
+                status = self._rc("job/status", jobid=job_id)
+                if status is None or not status[0]:
+                    success, output = False, "Lost track of the transfer job"
+                    break
+                if status[1].get("finished"):
+                    success, output = status[1].get("success", False), status[1].get("error", "")
+                    break
+
+                stats = self._rc("core/stats", group=group)
+                if progress is not None and stats and stats[0]:
+                    progress(parse_stats(stats[1]))
+
+                if file_done is not None:
+                    transferred = self._rc("core/transferred", group=group)
+                    for transfer in (transferred[1].get("transferred", []) if transferred and transferred[0] else []):
+                        if not transfer.get("error"):
+                            file_done(transfer["name"])
+
+                if cancel_event is not None and cancel_event.is_set() and not stopped:
+                    self._rc("job/stop", jobid=job_id)
+                    stopped = True
+                time.sleep(self.poll_interval)
+
+        stats = self._rc("core/stats", group=group)
+        if progress is not None and stats and stats[0]:
+            progress(parse_stats(stats[1]))
+        transferred = self._rc("core/transferred", group=group)
+        self._rc("core/stats-delete", group=group)
+
+        failed = {}
+        copied = []
+        checked = []
+        for transfer in (transferred[1].get("transferred", []) if transferred and transferred[0] else []):
+            if transfer.get("error"):
+                failed[transfer["name"]] = transfer["error"]
+            elif transfer.get("checked"):
+                checked.append(transfer["name"])
+            else:
+                copied.append(transfer["name"])
+
+        if files is None:
+            if not success and not failed:
+                # The transfer failed without a per-file error (e.g. the source is missing or it was cancelled)
+                failed = {source: output}
+            return {"copied": copied, "unchanged": [], "failed": failed}
+
+        # The transfer log only keeps the most recent transfers, so a file missing from it may have been
+        # copied, skipped as unchanged or never have arrived; the destination is listed once to tell
+        copied = [file for file in copied if file not in failed]
+        unchanged = [file for file in checked if file not in failed and file not in copied]
+        unaccounted = [file for file in files if file not in failed and file not in copied and file not in unchanged]
+        present = self._list_requested_files(destination, unaccounted) if unaccounted else {}
+        for file in unaccounted:
+            if present is not None and file in present:
+                unchanged.append(file)
+            elif present is None:
+                failed[file] = "Could not verify the file on the destination"
+            else:
+                failed[file] = output if not success and output else "Not on the destination after the transfer"
+        return {"copied": copied, "unchanged": unchanged, "failed": failed}
+
     def get_remote_used_storage(self, endpoint, folder):
         """
         Retrieves the used storage capacity of a given Rclone remote.
@@ -295,6 +928,13 @@ class RcloneManager:
         Returns:
             tuple: (bool, int or str) - Success flag and used storage in bytes or error message.
         """
+        rc = self._rc("operations/size", fs=f"{endpoint}{folder}")
+        if rc is not None:
+            success, storage_info = rc
+            if not success:
+                return False, f"Rclone command failed: {storage_info}"
+            return True, int(storage_info.get("bytes", 0))
+
         # Construct the correct rclone command
         rclone_command = ["rclone", "size", f"{endpoint}{folder}", "--json"]
 
@@ -325,6 +965,15 @@ class RcloneManager:
         Returns:
             tuple: (bool, int or str) - Success flag and file size in bytes or error message.
         """
+        if self.daemon is not None:
+            try:
+                item = self._rc_stat(f"{remote}{filename}")
+                if item is None or item.get("IsDir"):
+                    return False, f"'{remote}{filename}' is not a file"
+                return True, int(item["Size"])
+            except RcloneDaemonError:
+                pass
+
         success, output = handle_rclone_command(["rclone", "lsl", f"{remote}{filename}"])
 
         if success:
@@ -337,21 +986,131 @@ class RcloneManager:
 
         return False, output  # Return error message if command failed
 
-    def get_files_to_transfer(self, endpoint: str, requested_files: list) -> list:
+    def list_files_json(self, path, recursive=True):
+        """
+        Lists the files below a path with their size and modification time (`rclone lsjson`).
+
+        Args:
+            path (str): The remote folder to list.
+            recursive (bool): Also list the files in subfolders.
+
+        Returns:
+            tuple: (bool, list or str) - Success flag and the entries
+            ({"Path", "Name", "Size", "ModTime", ...}) or an error message.
+        """
+        rc = self._rc("operations/list", fs=path, remote="", opt={"recurse": recursive, "filesOnly": True})
+        if rc is not None:
+            success, output = rc
+            return (True, output.get("list", [])) if success else (False, output)
+
+        command = ["rclone", "lsjson", path, "--files-only", "--s3-no-check-bucket"]
+        if recursive:
+            command.append("-R")
+        success, output = handle_rclone_command(command)
+        if not success:
+            return False, output
+        try:
+            return True, json.loads(output or "[]")
+        except json.JSONDecodeError:
+            return False, "Failed to parse JSON output."
+
+    def _list_requested_files(self, endpoint, names):
+        """
+        Lists the files of `endpoint` below the deepest folder shared by all requested names.
+
+        Returns:
+            dict or None: Relative file path -> lsjson entry, or None if the listing failed.
+        """
+        prefix = posixpath.commonpath([posixpath.dirname(name) for name in names])
+        root = endpoint
+        if prefix:
+            root = f"{endpoint}{prefix}" if endpoint.endswith((":", "/")) else f"{endpoint}/{prefix}"
+
+        success, entries = self.list_files_json(root)
+        if not success:
+            # A folder that does not exist yet simply holds none of the files
+            if "not found" not in str(entries):
+                print(f"[WARNING] Failed to list '{root}': {entries}")
+                return None
+            entries = []
+        return {posixpath.join(prefix, entry["Path"]): entry for entry in entries}
+
+    def get_files_to_transfer(self, endpoint: str, requested_files: list, compare_with: str = None,
+                              compare_modtime: bool = False) -> list:
         """
         Determines which files are missing from the primary storage and need to be copied from secondary storage.
 
+        The primary folder is listed once, recursively, below the common parent folder of the
+        requested files; the missing files are the set difference with that listing.
+
         Args:
+            endpoint (str): The primary folder.
             requested_files (list): List of filenames to check.
+            compare_with (str, optional): The secondary folder. When given, it is listed as well and
+                files whose size differs from the secondary copy count as missing (e.g. partial copies).
+            compare_modtime (bool): With `compare_with`, files older than the secondary copy count as missing too.
 
         Returns:
             list: List of filenames that need to be transferred from secondary to primary.
         """
-        files_to_transfer = [filename for filename in requested_files if
-                             not self.check_data_exists(f"{endpoint}{filename}")]
+        if not requested_files:
+            return []
+
+        names = {filename: filename.lstrip("/") for filename in requested_files}
+        present = self._list_requested_files(endpoint, list(names.values()))
+        if present is None:
+            return list(requested_files)
+
+        reference = self._list_requested_files(compare_with, list(names.values())) if compare_with else None
+
+        files_to_transfer = []
+        for filename, name in names.items():
+            entry = present.get(name)
+            if entry is None:
+                files_to_transfer.append(filename)
+            elif reference and name in reference and _is_stale(entry, reference[name], compare_modtime):
+                print(f"[INFO] '{filename}' differs from the secondary copy and is transferred again")
+                files_to_transfer.append(filename)
 
         return files_to_transfer
 
+    def get_file_sizes(self, endpoint: str, files: list):
+        """
+        Retrieves the sizes of files from one recursive listing below their common parent folder,
+        rather than listing every file on its own.
+
+        Args:
+            endpoint (str): The folder holding the files.
+            files (list): List of filenames.
+
+        Returns:
+            dict or None: Filename -> size in bytes for the files that exist, or None if the listing failed.
+        """
+        if not files:
+            return {}
+
+        names = {filename: filename.lstrip("/") for filename in files}
+        listing = self._list_requested_files(endpoint, list(names.values()))
+        if listing is None:
+            return None
+        return {filename: listing[name]["Size"] for filename, name in names.items() if name in listing}
+
+    def get_transfer_metrics(self):
+        """Returns the throughput metrics of the finished transfers, per endpoint and per route."""
+        return self.metrics.snapshot()
+
+    def get_transfer_stats(self):
+        """
+        Retrieves the transfer statistics of the rclone daemon (`core/stats`).
+
+        Returns:
+            tuple: (bool, dict or str) - Success flag and the statistics or an error message.
+        """
+        rc = self._rc("core/stats")
+        if rc is None:
+            return False, "Transfer statistics require the rclone rc backend"
+        return rc
+
 
 # Example usage
 if __name__ == "__main__":
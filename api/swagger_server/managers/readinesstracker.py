@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .cachemanager import MISSING, STAGING
+
+
+class TooManyWaiters(Exception):
+    """Raised when `max_waiters` requests are already waiting for files."""
+
+
+class ReadinessTracker:
+    """
+    Lets workflow steps wait until their input files are on the primary endpoint.
+
+    The files of every workflow event are registered under the workflow uid. Waiters block on a
+    condition that is signalled whenever the cache marks files ready, staging or evicted, and
+    re-read the readiness of their files only then, so a waiting step costs no rclone or
+    MongoDB traffic while nothing changes.
+
+    A workflow is pending from the moment one of its events is accepted until that event has been
+    handled. Until then its files may not have been admitted yet, so an uncached file is waited for
+    instead of being reported as something to read from the secondary endpoint.
+
+    Every waiter holds a request thread, so at most `max_waiters` wait at a time; keep it well below
+    the number of API threads, so events and health checks are still answered.
+    """
+
+    def __init__(self, cache_manager, max_workflows=1000, max_timeout=60, max_waiters=8):
+        """
+        Args:
+            cache_manager (CacheManager): The cache holding the readiness of the files.
+            max_workflows (int): Number of workflows whose files are remembered (least recently registered are dropped).
+            max_timeout (int): Upper bound in seconds for the timeout of a single wait.
+            max_waiters (int): Maximum number of waits at the same time.
+        """
+        self.cache_manager = cache_manager
+        self.max_workflows = max_workflows
+        self.max_timeout = max_timeout
+        self.max_waiters = max_waiters
+        self.workflows = OrderedDict()  # workflow uid -> requested files, in workflow order
+        self.pending = {}  # workflow uid -> number of accepted events not handled yet
+        self.waiters = 0
+
+        self._condition = threading.Condition()
+        self._version = 0  # Incremented on every change, so waiters cannot miss one between check and wait
+
+    def register(self, workflow_uid, files) -> None:
+        """Remembers the files requested by a workflow."""
+        if not workflow_uid:
+            return
+        with self._condition:
+            self.workflows[workflow_uid] = list(files)
+            self.workflows.move_to_end(workflow_uid)
+            while len(self.workflows) > self.max_workflows:
+                self.workflows.popitem(last=False)
+
+    def forget(self, workflow_uid) -> None:
+        """Drops a finished workflow and wakes its waiters."""
+        with self._condition:
+            self.workflows.pop(workflow_uid, None)
+        self.notify()
+
+    def expect(self, workflow_uid) -> None:
+        """Marks a workflow as pending until `settle` is called for the accepted event."""
+        if not workflow_uid:
+            return
+        with self._condition:
+            self.pending[workflow_uid] = self.pending.get(workflow_uid, 0) + 1
+
+    def settle(self, workflow_uid) -> None:
+        """Records that an accepted event of a workflow has been handled (or failed) and wakes the waiters."""
+        if not workflow_uid:
+            return
+        with self._condition:
+            remaining = self.pending.pop(workflow_uid, 0) - 1
+            if remaining > 0:
+                self.pending[workflow_uid] = remaining
+        self.notify()
+
+    def get_files(self, workflow_uid):
+        """Returns the files registered for a workflow, or None if it is unknown."""
+        with self._condition:
+            files = self.workflows.get(workflow_uid)
+            return list(files) if files is not None else None
+
+    def notify(self) -> None:
+        """Wakes all waiters to re-check their files; called when the readiness of any file changed."""
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, workflow_uid, files=None, timeout=30):
+        """
+        Waits until the files of a workflow are resolved: none is staging any more and, while the
+        workflow is pending, none is missing. Returns early once the timeout has passed.
+
+        Args:
+            workflow_uid (str): The workflow the files belong to.
+            files (list, optional): The files to wait for instead of the registered files of the workflow.
+            timeout (float): Seconds to wait at most (capped to `max_timeout`).
+
+        Returns:
+            tuple(bool, dict, bool) or None: (True if the files are resolved, file name -> "ready",
+            "staging" or "missing", True if an event of the workflow is still to be handled), or None
+            if neither files nor a pending event are known for the workflow.
+
+        Raises:
+            TooManyWaiters: If `max_waiters` requests are already waiting.
+        """
+        with self._condition:
+            if self.waiters >= self.max_waiters:
+                raise TooManyWaiters(f"{self.waiters} requests are already waiting for files")
+            self.waiters += 1
+        try:
+            return self._wait(workflow_uid, files, timeout)
+        finally:
+            with self._condition:
+                self.waiters -= 1
+
+    def _wait(self, workflow_uid, files, timeout):
+        """Waits for the files as described in `wait`."""
+        deadline = time.monotonic() + max(0, min(timeout, self.max_timeout))
+        while True:
+            with self._condition:
+                version = self._version
+                pending = workflow_uid in self.pending
+                wanted = files or self.workflows.get(workflow_uid)
+            if wanted is None and not pending:
+                return None
+
+            # The files of a pending workflow that has not been handled yet are not known
+            readiness = self.cache_manager.get_readiness(wanted) if wanted else {}
+            states = set(readiness.values())
+            resolved = bool(wanted) and STAGING not in states and not (pending and MISSING in states)
+            if resolved:
+                return True, readiness, pending
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False, readiness, pending
+
+            with self._condition:
+                self._condition.wait_for(lambda: self._version != version, remaining)
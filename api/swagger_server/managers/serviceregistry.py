@@ -0,0 +1,113 @@
+import threading
+import time
+
+# Startup states reported by `ServiceRegistry.get_status`
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class ServiceUnavailable(Exception):
+    """Raised when the services are requested before they could be built."""
+
+    def __init__(self, state, error=None):
+        super().__init__(f"Service is {state}" + (f": {error}" if error else ""))
+        self.state = state
+        self.error = error
+
+
+class ServiceRegistry:
+    """
+    Builds the managers of the service once, the first time they are needed.
+
+    Building them fetches the secrets, configures the rclone remotes and connects to MongoDB, so it is
+    not done on import. `warm_up` builds them on a background thread, retrying until it succeeds,
+    while the server already answers: requests that need the services wait up to `wait_timeout`
+    seconds for them and otherwise get a ServiceUnavailable. Without a warm-up, the first `get`
+    builds them in the calling thread.
+    """
+
+    def __init__(self, factory, wait_timeout=5, retry_interval=10):
+        """
+        Args:
+            factory (callable): Builds and starts the services and returns them.
+            wait_timeout (float): Seconds `get` waits for a warm-up that is still running.
+            retry_interval (float): Seconds between two attempts of a failed warm-up.
+        """
+        self.factory = factory
+        self.wait_timeout = wait_timeout
+        self.retry_interval = retry_interval
+
+        self.state = WARMING
+        self.error = None
+        self.attempts = 0
+        self.started_at = time.time()
+        self.ready_at = None
+
+        self._services = None
+        self._ready = threading.Event()
+        self._build_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+
+    def warm_up(self) -> None:
+        """Starts building the services on a background thread (once)."""
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._warm_up, name="service-warm-up", daemon=True)
+        self._thread.start()
+
+    def get(self, timeout=None):
+        """
+        Returns the services, building them first if neither a warm-up nor an earlier call did.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a running warm-up (default: `wait_timeout`).
+
+        Raises:
+            ServiceUnavailable: If the warm-up has not finished in time or building the services failed.
+        """
+        if self._ready.is_set():
+            return self._services
+        if self._thread is None:
+            return self._build()
+
+        if not self._ready.wait(self.wait_timeout if timeout is None else timeout):
+            raise ServiceUnavailable(self.state, self.error)
+        return self._services
+
+    def get_status(self) -> dict:
+        """Returns the startup state, the last error and how long the warm-up took (so far)."""
+        return {
+            "state": self.state,
+            "error": self.error,
+            "attempts": self.attempts,
+            "warmup_seconds": round((self.ready_at or time.time()) - self.started_at, 3),
+        }
+
+    def _warm_up(self):
+        """Builds the services, retrying every `retry_interval` seconds, e.g. until MongoDB is up."""
+        while not self._ready.is_set():
+            try:
+                self._build()
+            except ServiceUnavailable as e:
+                print(f"[ERROR] Failed to start the service, retrying in {self.retry_interval}s: {e.error}")
+                time.sleep(self.retry_interval)
+
+    def _build(self):
+        """Builds the services unless another thread did; concurrent callers wait for the first one."""
+        with self._build_lock:
+            if self._services is None:
+                self.attempts += 1
+                try:
+                    services = self.factory()
+                except Exception as e:
+                    self.state, self.error = FAILED, str(e)
+                    raise ServiceUnavailable(FAILED, str(e)) from e
+
+                self._services = services
+                self.state, self.error, self.ready_at = READY, None, time.time()
+                self._ready.set()
+                print(f"[INFO] Service ready after {self.ready_at - self.started_at:.1f}s")
+        return self._services
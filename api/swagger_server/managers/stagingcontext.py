@@ -0,0 +1,37 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class StagingContext:
+    """
+    What one workflow event asks the cache to stage: the endpoints and folders to copy between,
+    the requested files (in the order the workflow reads them) and the workflow they are pinned for.
+
+    A context is created per event and passed to `CacheManager.start` instead of being set on the
+    shared CacheManager, so passes for different workflows can run at the same time without
+    overwriting each other's endpoints and files. It cannot be changed once created.
+    """
+
+    primary_endpoint: str
+    primary_folder: str
+    secondary_endpoint: str
+    secondary_folder: str
+    files: Tuple[str, ...] = ()
+    workflow_uid: Optional[str] = None
+
+    def __post_init__(self):
+        # Lists given by the caller are copied, so changing them later does not change the context
+        object.__setattr__(self, "files", tuple(self.files or ()))
+        object.__setattr__(self, "primary_folder", self.primary_folder or "")
+        object.__setattr__(self, "secondary_folder", self.secondary_folder or "")
+
+    @property
+    def primary_path(self) -> str:
+        """The rclone path of the primary folder."""
+        return self.primary_endpoint + self.primary_folder
+
+    @property
+    def secondary_path(self) -> str:
+        """The rclone path of the secondary folder."""
+        return self.secondary_endpoint + self.secondary_folder
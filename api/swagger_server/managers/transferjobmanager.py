@@ -0,0 +1,355 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class TransferQueueFull(Exception):
+    """Raised when no more transfer jobs can be queued."""
+
+
+class TransferBudget:
+    """
+    Global number of parallel file transfers shared by all running jobs.
+
+    A job reserves its `--transfers` slots before it starts and gives them back when it ends,
+    so the total number of files in flight never exceeds `total`, however many jobs run.
+    Waiting jobs are served first come, first served: a job asking for many slots is not
+    overtaken by smaller jobs that keep finishing and starting again.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.in_use = 0
+        self._waiters = deque()  # Tickets of the waiting requests, oldest first
+        self._condition = threading.Condition()
+
+    def acquire(self, slots: int, cancel_event: threading.Event = None) -> int:
+        """
+        Waits until `slots` transfer slots are free and every earlier request has been served, and
+        reserves them.
+
+        Returns:
+            int: The reserved slots (at most `total`), or 0 if the job was cancelled while waiting.
+        """
+        slots = max(1, min(slots, self.total))
+        ticket = object()
+        with self._condition:
+            self._waiters.append(ticket)
+            try:
+                while self._waiters[0] is not ticket or self.in_use + slots > self.total:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return 0
+                    self._condition.wait(timeout=1)
+                self.in_use += slots
+                return slots
+            finally:
+                self._waiters.remove(ticket)
+                # The next request in line may fit in the remaining slots, or be at the head now
+                self._condition.notify_all()
+
+    def release(self, slots: int) -> None:
+        """Returns reserved slots to the budget."""
+        with self._condition:
+            self.in_use -= slots
+            self._condition.notify_all()
+
+
+class TransferJob:
+    """
+    One copy or sync submitted to the TransferJobManager.
+
+    A job consists of one or more steps that run one after the other, each a dict with `source`,
+    `destination`, `files` and its own `parallel_files`, `checkers` and rclone `options`; the
+    status holds the overall byte progress and the state of every file.
+    """
+
+    def __init__(self, operation, steps, on_done=None, on_file=None):
+        self.id = uuid.uuid4().hex
+        self.operation = operation
+        self.steps = steps
+        self.parallel_files = max(step["parallel_files"] for step in steps)
+        self.on_done = on_done
+        self.on_file = on_file
+
+        self.state = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.bytes = 0
+        self.total_bytes = 0
+        self.speed = 0
+        self.eta = None
+        self.errors = 0
+        self.retries = 0
+        self.results = {"copied": [], "unchanged": [], "failed": {}}
+        self.files = {file.lstrip("/"): QUEUED for step in steps for file in step["files"] or []}
+
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+        self._lock = threading.Lock()
+        self._done_callbacks = []
+        self._finished_steps = {"bytes": 0, "errors": 0, "retries": 0}  # Totals of the finished steps
+
+    def update_progress(self, progress: dict) -> None:
+        """Records the progress reported by the running step."""
+        with self._lock:
+            self.bytes = self._finished_steps["bytes"] + progress.get("bytes", 0)
+            self.total_bytes = max(self.total_bytes, self._finished_steps["bytes"] + progress.get("total_bytes", 0))
+            self.errors = self._finished_steps["errors"] + progress.get("errors", 0)
+            self.retries = self._finished_steps["retries"] + progress.get("retries", 0)
+            self.speed = progress.get("speed", 0)
+            self.eta = progress.get("eta")
+            for transfer in progress.get("transferring", []):
+                if self.files.get(transfer.get("name")) == QUEUED:
+                    self.files[transfer["name"]] = RUNNING
+
+    def record_file(self, name: str, error: str = None) -> None:
+        """Records that a file has arrived (or failed) while its step may still be running."""
+        with self._lock:
+            self.files[name] = FAILED if error else SUCCEEDED
+        if self.on_file is not None:
+            try:
+                self.on_file(name, error)
+            except Exception as e:
+                print(f"[ERROR] File handler of transfer job {self.id} failed for '{name}': {e}")
+
+    def record_step(self, results: dict) -> None:
+        """Adds the per-file results of a finished step."""
+        with self._lock:
+            self._finished_steps = {"bytes": self.bytes, "errors": self.errors, "retries": self.retries}
+            self.results["copied"].extend(results.get("copied", []))
+            self.results["unchanged"].extend(results.get("unchanged", []))
+            self.results["failed"].update(results.get("failed", {}))
+            for file in results.get("copied", []) + results.get("unchanged", []):
+                self.files[file] = SUCCEEDED
+            for file in results.get("failed", {}):
+                if file in self.files:
+                    self.files[file] = FAILED
+
+    def settle_files(self) -> None:
+        """Gives the files the job never got to (it was cancelled or failed before them) its final state."""
+        with self._lock:
+            for name, state in self.files.items():
+                if state in (QUEUED, RUNNING):
+                    self.files[name] = CANCELLED if self.state == CANCELLED else FAILED
+
+    def add_done_callback(self, callback) -> None:
+        """Calls `callback` with the job once it has finished, at once if it already has."""
+        with self._lock:
+            if not self.done_event.is_set():
+                self._done_callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self) -> None:
+        """Releases the waiters of the job and runs its done callbacks."""
+        with self._lock:
+            self.done_event.set()
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"[ERROR] Done callback of transfer job {self.id} failed: {e}")
+
+    def to_dict(self) -> dict:
+        """Returns the job status."""
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "operation": self.operation,
+                "state": self.state,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "bytes": self.bytes,
+                "total_bytes": self.total_bytes,
+                "speed": self.speed,
+                "eta": self.eta,
+                "errors": self.errors,
+                "retries": self.retries,
+                "parallel_files": self.parallel_files,
+                "files": dict(self.files),
+                "failed": dict(self.results["failed"]),
+            }
+
+
+class TransferJobManager:
+    """
+    Runs copy and sync jobs in the background, so requests can return as soon as a job is queued.
+
+    Jobs run on a bounded thread pool (`max_workers`) and share a global budget of parallel
+    file transfers (`max_transfers`). Finished jobs are kept for status queries until more than
+    `history_size` jobs have finished after them.
+    """
+
+    def __init__(self, rclone_manager, max_workers=4, max_transfers=16, max_queued=100, history_size=500):
+        """
+        Args:
+            rclone_manager (RcloneManager): Manager running the transfers.
+            max_workers (int): Maximum number of jobs running at the same time.
+            max_transfers (int): Maximum number of files transferred at the same time, across all jobs.
+            max_queued (int): Maximum number of unfinished jobs; further submissions are refused.
+            history_size (int): Number of finished jobs kept for status queries.
+        """
+        self.rclone_manager = rclone_manager
+        self.max_queued = max_queued
+        self.history_size = history_size
+        self.budget = TransferBudget(max_transfers)
+
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transfer-job")
+
+    def submit(self, operation, source, destination, files=None, folders=None, parallel_files=4, checkers=8,
+               on_done=None, batches=None, on_file=None) -> TransferJob:
+        """
+        Queues a copy or sync.
+
+        Args:
+            operation (str): "copy" or "sync".
+            source (str): The source folder.
+            destination (str): The destination folder.
+            files (list, optional): Files below `source` to transfer.
+            folders (list, optional): Subfolders to transfer one after the other (ignored with `files`).
+            parallel_files (int): Parallel file transfers requested for this job.
+            checkers (int): Parallel existence checks for this job.
+            on_done (callable, optional): Called with the job once it has finished.
+            batches (list, optional): Batches of files with their own settings, as returned by
+                `TransferTuner.plan`; transferred one after the other instead of `files`.
+            on_file (callable, optional): Called with (file, error) as soon as a file has arrived or failed.
+
+        Returns:
+            TransferJob: The queued job.
+
+        Raises:
+            TransferQueueFull: If `max_queued` jobs are already waiting or running.
+        """
+        def step(step_source, step_destination, step_files=None, step_parallel_files=parallel_files,
+                 step_checkers=checkers, options=None):
+            return {"source": step_source, "destination": step_destination, "files": step_files,
+                    "parallel_files": step_parallel_files, "checkers": step_checkers, "options": options or {}}
+
+        if batches:
+            steps = [step(source, destination, batch["files"], batch["parallel_files"], batch["checkers"],
+                          batch.get("options")) for batch in batches]
+        elif files:
+            steps = [step(source, destination, files)]
+        elif folders:
+            steps = [step(f"{source}{folder}", f"{destination}{folder}") for folder in folders]
+        else:
+            steps = [step(source, destination)]
+
+        job = TransferJob(operation, steps, on_done, on_file)
+        with self._lock:
+            active = sum(1 for existing in self.jobs.values() if existing.state not in FINISHED_STATES)
+            if active >= self.max_queued:
+                raise TransferQueueFull(f"{active} transfer jobs are already queued or running")
+            self.jobs[job.id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get_job(self, job_id):
+        """Returns the job with the given ID, or None."""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self, state=None) -> list:
+        """Returns the status of all known jobs, optionally only those in `state`."""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.to_dict() for job in jobs if state is None or job.state == state]
+
+    def cancel(self, job_id) -> bool:
+        """
+        Cancels a queued or running job.
+
+        Returns:
+            bool: False if the job does not exist or has already finished.
+        """
+        job = self.get_job(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def shutdown(self, wait=True):
+        """Cancels all unfinished jobs and stops the worker pool."""
+        with self._lock:
+            for job in self.jobs.values():
+                job.cancel_event.set()
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: TransferJob):
+        """Runs the steps of a job, each within the transfer budget."""
+        try:
+            for step in job.steps:
+                if not self._run_step(job, step):
+                    job.state = CANCELLED
+                    return
+
+            job.state = FAILED if job.results["failed"] else SUCCEEDED
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job.settle_files()
+            print(f"[INFO] Transfer job {job.id} {job.state}")
+            if job.on_done is not None:
+                try:
+                    job.on_done(job)
+                except Exception as e:
+                    print(f"[ERROR] Completion handler of transfer job {job.id} failed: {e}")
+            # Waiters are released only after the completion handler has updated the cache
+            job.finish()
+
+    def _run_step(self, job: TransferJob, step: dict) -> bool:
+        """
+        Reserves the transfer slots of a step and runs it.
+
+        Returns:
+            bool: False if the job was cancelled.
+        """
+        slots = 0 if job.cancel_event.is_set() else self.budget.acquire(step["parallel_files"], job.cancel_event)
+        if not slots:
+            return False
+
+        try:
+            if job.state == QUEUED:
+                job.state = RUNNING
+                job.started_at = time.time()
+            success, results = self.rclone_manager.transfer(
+                job.operation, step["source"], step["destination"], step["files"], parallel_files=slots,
+                checkers=step["checkers"], progress=job.update_progress, cancel_event=job.cancel_event,
+                options=step["options"], file_done=job.record_file
+            )
+        finally:
+            self.budget.release(slots)
+
+        job.record_step(results)
+        if job.cancel_event.is_set():
+            return False
+        if not success:
+            job.error = f"Failed to {job.operation} {len(results['failed'])} files"
+        return True
+
+    def _prune(self):
+        """Forgets the oldest finished jobs beyond `history_size`. The caller holds the lock."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self.jobs[job_id]
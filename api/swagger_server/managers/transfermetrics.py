@@ -0,0 +1,92 @@
+import threading
+import time
+
+
+class TransferMetrics:
+    """
+    Throughput statistics of finished transfers, per endpoint and per route (source -> destination).
+
+    Every transfer reports its final rclone stats (bytes, errors, retries, transfers) and its
+    duration. Throughput is derived from the bytes moved while a transfer of the endpoint was
+    running, so it reflects the achievable rate rather than the rate averaged over idle time.
+    The most recent rate of each route is additionally smoothed (exponential moving average),
+    so short bursts do not dominate the numbers used for sizing.
+    """
+
+    def __init__(self, smoothing=0.3):
+        """
+        Args:
+            smoothing (float): Weight of the latest transfer in the moving average of the route speed.
+        """
+        self.smoothing = smoothing
+        self.started_at = time.time()
+        self.routes = {}  # (source endpoint, destination endpoint) -> counters
+        self._lock = threading.Lock()
+
+    def record(self, source: str, destination: str, stats: dict, duration: float) -> None:
+        """
+        Adds a finished transfer.
+
+        Args:
+            source (str): The source endpoint (rclone remote name).
+            destination (str): The destination endpoint (rclone remote name).
+            stats (dict): The final rclone stats (`bytes`, `errors`, `retries`, `transfers`, `checks`).
+            duration (float): Seconds the transfer ran.
+        """
+        transferred = stats.get("bytes", 0)
+        speed = transferred / duration if duration > 0 else 0
+
+        with self._lock:
+            route = self.routes.setdefault((source, destination), {
+                "transfers": 0, "bytes": 0, "files": 0, "checks": 0, "errors": 0, "retries": 0,
+                "seconds": 0.0, "average_speed": None, "peak_speed": 0, "last_transfer": None,
+            })
+            route["transfers"] += 1
+            route["bytes"] += transferred
+            route["files"] += stats.get("transfers", 0)
+            route["checks"] += stats.get("checks", 0)
+            route["errors"] += stats.get("errors", 0)
+            route["retries"] += stats.get("retries", 0)
+            route["seconds"] += duration
+            route["last_transfer"] = time.time()
+            if transferred:
+                route["peak_speed"] = max(route["peak_speed"], speed)
+                route["average_speed"] = speed if route["average_speed"] is None else (
+                    self.smoothing * speed + (1 - self.smoothing) * route["average_speed"])
+
+    def snapshot(self) -> dict:
+        """
+        Returns the collected metrics.
+
+        Returns:
+            dict: {"since": ..., "routes": [...], "endpoints": [...]}; `throughput` is bytes/s while busy.
+        """
+        with self._lock:
+            routes = [dict(route, source=source, destination=destination)
+                      for (source, destination), route in self.routes.items()]
+
+        endpoints = {}
+        for route in routes:
+            route["throughput"] = route["bytes"] / route["seconds"] if route["seconds"] else 0
+            for endpoint, direction in ((route["source"], "read"), (route["destination"], "written")):
+                totals = endpoints.setdefault(endpoint, {
+                    "endpoint": endpoint, "bytes_read": 0, "bytes_written": 0, "seconds_read": 0.0,
+                    "seconds_written": 0.0, "errors": 0, "retries": 0,
+                })
+                totals[f"bytes_{direction}"] += route["bytes"]
+                totals[f"seconds_{direction}"] += route["seconds"]
+                totals["errors"] += route["errors"]
+                totals["retries"] += route["retries"]
+
+        for totals in endpoints.values():
+            for direction in ("read", "written"):
+                seconds = totals.pop(f"seconds_{direction}")
+                totals[f"{direction}_throughput"] = totals[f"bytes_{direction}"] / seconds if seconds else 0
+
+        return {"since": self.started_at, "routes": routes, "endpoints": list(endpoints.values())}
+
+    def reset(self) -> None:
+        """Forgets all collected metrics."""
+        with self._lock:
+            self.routes = {}
+            self.started_at = time.time()
@@ -0,0 +1,116 @@
+import copy
+
+MIB = 1024 * 1024
+
+# rclone settings per kind of batch: many small files are bound by per-file latency and gain from
+# many parallel transfers; large files are bound by bandwidth and gain from parallel chunks per file.
+DEFAULT_PROFILES = {
+    "small": {"transfers": 32, "checkers": 32},
+    "large": {"transfers": 4, "checkers": 8, "multi_thread_streams": 8, "multi_thread_cutoff": 64 * MIB,
+              "s3_chunk_size": 64 * MIB, "s3_upload_concurrency": 8},
+}
+
+
+class TransferTuner:
+    """
+    Chooses rclone transfer settings for a batch of files from their sizes.
+
+    Files below `large_file_threshold` are small, the others large. A batch holding only one
+    kind gets that kind's profile; a mixed batch is split into a small-file and a large-file
+    batch, so neither kind runs with settings tuned for the other. The profiles can be overridden
+    per endpoint (rclone remote name), e.g. for a backend that throttles parallel requests:
+
+        "tuning": {"large_file_threshold": 33554432,
+                   "small": {"transfers": 16},
+                   "endpoints": {"minio": {"large": {"s3_upload_concurrency": 4}}}}
+    """
+
+    def __init__(self, large_file_threshold=64 * MIB, small=None, large=None, endpoints=None):
+        """
+        Args:
+            large_file_threshold (int): Size in bytes from which a file counts as large.
+            small (dict, optional): Settings overriding the default small-file profile.
+            large (dict, optional): Settings overriding the default large-file profile.
+            endpoints (dict, optional): Endpoint name -> {"small": {...}, "large": {...}} overrides.
+        """
+        self.large_file_threshold = large_file_threshold
+        self.profiles = copy.deepcopy(DEFAULT_PROFILES)
+        self.profiles["small"].update(small or {})
+        self.profiles["large"].update(large or {})
+        self.endpoints = endpoints or {}
+
+    def plan(self, file_sizes: dict, source: str = None, destination: str = None, preserve_order=False) -> list:
+        """
+        Splits a batch and chooses the settings of every part.
+
+        Args:
+            file_sizes (dict): File name -> size in bytes (None if unknown), in transfer order.
+            source (str, optional): Source path; overrides of its endpoint apply.
+            destination (str, optional): Destination path; overrides of its endpoint apply after those of the source.
+            preserve_order (bool): Split into consecutive runs of small or large files instead of one
+                batch per kind, so the batches keep the order of `file_sizes`.
+
+        Returns:
+            list: One dict per batch with `files`, `parallel_files`, `checkers` and the remaining rclone `options`.
+        """
+        runs = []  # (kind, files)
+        for file, size in file_sizes.items():
+            kind = "large" if size is not None and size >= self.large_file_threshold else "small"
+            if not preserve_order:
+                run = next((run for run in runs if run[0] == kind), None)
+            else:
+                run = runs[-1] if runs and runs[-1][0] == kind else None
+            if run is None:
+                run = (kind, [])
+                runs.append(run)
+            run[1].append(file)
+        if not preserve_order:
+            runs.sort(key=lambda run: run[0] == "large")
+
+        batches = []
+        for kind, files in runs:
+            settings = self._profile(kind, source, destination)
+            batches.append({
+                "files": files,
+                # More transfer slots than files would only hold back the shared transfer budget
+                "parallel_files": max(1, min(settings.pop("transfers"), len(files))),
+                "checkers": settings.pop("checkers"),
+                "options": settings,
+            })
+        return batches
+
+    def _profile(self, kind: str, source: str, destination: str) -> dict:
+        """Returns the settings of a profile with the overrides of the source and destination endpoints."""
+        settings = dict(self.profiles[kind])
+        for path in (source, destination):
+            remote, separator, _ = (path or "").partition(":")
+            if separator:
+                settings.update(self.endpoints.get(remote, {}).get(kind, {}))
+        return settings
+
+
+def split_into_windows(batches: list, window: int = None) -> list:
+    """
+    Splits batches into consecutive windows of files, transferred one after the other.
+
+    rclone does not transfer a file list in list order, so a long batch would stage the first
+    file a workflow reads at a random point. Transferring it in windows of `window` files
+    (default: twice the parallel transfers of the batch) stages the files roughly in list
+    order while keeping every transfer slot busy within a window.
+
+    Args:
+        batches (list): Batches as returned by `TransferTuner.plan`.
+        window (int, optional): Files per window; 0 keeps the batches whole.
+
+    Returns:
+        list: The windows, each a batch with the settings of the batch it was taken from.
+    """
+    windows = []
+    for batch in batches:
+        size = window if window is not None else 2 * batch["parallel_files"]
+        if not size or size >= len(batch["files"]):
+            windows.append(batch)
+            continue
+        for start in range(0, len(batch["files"]), size):
+            windows.append(dict(batch, files=batch["files"][start:start + size]))
+    return windows
@@ -1,4 +1,9 @@
 from .argofileextractor import parse_argo_workflow
+from .eventdeduplicator import fingerprint_event
+from .stagingcontext import StagingContext
+
+# Workflow phases after which the files of a workflow are no longer needed
+TERMINAL_PHASES = {"SUCCEEDED", "FAILED", "ERROR", "COMPLETED"}
 
 
 class WorkflowEventHandler:
@@ -7,8 +12,11 @@ class WorkflowEventHandler:
     by ensuring files listed in the workflow JSON are present in the primary endpoint.
     """
 
-    def __init__(self, cache_manager=None):
+    def __init__(self, cache_manager=None, cache_reconciler=None, event_deduplicator=None, event_coalescer=None):
         self.cache_manager = cache_manager
+        self.cache_reconciler = cache_reconciler
+        self.event_deduplicator = event_deduplicator
+        self.event_coalescer = event_coalescer
 
     def handle_workflow_event(self, workflow_json: dict):
         """
@@ -20,27 +28,100 @@ class WorkflowEventHandler:
                 - 'primary_endpoint': str
                 - 'secondary_endpoint': str
                 - 'files': list of filenames
+
+        Returns:
+            TransferJob or None: The background job copying the missing files, if any. For a repeated
+            event, the job started for the event it repeats while that job is still running; for an
+            event merged with others of the same workflow, the job of the merged event.
         """
 
         workflow_data = parse_argo_workflow(workflow_json)
 
         print(f"workflowdata: {workflow_data}")
 
-        primary_endpoint = f"{self.cache_manager.rclone_manager.get_endpoint_name(workflow_data.get('primary_endpoint'))}:"
-        secondary_endpoint = f"{self.cache_manager.rclone_manager.get_endpoint_name(workflow_data.get('secondary_endpoint'))}:"
-        primary_folder = workflow_data.get("primary_folder")
-        secondary_folder = workflow_data.get("secondary_folder")
-        files = workflow_data.get("files", [])
+        workflow_uid = workflow_data.get("unique_id")
+        self.expect(workflow_uid)
+        try:
+            # A burst of events of the same workflow is merged into one pass
+            if self.event_coalescer is not None and workflow_uid:
+                return self.event_coalescer.submit(workflow_uid, workflow_data, self.handle_workflow_data)
+            return self.handle_workflow_data(workflow_data)
+        finally:
+            self.settle(workflow_uid)
+
+    def expect(self, workflow_uid) -> None:
+        """
+        Notes that an event of a workflow was accepted, so its steps wait for files it has yet to
+        admit (see `ReadinessTracker`). Every call is followed by one to `settle`.
+        """
+        if self.cache_manager.readiness_tracker is not None:
+            self.cache_manager.readiness_tracker.expect(workflow_uid)
+
+    def settle(self, workflow_uid) -> None:
+        """Notes that an accepted event of a workflow has been handled, successfully or not."""
+        if self.cache_manager.readiness_tracker is not None:
+            self.cache_manager.readiness_tracker.settle(workflow_uid)
+
+    def handle_workflow_data(self, workflow_data: dict):
+        """
+        Handles a parsed workflow event unless it repeats one already handled.
+
+        Args:
+            workflow_data (dict): The event as returned by `parse_argo_workflow`.
+
+        Returns:
+            TransferJob or None: See `handle_workflow_event`.
+        """
+        # Every pass of a running workflow, even one skipped as unchanged, keeps its pins alive. This is
+        # also the entry point of the event queue, which bypasses `handle_workflow_event`
+        workflow_uid = workflow_data.get("unique_id")
+        if workflow_uid and workflow_data.get("status") not in TERMINAL_PHASES:
+            self.cache_manager.refresh_pins(workflow_uid)
+
+        if self.event_deduplicator is None:
+            return self._handle(workflow_data)
+
+        # Repeated events (e.g. node status updates) are answered without listing or copying anything
+        fingerprint = fingerprint_event(workflow_data, workflow_data.get("status") in TERMINAL_PHASES)
+        duplicate, job = self.event_deduplicator.begin(workflow_uid, workflow_data.get("resource_version"),
+                                                       fingerprint)
+        if duplicate:
+            print(f"[INFO] Skipping unchanged event of workflow {workflow_uid}")
+            return job if job is not None and not job.done_event.is_set() else None
+
+        try:
+            job = self._handle(workflow_data)
+        except Exception:
+            self.event_deduplicator.abort(workflow_uid)
+            raise
+        self.event_deduplicator.complete(workflow_uid, job)
+        return job
+
+    def _handle(self, workflow_data: dict):
+        """Stages the files of a parsed workflow event, or releases them once the workflow has finished."""
+        # A finished workflow releases its pinned files; there is nothing left to stage
+        workflow_uid = workflow_data.get("unique_id")
+        if workflow_data.get("status") in TERMINAL_PHASES:
+            self.cache_manager.release_pins(workflow_uid)
+            if self.cache_manager.readiness_tracker is not None:
+                self.cache_manager.readiness_tracker.forget(workflow_uid)
+            return None
 
-        # Update the shared CacheManager via setters instead of re-instantiating
-        self.cache_manager.set_primary_endpoint(primary_endpoint)
-        self.cache_manager.set_primary_folder(primary_folder)
-        self.cache_manager.set_secondary_endpoint(secondary_endpoint)
-        self.cache_manager.set_secondary_folder(secondary_folder)
-        self.cache_manager.set_files(files)
+        rclone_manager = self.cache_manager.rclone_manager
+        context = StagingContext(
+            primary_endpoint=f"{rclone_manager.get_endpoint_name(workflow_data.get('primary_endpoint'))}:",
+            primary_folder=workflow_data.get("primary_folder"),
+            secondary_endpoint=f"{rclone_manager.get_endpoint_name(workflow_data.get('secondary_endpoint'))}:",
+            secondary_folder=workflow_data.get("secondary_folder"),
+            files=workflow_data.get("files", []),
+            workflow_uid=workflow_uid,
+        )
 
-        # sync cache
-        self.cache_manager.sync_cache()
+        # Reconciliation of the primary folder runs in the background; without a reconciler it runs inline
+        if self.cache_reconciler:
+            self.cache_reconciler.register(context.primary_endpoint, context.primary_folder)
+        else:
+            self.cache_manager.sync_cache(context.primary_endpoint, context.primary_folder)
 
-        # Start the cache synchronization process
-        self.cache_manager.start()
+        # Stage the files of this event; the context keeps concurrent events apart
+        return self.cache_manager.start(context)
@@ -0,0 +1,80 @@
+import os
+from types import SimpleNamespace
+
+from flask import jsonify
+from swagger_server.managers.cachemanager import CacheManager
+from swagger_server.managers.cachereconciler import CacheReconciler
+from swagger_server.managers.eventcoalescer import EventCoalescer
+from swagger_server.managers.eventdeduplicator import EventDeduplicator
+from swagger_server.managers.eventqueue import EventQueue
+from swagger_server.managers.eventstore import create_event_store
+from swagger_server.managers.healthprober import HealthProber
+from swagger_server.managers.readinesstracker import ReadinessTracker
+from swagger_server.managers.serviceregistry import ServiceRegistry, ServiceUnavailable
+from swagger_server.managers.transferjobmanager import TransferJobManager
+from swagger_server.managers.workfloweventhandler import WorkflowEventHandler
+
+
+def build_services() -> SimpleNamespace:
+    """Creates the managers of the service, wires them together and starts their background threads."""
+    cache_manager = CacheManager()
+
+    # Copies and syncs of all requests share one worker pool and one budget of parallel file transfers
+    transfer_job_manager = TransferJobManager(cache_manager.rclone_manager,
+                                              **cache_manager.cache_settings.get("transfer_jobs", {}))
+    cache_manager.transfer_job_manager = transfer_job_manager
+
+    # Workflow steps wait on this for their input files instead of polling
+    readiness_tracker = ReadinessTracker(cache_manager, **cache_manager.cache_settings.get("readiness", {}))
+    cache_manager.readiness_tracker = readiness_tracker
+
+    cache_reconciler = CacheReconciler(cache_manager,
+                                       interval=cache_manager.cache_settings.get("reconcile_interval", 300))
+
+    # Argo repeats the workflow in an UPDATE event for every node status change; unchanged ones are skipped
+    dedupe_settings = dict(cache_manager.cache_settings.get("event_dedupe", {}))
+    event_deduplicator = EventDeduplicator(**dedupe_settings) if dedupe_settings.pop("enabled", True) else None
+
+    # Events of the same workflow arriving within a short window are merged into one staging pass
+    coalescing_settings = dict(cache_manager.cache_settings.get("event_coalescing", {}))
+    event_coalescer = EventCoalescer(**coalescing_settings) if coalescing_settings.pop("enabled", True) else None
+
+    workflow_event_handler = WorkflowEventHandler(cache_manager, cache_reconciler, event_deduplicator,
+                                                  event_coalescer)
+
+    # Accepted events are stored until their files are staged, so a restart resumes them
+    store_settings = dict(cache_manager.cache_settings.get("event_store", {}))
+    event_store = create_event_store(cache_manager.mongoDB_manager, **store_settings) \
+        if store_settings.pop("enabled", True) else None
+
+    # Events are accepted at once and handled in the background, in order per workflow
+    queue_settings = dict(cache_manager.cache_settings.get("event_queue", {}))
+    event_queue = EventQueue(workflow_event_handler, event_coalescer, event_store, **queue_settings) \
+        if queue_settings.pop("enabled", True) else None
+
+    # Health requests are answered from the results of this prober instead of probing each time
+    health_prober = HealthProber(cache_manager.rclone_manager, cache_manager.mongoDB_manager,
+                                 **cache_manager.cache_settings.get("health_probe", {}))
+
+    cache_reconciler.start()
+    if event_queue is not None:
+        event_queue.start()
+    health_prober.start()
+
+    return SimpleNamespace(
+        cache_manager=cache_manager, transfer_job_manager=transfer_job_manager, readiness_tracker=readiness_tracker,
+        cache_reconciler=cache_reconciler, event_deduplicator=event_deduplicator, event_coalescer=event_coalescer,
+        workflow_event_handler=workflow_event_handler, event_store=event_store, event_queue=event_queue,
+        health_prober=health_prober,
+    )
+
+
+# Nothing is built on import: `main` warms the services up in the background while the port is already open,
+# and the controllers get them through `services.get()`. The registry lives in this module rather than in
+# `__main__`, which `python -m swagger_server` runs as a separate module from the one the controllers import.
+services = ServiceRegistry(build_services, wait_timeout=float(os.getenv("API_WARMUP_WAIT", "5")))
+
+
+def service_unavailable(error: ServiceUnavailable):
+    """Answers requests that arrive before the services are ready with 503."""
+    return jsonify({"status": error.state, "error": error.error}), 503, {"Retry-After": "5"}
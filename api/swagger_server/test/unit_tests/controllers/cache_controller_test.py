@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import patch
+from flask import Flask, request
+
+from swagger_server.controllers.cache_controller import (
+    cache_reconcile_post, cache_reconcile_get, cache_stats_get, cache_ready_get
+)
+
+SERVICES = "swagger_server.controllers.cache_controller.services.get.return_value"
+
+
+@pytest.fixture(autouse=True)
+def services():
+    """Replaces the services, which are built lazily by the app, with mocks."""
+    with patch("swagger_server.controllers.cache_controller.services") as registry:
+        yield registry.get.return_value
+
+
+@pytest.fixture
+def client():
+    """Creates a Flask test client for the cache controller tests."""
+    app = Flask(__name__)
+    app.add_url_rule("/cache/reconcile", view_func=cache_reconcile_post, methods=["POST"])
+    app.add_url_rule("/cache/reconcile", view_func=cache_reconcile_get, methods=["GET"])
+    app.add_url_rule("/cache/stats", view_func=cache_stats_get, methods=["GET"])
+    app.add_url_rule("/cache/ready", view_func=lambda: cache_ready_get(request.args.getlist("files")),
+                     methods=["GET"])
+    with app.test_client() as client:
+        yield client
+
+
+@patch(f"{SERVICES}.cache_reconciler")
+def test_cache_reconcile_post(mock_reconciler, client):
+    """Tests that a reconciliation is triggered and accepted."""
+    response = client.post("/cache/reconcile")
+
+    assert response.status_code == 202
+    mock_reconciler.trigger.assert_called_once()
+
+
+@patch(f"{SERVICES}.cache_reconciler")
+def test_cache_reconcile_get(mock_reconciler, client):
+    """Tests returning the reconciliation status."""
+    mock_reconciler.get_status.return_value = {"interval": 300, "targets": []}
+
+    response = client.get("/cache/reconcile")
+
+    assert response.status_code == 200
+    assert response.json == {"interval": 300, "targets": []}
+
+
+@patch(f"{SERVICES}.cache_manager")
+def test_cache_stats_get(mock_cache_manager, client):
+    """Tests returning the cache statistics."""
+    mock_cache_manager.get_stats.return_value = {"hits": 3, "misses": 1}
+
+    response = client.get("/cache/stats")
+
+    assert response.status_code == 200
+    assert response.json == {"hits": 3, "misses": 1}
+
+
+@patch(f"{SERVICES}.cache_manager")
+def test_cache_stats_get_failure(mock_cache_manager, client):
+    """Tests error handling when the statistics cannot be read."""
+    mock_cache_manager.get_stats.side_effect = Exception("connection lost")
+
+    response = client.get("/cache/stats")
+
+    assert response.status_code == 500
+    assert response.json == {"error": "Failed to read cache statistics: connection lost"}
+
+
+@patch(f"{SERVICES}.cache_manager")
+def test_cache_ready_get(mock_cache_manager, client):
+    """Tests that the readiness of every file is returned, ready only once no file is staging."""
+    mock_cache_manager.get_readiness.return_value = {"/a.csv": "ready", "/b.csv": "staging"}
+
+    response = client.get("/cache/ready?files=/a.csv&files=/b.csv")
+
+    assert response.status_code == 200
+    assert response.json == {"files": {"/a.csv": "ready", "/b.csv": "staging"}, "ready": False}
+    mock_cache_manager.get_readiness.assert_called_once_with(["/a.csv", "/b.csv"])
+
+
+@patch(f"{SERVICES}.cache_manager")
+def test_cache_ready_get_missing_files_do_not_block(mock_cache_manager, client):
+    """Tests that files that are not cached (read from the secondary endpoint) count as ready to start."""
+    mock_cache_manager.get_readiness.return_value = {"/a.csv": "ready", "/b.csv": "missing"}
+
+    response = client.get("/cache/ready?files=/a.csv&files=/b.csv")
+
+    assert response.json["ready"] is True
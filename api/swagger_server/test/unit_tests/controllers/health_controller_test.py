@@ -1,55 +1,81 @@
 import pytest
-import subprocess
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from flask import Flask
-from swagger_server.controllers.health_controller import health_check
+from swagger_server.controllers.health_controller import health_check, health_live_get, health_ready_get
+
+SNAPSHOT = {
+    "status": "healthy", "checked_at": 1000.0, "age_seconds": 2.0, "duration_ms": 12.0,
+    "dependencies": {
+        "rclone": {"healthy": True, "error": None, "latency_ms": 1.5},
+        "mongodb": {"healthy": True, "error": None, "latency_ms": 3.2},
+        "remotes": {"s3": {"healthy": True, "error": None, "latency_ms": 40.1}},
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def services():
+    """Replaces the services with a started mock whose prober holds SNAPSHOT."""
+    with patch("swagger_server.controllers.health_controller.services") as registry:
+        registry.get_status.return_value = {"state": "ready", "error": None, "attempts": 1, "warmup_seconds": 2.0}
+        prober = registry.get.return_value.health_prober
+        prober.get_snapshot.return_value = SNAPSHOT
+        prober.is_stale.return_value = False
+        yield registry
 
 
 @pytest.fixture
 def client():
-    """Creates a Flask test client for testing the health_check endpoint."""
+    """Creates a Flask test client for testing the health endpoints."""
     app = Flask(__name__)
     app.add_url_rule("/health", view_func=health_check, methods=["GET"])
+    app.add_url_rule("/health/live", view_func=health_live_get, methods=["GET"])
+    app.add_url_rule("/health/ready", view_func=health_ready_get, methods=["GET"])
     with app.test_client() as client:
         yield client
 
 
-@patch("swagger_server.controllers.health_controller.subprocess.run")
-def test_health_check_success(mock_subprocess, client):
-    """Tests health_check when Rclone is working (returns 200 OK)."""
-    mock_process = MagicMock()
-    mock_process.returncode = 0
-    mock_subprocess.return_value = mock_process
+def test_health_check_success(services, client):
+    """Tests that /health and /health/ready return the cached probe results with the latency per dependency."""
+    for path in ("/health", "/health/ready"):
+        response = client.get(path)
 
-    response = client.get("/health")
+        assert response.status_code == 200
+        assert response.json == SNAPSHOT
 
-    assert response.status_code == 200
-    assert response.json == {"status": "healthy"}
+    services.get.return_value.health_prober.probe.assert_not_called()
 
-    mock_subprocess.assert_called_once_with(["rclone", "version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
+@pytest.mark.parametrize("status, code", [("degraded", 200), ("unhealthy", 503)])
+def test_health_ready_depends_on_rclone_and_mongodb(status, code, services, client):
+    """Tests that an unreachable remote only degrades the service, while failing rclone or MongoDB fail it."""
+    services.get.return_value.health_prober.get_snapshot.return_value = dict(SNAPSHOT, status=status)
 
-@patch("swagger_server.controllers.health_controller.subprocess.run")
-def test_health_check_failure(mock_subprocess, client):
-    """Tests health_check when Rclone fails (returns 503 Service Unavailable)."""
-    mock_process = MagicMock()
-    mock_process.returncode = 1
-    mock_subprocess.return_value = mock_process
+    response = client.get("/health/ready")
 
-    response = client.get("/health")
+    assert response.status_code == code
+    assert response.json["status"] == status
 
-    assert response.status_code == 503
-    assert response.json == {"status": "unhealthy", "error": "Rclone not working"}
 
-    mock_subprocess.assert_called_once_with(["rclone", "version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+def test_health_check_warming(services, client):
+    """Tests that the service is alive but not ready while its managers are built."""
+    services.get_status.return_value = {"state": "warming", "error": None, "attempts": 0, "warmup_seconds": 0.5}
 
-
-@patch("swagger_server.controllers.health_controller.subprocess.run", side_effect=Exception("Unexpected error"))
-def test_health_check_exception(mock_subprocess, client):
-    """Tests health_check when an exception occurs (returns 503 Service Unavailable)."""
     response = client.get("/health")
-
     assert response.status_code == 503
-    assert response.json == {"status": "unhealthy", "error": "Unexpected error"}
+    assert response.json["status"] == "warming"
+    assert response.json["startup"]["warmup_seconds"] == 0.5
+
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json["status"] == "warming"
+    services.get.assert_not_called()
+
+
+def test_health_stale_probe_fails_liveness(services, client):
+    """Tests that a prober that stopped probing fails both liveness and readiness."""
+    services.get.return_value.health_prober.is_stale.return_value = True
 
-    mock_subprocess.assert_called_once_with(["rclone", "version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert client.get("/health/live").status_code == 503
+    assert client.get("/health/ready").status_code == 503
+    assert client.get("/health/live").json["status"] == "stale"
@@ -2,12 +2,23 @@ import pytest
 from unittest.mock import patch, MagicMock
 from flask import Flask
 from werkzeug.datastructures import FileStorage
+from swagger_server.managers.transferjobmanager import TransferQueueFull
+
 from swagger_server.controllers.rclone_controller import (
     rclone_check_get, rclone_copy_post, rclone_sync_post, rclone_configure_post,
     rclone_configure_get, rclone_configure_delete, rclone_create_folder, rclone_delete_folder,
     rclone_list_folders, rclone_list_files, rclone_upload_file, rclone_delete_file
 )
 
+SERVICES = "swagger_server.controllers.rclone_controller.services.get.return_value"
+
+
+@pytest.fixture(autouse=True)
+def services():
+    """Replaces the services, which are built lazily by the app, with mocks."""
+    with patch("swagger_server.controllers.rclone_controller.services") as registry:
+        yield registry.get.return_value
+
 
 @pytest.fixture
 def client():
@@ -32,50 +43,53 @@ def client():
         yield client
 
 
-@patch("swagger_server.controllers.rclone_controller.rclone.copy_files",
-       return_value=(True, "Files copied successfully"))
-def test_rclone_copy_post_success(mock_copy, client):
-    """Test successful Rclone copy operation."""
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_rclone_copy_post_success(mock_jobs, client):
+    """Test that a Rclone copy is queued as a transfer job."""
+    mock_jobs.submit.return_value = MagicMock(id="job-1")
     response = client.post("/rclone/copy", json={
         "source": "s3://source-bucket",
         "destination": "s3://destination-bucket",
         "parallel_files": 5,
         "files": ["file1.txt", "file2.csv"]
     })
-    assert response.status_code == 200
-    assert response.json["message"] == "Files copied successfully"
-    mock_copy.assert_called_once()
+    assert response.status_code == 202
+    assert response.json["job_id"] == "job-1"
+    mock_jobs.submit.assert_called_once_with("copy", "s3://source-bucket", "s3://destination-bucket",
+                                             files=["file1.txt", "file2.csv"], folders=None, parallel_files=5)
 
 
-@patch("swagger_server.controllers.rclone_controller.rclone.copy_files", return_value=(False, "Copy failed"))
-def test_rclone_copy_post_failure(mock_copy, client):
-    """Test Rclone copy operation failure."""
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_rclone_copy_post_queue_full(mock_jobs, client):
+    """Test that a copy is refused when too many transfer jobs are queued."""
+    mock_jobs.submit.side_effect = TransferQueueFull("100 transfer jobs are already queued or running")
     response = client.post("/rclone/copy", json={
         "source": "s3://source-bucket",
         "destination": "s3://destination-bucket",
         "parallel_files": 5,
         "files": ["file1.txt", "file2.csv"]
     })
-    assert response.status_code == 500
-    assert response.json["error"] == "Copy failed"
-    mock_copy.assert_called_once()
+    assert response.status_code == 429
+    assert response.json["error"] == "100 transfer jobs are already queued or running"
 
 
-@patch("swagger_server.controllers.rclone_controller.rclone.sync_folders", return_value=(True, "Sync successful"))
-def test_rclone_sync_post_success(mock_sync, client):
-    """Test successful Rclone sync operation."""
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_rclone_sync_post_success(mock_jobs, client):
+    """Test that a Rclone sync is queued as a transfer job."""
+    mock_jobs.submit.return_value = MagicMock(id="job-2")
     response = client.post("/rclone/sync", json={
         "source": "s3://source-bucket",
         "destination": "s3://destination-bucket",
         "parallel_files": 5,
         "folders": ["folder1", "folder2"]
     })
-    assert response.status_code == 200
-    assert response.json["message"] == "Sync successful"
-    mock_sync.assert_called_once()
+    assert response.status_code == 202
+    assert response.json["status_url"] == "/transfers/job-2"
+    mock_jobs.submit.assert_called_once_with("sync", "s3://source-bucket", "s3://destination-bucket",
+                                             files=None, folders=["folder1", "folder2"], parallel_files=5)
 
 
-@patch("swagger_server.controllers.rclone_controller.rclone.configure_remote", return_value=(True, "Remote configured"))
+@patch(f"{SERVICES}.cache_manager.rclone_manager.configure_remote", return_value=(True, "Remote configured"))
 def test_rclone_configure_post_success(mock_config, client):
     """Test successful Rclone remote configuration."""
     response = client.post("/rclone/configure", json={
@@ -92,7 +106,7 @@ def test_rclone_configure_post_success(mock_config, client):
     mock_config.assert_called_once()
 
 
-@patch("swagger_server.controllers.rclone_controller.rclone.get_remote",
+@patch(f"{SERVICES}.cache_manager.rclone_manager.get_remote",
        return_value=(True, '{"remotes": ["myremote"]}'))
 def test_rclone_configure_get_success(mock_get_config, client):
     """Test fetching Rclone remote configurations."""
@@ -102,7 +116,7 @@ def test_rclone_configure_get_success(mock_get_config, client):
     mock_get_config.assert_called_once()
 
 
-@patch("swagger_server.controllers.rclone_controller.rclone.delete_remote", return_value=(True, "Remote deleted"))
+@patch(f"{SERVICES}.cache_manager.rclone_manager.delete_remote", return_value=(True, "Remote deleted"))
 def test_rclone_configure_delete_success(mock_delete, client):
     """Test deleting an Rclone remote."""
     response = client.delete("/rclone/configure/myremote")
@@ -111,7 +125,7 @@ def test_rclone_configure_delete_success(mock_delete, client):
     mock_delete.assert_called_once()
 
 
-@patch("swagger_server.controllers.rclone_controller.rclone.upload_file", return_value=(True, "File uploaded"))
+@patch(f"{SERVICES}.cache_manager.rclone_manager.upload_file", return_value=(True, "File uploaded"))
 def test_rclone_upload_file_success(mock_upload, client):
     """Test successful file upload."""
     data = {
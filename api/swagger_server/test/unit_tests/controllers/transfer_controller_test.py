@@ -0,0 +1,96 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from flask import Flask
+
+from swagger_server.controllers.transfer_controller import (
+    transfer_list_get, transfer_status_get, transfer_cancel_post, transfer_metrics_get
+)
+
+SERVICES = "swagger_server.controllers.transfer_controller.services.get.return_value"
+
+
+@pytest.fixture(autouse=True)
+def services():
+    """Replaces the services, which are built lazily by the app, with mocks."""
+    with patch("swagger_server.controllers.transfer_controller.services") as registry:
+        yield registry.get.return_value
+
+
+@pytest.fixture
+def client():
+    """Creates a Flask test client for the transfer controller tests."""
+    app = Flask(__name__)
+    app.add_url_rule("/transfers", view_func=transfer_list_get, methods=["GET"])
+    app.add_url_rule("/transfers/metrics", view_func=transfer_metrics_get, methods=["GET"])
+    app.add_url_rule("/transfers/<job_id>", view_func=transfer_status_get, methods=["GET"])
+    app.add_url_rule("/transfers/<job_id>/cancel", view_func=transfer_cancel_post, methods=["POST"])
+    with app.test_client() as client:
+        yield client
+
+
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_transfer_list_get(mock_jobs, client):
+    """Tests listing the transfer jobs."""
+    mock_jobs.list_jobs.return_value = [{"job_id": "job-1", "state": "running"}]
+
+    response = client.get("/transfers")
+
+    assert response.status_code == 200
+    assert response.json == {"jobs": [{"job_id": "job-1", "state": "running"}]}
+
+
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_transfer_metrics_get(mock_jobs, client):
+    """Tests returning the endpoint metrics together with the rate of the running jobs."""
+    mock_jobs.rclone_manager.get_transfer_metrics.return_value = {"since": 0, "routes": [], "endpoints": []}
+    mock_jobs.list_jobs.return_value = [{"job_id": "job-1", "speed": 100.0}, {"job_id": "job-2", "speed": 50.0}]
+
+    response = client.get("/transfers/metrics")
+
+    assert response.status_code == 200
+    assert response.json["running"] == {"jobs": 2, "speed": 150.0}
+    mock_jobs.list_jobs.assert_called_once_with("running")
+
+
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_transfer_status_get(mock_jobs, client):
+    """Tests returning the status of a transfer job."""
+    mock_jobs.get_job.return_value.to_dict.return_value = {"job_id": "job-1", "state": "running", "bytes": 50}
+
+    response = client.get("/transfers/job-1")
+
+    assert response.status_code == 200
+    assert response.json["bytes"] == 50
+
+
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_transfer_status_get_unknown(mock_jobs, client):
+    """Tests that an unknown job ID returns 404."""
+    mock_jobs.get_job.return_value = None
+
+    response = client.get("/transfers/unknown")
+
+    assert response.status_code == 404
+
+
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_transfer_cancel_post(mock_jobs, client):
+    """Tests cancelling a running transfer job."""
+    mock_jobs.cancel.return_value = True
+
+    response = client.post("/transfers/job-1/cancel")
+
+    assert response.status_code == 202
+    mock_jobs.cancel.assert_called_once_with("job-1")
+
+
+@patch(f"{SERVICES}.transfer_job_manager")
+def test_transfer_cancel_post_finished(mock_jobs, client):
+    """Tests that a finished job cannot be cancelled."""
+    mock_jobs.get_job.return_value = MagicMock(state="succeeded")
+    mock_jobs.cancel.return_value = False
+
+    response = client.post("/transfers/job-1/cancel")
+
+    assert response.status_code == 409
+    assert response.json["error"] == "Transfer job 'job-1' has already succeeded"
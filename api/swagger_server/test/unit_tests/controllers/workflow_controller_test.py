@@ -1,26 +1,27 @@
+import sys
+import types
 import pytest
 import json
 import base64
 import yaml
 from unittest.mock import patch, MagicMock
-from flask import Flask
+from flask import Flask, request
 
-mock_secret_data = {
-    "username": "test_user",
-    "password": "test_password",
-    "host": "test_host",
-    "database": "test_db",
-    "decryption-key": "test_decryption_key"
-}
+from swagger_server.controllers.workflow_controller import (
+    workflow_event_handler_post, workflow_ready_get, workflow_event_stats_get, workflow_event_get
+)
+from swagger_server.managers.eventqueue import EventTask, EventQueueFull, EventQueueClosed
+from swagger_server.managers.readinesstracker import TooManyWaiters
+from swagger_server.managers.serviceregistry import ServiceUnavailable
 
-mock_mongo_db_manager = MagicMock()
-mock_mongo_db_manager.collection = MagicMock()
-mock_mongo_db_manager.collection.find_one.return_value = {"_id": "test_doc_id", "cache": {}}
+SERVICES = "swagger_server.controllers.workflow_controller.services.get.return_value"
 
-with patch("swagger_server.managers.awssecretsmanager.get_aws_secret", return_value=mock_secret_data), \
-        patch("swagger_server.settings.settings_reader.SettingsReader.load", return_value=None), \
-        patch("swagger_server.managers.mongodbmanager.MongoDBManager", return_value=mock_mongo_db_manager):
-    from swagger_server.controllers.workflow_controller import workflow_event_handler_post
+
+@pytest.fixture(autouse=True)
+def services():
+    """Replaces the services, which are built lazily by the app, with mocks."""
+    with patch("swagger_server.controllers.workflow_controller.services") as registry:
+        yield registry
 
 
 @pytest.fixture
@@ -28,11 +29,16 @@ def client():
     """Creates a Flask test client for the controller tests."""
     app = Flask(__name__)
     app.add_url_rule("/workflow_event", view_func=workflow_event_handler_post, methods=["POST"])
+    app.add_url_rule("/workflow/events/stats", view_func=workflow_event_stats_get, methods=["GET"])
+    app.add_url_rule("/workflow/events/<event_id>", view_func=workflow_event_get, methods=["GET"])
+    app.add_url_rule("/workflow/<uid>/ready", methods=["GET"], view_func=lambda uid: workflow_ready_get(
+        uid, request.args.getlist("files"), float(request.args.get("timeout", 30))))
     with app.test_client() as client:
         yield client
 
 
-@patch("swagger_server.controllers.workflow_controller.workflow_event_handler.handle_workflow_event")
+@patch(f"{SERVICES}.event_queue", None)
+@patch(f"{SERVICES}.workflow_event_handler.handle_workflow_event", return_value=None)
 def test_workflow_event_handler_post_valid_json(mock_handler, client):
     """Tests handling a valid JSON workflow event."""
     request_data = {
@@ -49,7 +55,8 @@ def test_workflow_event_handler_post_valid_json(mock_handler, client):
     mock_handler.assert_called_once_with(request_data["body"])
 
 
-@patch("swagger_server.controllers.workflow_controller.workflow_event_handler.handle_workflow_event")
+@patch(f"{SERVICES}.event_queue", None)
+@patch(f"{SERVICES}.workflow_event_handler.handle_workflow_event", return_value=None)
 def test_workflow_event_handler_post_valid_yaml(mock_handler, client):
     """Tests handling a valid YAML workflow event."""
     request_data_yaml = """
@@ -68,7 +75,8 @@ def test_workflow_event_handler_post_valid_yaml(mock_handler, client):
     mock_handler.assert_called_once_with(parsed_yaml["body"])
 
 
-@patch("swagger_server.controllers.workflow_controller.workflow_event_handler.handle_workflow_event")
+@patch(f"{SERVICES}.event_queue", None)
+@patch(f"{SERVICES}.workflow_event_handler.handle_workflow_event", return_value=None)
 def test_workflow_event_handler_post_base64_encoded(mock_handler, client):
     """Tests handling a Base64-encoded workflow event inside workflow_submission."""
     workflow_submission = {
@@ -132,7 +140,8 @@ def test_workflow_event_handler_post_unrecognized_format(client):
     assert response.json == {"error": "Unsupported workflow event format"}
 
 
-@patch("swagger_server.controllers.workflow_controller.workflow_event_handler.handle_workflow_event")
+@patch(f"{SERVICES}.event_queue", None)
+@patch(f"{SERVICES}.workflow_event_handler.handle_workflow_event", return_value=None)
 def test_workflow_event_handler_post_handler_exception(mock_handler, client):
     """Tests error handling when the workflow event handler raises an exception."""
     mock_handler.side_effect = Exception("Unexpected processing error")
@@ -150,3 +159,192 @@ def test_workflow_event_handler_post_handler_exception(mock_handler, client):
     assert response.status_code == 500
     assert response.json == {"error": "Failed to handle UPDATE workflow event: Unexpected processing error"}
     mock_handler.assert_called_once_with(request_data["body"])
+
+
+@patch(f"{SERVICES}.event_queue", None)
+@patch(f"{SERVICES}.workflow_event_handler.handle_workflow_event")
+def test_workflow_event_handler_post_returns_transfer_job(mock_handler, client):
+    """Tests that an event whose files are still being copied is accepted with the transfer job ID."""
+    mock_handler.return_value = MagicMock(id="job-1")
+    request_data = {"type": "ADD", "body": {"workflow_id": "1234", "files": ["file1.txt"]}}
+
+    response = client.post("/workflow_event", data=json.dumps(request_data), content_type="application/json")
+
+    assert response.status_code == 202
+    assert response.json["job_id"] == "job-1"
+
+
+@patch(f"{SERVICES}.readiness_tracker")
+def test_workflow_ready_get_waits_for_workflow_files(mock_tracker, client):
+    """Tests that the registered files of the workflow are waited for."""
+    mock_tracker.wait.return_value = (True, {"/a.csv": "ready", "/b.csv": "missing"}, False)
+
+    response = client.get("/workflow/uid-1/ready?timeout=5")
+
+    assert response.status_code == 200
+    assert response.json == {"uid": "uid-1", "ready": True, "files": {"/a.csv": "ready", "/b.csv": "missing"},
+                              "pending": False}
+    mock_tracker.wait.assert_called_once_with("uid-1", None, 5.0)
+
+
+@patch(f"{SERVICES}.readiness_tracker")
+def test_workflow_ready_get_single_file_timeout(mock_tracker, client):
+    """Tests waiting for one file of the workflow, returning its state when the timeout passes."""
+    mock_tracker.wait.return_value = (False, {"/b.csv": "staging"}, False)
+
+    response = client.get("/workflow/uid-1/ready?files=/b.csv&timeout=1")
+
+    assert response.status_code == 200
+    assert response.json["ready"] is False
+    mock_tracker.wait.assert_called_once_with("uid-1", ["/b.csv"], 1.0)
+
+
+@patch(f"{SERVICES}.readiness_tracker")
+def test_workflow_ready_get_pending_workflow(mock_tracker, client):
+    """Tests that a workflow whose event is still queued is reported as pending instead of unknown."""
+    mock_tracker.wait.return_value = (False, {}, True)
+
+    response = client.get("/workflow/uid-1/ready?timeout=1")
+
+    assert response.status_code == 200
+    assert response.json == {"uid": "uid-1", "ready": False, "files": {}, "pending": True}
+
+
+@patch(f"{SERVICES}.readiness_tracker")
+def test_workflow_ready_get_unknown_workflow(mock_tracker, client):
+    """Tests that a workflow without known files or queued events returns 404."""
+    mock_tracker.wait.return_value = None
+
+    response = client.get("/workflow/unknown/ready")
+
+    assert response.status_code == 404
+
+
+@patch(f"{SERVICES}.readiness_tracker")
+def test_workflow_ready_get_too_many_waiters(mock_tracker, client):
+    """Tests that a wait beyond the limit of waiting requests returns 429."""
+    mock_tracker.wait.side_effect = TooManyWaiters("8 requests are already waiting for files")
+
+    response = client.get("/workflow/uid-1/ready")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+
+@patch(f"{SERVICES}.event_queue", None)
+@patch(f"{SERVICES}.event_coalescer")
+@patch(f"{SERVICES}.event_deduplicator")
+def test_workflow_event_stats_get(mock_deduplicator, mock_coalescer, client):
+    """Tests returning the numbers of handled, skipped and merged events."""
+    mock_deduplicator.get_stats.return_value = {"handled": 2, "duplicate_version": 1, "unchanged": 7, "workflows": 1}
+    mock_coalescer.get_stats.return_value = {"events": 12, "passes": 3, "merged": 9}
+
+    response = client.get("/workflow/events/stats")
+
+    assert response.status_code == 200
+    assert response.json["unchanged"] == 7 and response.json["enabled"] is True
+    assert response.json["coalescing"] == {"events": 12, "passes": 3, "merged": 9, "enabled": True}
+
+
+@patch(f"{SERVICES}.event_queue")
+def test_workflow_event_handler_post_queues_event(mock_queue, client):
+    """Tests that an event is queued and answered with 202 and its tracking ID."""
+    task = EventTask("uid-1")
+    mock_queue.submit.return_value = task
+    request_data = {"type": "ADD", "body": {"metadata": {"uid": "uid-1"}}}
+
+    response = client.post("/workflow_event", data=json.dumps(request_data), content_type="application/json")
+
+    assert response.status_code == 202
+    assert response.json == {"message": "Workflow ADD event queued", "event_id": task.id}
+    mock_queue.submit.assert_called_once_with(request_data["body"])
+
+
+@pytest.mark.parametrize("error, status", [(EventQueueFull("full"), 429), (EventQueueClosed("closed"), 503)])
+@patch(f"{SERVICES}.event_queue")
+def test_workflow_event_handler_post_queue_unavailable(mock_queue, error, status, client):
+    """Tests that a full queue returns 429 with Retry-After and a closed one 503."""
+    mock_queue.submit.side_effect = error
+    request_data = {"type": "UPDATE", "body": {"metadata": {"uid": "uid-1"}}}
+
+    response = client.post("/workflow_event", data=json.dumps(request_data), content_type="application/json")
+
+    assert response.status_code == status
+    assert response.json == {"error": str(error)}
+    assert (response.headers.get("Retry-After") == "1") == (status == 429)
+
+
+def test_workflow_event_handler_post_while_warming(services, client):
+    """Tests that an event arriving before the service has started is answered with 503 and Retry-After."""
+    services.get.side_effect = ServiceUnavailable("warming")
+    request_data = {"type": "ADD", "body": {"metadata": {"uid": "uid-1"}}}
+
+    response = client.post("/workflow_event", data=json.dumps(request_data), content_type="application/json")
+
+    assert response.status_code == 503
+    assert response.json == {"status": "warming", "error": None}
+    assert response.headers["Retry-After"] == "5"
+
+
+@patch(f"{SERVICES}.event_queue")
+def test_workflow_event_get(mock_queue, client):
+    """Tests returning the status of a queued event and 404 for an unknown one."""
+    task = EventTask("uid-1")
+    mock_queue.get_task.side_effect = lambda event_id: task if event_id == task.id else None
+
+    response = client.get(f"/workflow/events/{task.id}")
+    assert response.status_code == 200
+    assert response.json["state"] == "queued" and response.json["workflow_uid"] == "uid-1"
+
+    assert client.get("/workflow/events/unknown").status_code == 404
+
+
+@pytest.fixture
+def api_client(monkeypatch):
+    """Creates a test client of the app built from swagger.yaml, so requests go through the real routes,
+    parameter parsing and API key check. The key check function is stubbed to accept one key."""
+    authorization = types.ModuleType("swagger_server.controllers.authorization_controller")
+    authorization.check_apiKeyAuth = lambda api_key, required_scopes=None: \
+        {"sub": "test"} if api_key == "test-key" else None
+    monkeypatch.setitem(sys.modules, authorization.__name__, authorization)
+    from swagger_server.__main__ import create_app
+
+    with create_app().app.test_client() as client:
+        yield client
+
+
+@patch(f"{SERVICES}.event_queue")
+def test_api_workflow_event_queued_and_refused(mock_queue, api_client):
+    """Tests that POST /workflow/event returns 202 with the event ID and 429 when the queue is full."""
+    mock_queue.submit.return_value = EventTask("uid-1", event_id="event-1")
+    event = json.dumps({"type": "UPDATE", "body": {"files": ["file1.txt"]}})
+    headers = {"X-API-KEY": "test-key"}
+
+    response = api_client.post("/workflow/event", data=event, content_type="application/json", headers=headers)
+    assert response.status_code == 202
+    assert response.json["event_id"] == "event-1"
+
+    mock_queue.submit.side_effect = EventQueueFull("full")
+    response = api_client.post("/workflow/event", data=event, content_type="application/json", headers=headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    response = api_client.post("/workflow/event", data=event, content_type="application/json")
+    assert response.status_code == 401
+
+
+@patch(f"{SERVICES}.readiness_tracker")
+def test_api_workflow_ready(mock_tracker, api_client):
+    """Tests that GET /workflow/{uid}/ready parses its query parameters and returns 429 beyond the waiters."""
+    mock_tracker.wait.return_value = (True, {"/a.csv": "ready"}, False)
+    headers = {"X-API-KEY": "test-key"}
+
+    response = api_client.get("/workflow/uid-1/ready?files=/a.csv&timeout=2", headers=headers)
+    assert response.status_code == 200
+    assert response.json == {"uid": "uid-1", "ready": True, "files": {"/a.csv": "ready"}, "pending": False}
+    mock_tracker.wait.assert_called_once_with("uid-1", ["/a.csv"], 2)
+
+    mock_tracker.wait.side_effect = TooManyWaiters("8 requests are already waiting for files")
+    response = api_client.get("/workflow/uid-1/ready", headers=headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,63 @@
+import pytest
+from swagger_server.managers.admissionfilter import AdmissionFilter, CountMinSketch
+
+
+def test_sketch_estimates_frequency():
+    """Tests that estimates follow the number of increments."""
+    sketch = CountMinSketch(width=256, depth=4)
+    for _ in range(3):
+        sketch.increment("/base/a.csv")
+    sketch.increment("/base/b.csv")
+
+    assert sketch.estimate("/base/a.csv") == 3
+    assert sketch.estimate("/base/b.csv") == 1
+    assert sketch.estimate("/never/seen.csv") == 0
+
+
+def test_sketch_counters_saturate():
+    """Tests that counters stay within their 4-bit range."""
+    sketch = CountMinSketch(width=64, depth=2, sample_size=1000)
+    for _ in range(100):
+        sketch.increment("hot")
+
+    assert sketch.estimate("hot") == CountMinSketch.MAX_COUNT
+
+
+def test_sketch_halves_periodically():
+    """Tests that all counts are halved after the sample size is reached."""
+    sketch = CountMinSketch(width=64, depth=2, sample_size=8)
+    for _ in range(7):
+        sketch.increment("a")
+    assert sketch.estimate("a") == 7
+
+    sketch.increment("a")
+    assert sketch.estimate("a") == 4
+    assert sketch.additions == 4
+
+
+def test_sketch_state_roundtrip():
+    """Tests that a sketch can be persisted and restored."""
+    sketch = CountMinSketch(width=128, depth=3)
+    sketch.increment("a")
+
+    restored = CountMinSketch.from_state(sketch.to_state())
+
+    assert restored.estimate("a") == 1
+    assert restored.additions == 1
+    assert isinstance(sketch.to_state()["counters"], bytes)
+
+
+def test_sketch_rejects_mismatched_state():
+    """Tests that counters of the wrong size are rejected."""
+    with pytest.raises(ValueError, match="does not match"):
+        CountMinSketch(width=128, depth=3, counters=b"\x00" * 10)
+
+
+def test_admission_filter():
+    """Tests that a file is only admitted when it is at least as popular as every victim."""
+    admission_filter = AdmissionFilter(CountMinSketch(width=256, depth=4))
+    admission_filter.record(["/hot.csv", "/hot.csv", "/cold.csv", "/large.csv"])
+
+    assert not admission_filter.admit("/large.csv", [{"file_name": "/cold.csv"}, {"file_name": "/hot.csv"}])
+    assert admission_filter.admit("/large.csv", [{"file_name": "/cold.csv"}])
+    assert admission_filter.admit("/hot.csv", [{"file_name": "/cold.csv"}])
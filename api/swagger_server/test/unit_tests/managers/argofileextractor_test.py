@@ -34,6 +34,7 @@ def test_parse_argo_workflow_valid_yaml():
 metadata:
   name: test-workflow
   uid: test-uid
+  resourceVersion: "4711"
   labels:
     workflows.argoproj.io/phase: Running
 spec:
@@ -54,6 +55,7 @@ status:
 """
     expected_output = {
         "unique_id": "test-uid",
+        "resource_version": "4711",
         "event_type": "UNKNOWN",
         "primary_endpoint": "s3://primary-bucket/",
         "secondary_endpoint": "s3://secondary-bucket/",
@@ -88,6 +90,7 @@ status:
 """
     expected_output = {
         "unique_id": "test-uid",
+        "resource_version": None,
         "event_type": "UNKNOWN",
         "primary_endpoint": None,
         "secondary_endpoint": None,
@@ -116,6 +119,7 @@ status:
 """
     expected_output = {
         "unique_id": "test-uid",
+        "resource_version": None,
         "event_type": "UNKNOWN",
         "primary_endpoint": "s3://primary-bucket/",
         "secondary_endpoint": None,
@@ -144,6 +148,7 @@ status:
 """
     expected_output = {
         "unique_id": "test-uid",
+        "resource_version": None,
         "event_type": "UNKNOWN",
         "primary_endpoint": None,
         "secondary_endpoint": "s3://secondary-bucket/",
@@ -170,6 +175,7 @@ status:
 """
     expected_output = {
         "unique_id": None,
+        "resource_version": None,
         "event_type": "UNKNOWN",
         "primary_endpoint": None,
         "secondary_endpoint": None,
@@ -196,6 +202,7 @@ spec:
 """
     expected_output = {
         "unique_id": "test-uid",
+        "resource_version": None,
         "event_type": "UNKNOWN",
         "primary_endpoint": None,
         "secondary_endpoint": None,
@@ -225,6 +232,7 @@ def test_parse_argo_workflow_handles_json_input():
 
     expected_output = {
         "unique_id": "test-uid",
+        "resource_version": None,
         "event_type": "UNKNOWN",
         "primary_endpoint": None,
         "secondary_endpoint": None,
@@ -1,7 +1,12 @@
+import dataclasses
 import pytest
+import threading
 import time
-from unittest.mock import MagicMock, patch
-from swagger_server.managers.cachemanager import CacheManager
+from unittest.mock import ANY, MagicMock, patch
+from swagger_server.managers.cachemanager import CacheManager, ENTRY_COLLECTION, ENTRY_PROJECTION
+from swagger_server.managers.stagingcontext import StagingContext
+from swagger_server.managers.transferjobmanager import TransferQueueFull
+from swagger_server.managers.transfertuner import TransferTuner
 
 
 @pytest.fixture
@@ -12,6 +17,7 @@ def mock_rclone_manager():
     mock.get_remote_used_storage.return_value = (True, 5000)
     mock.get_files_to_transfer.return_value = ["file1.txt", "file2.csv"]
     mock.delete_file.return_value = True
+    mock.copy_files_batch.return_value = (True, {"copied": [], "unchanged": [], "failed": {}})
 
     def mock_list_files(remote, folder=""):
         if folder:
@@ -23,21 +29,63 @@ def mock_rclone_manager():
         ]
 
     mock.list_files.side_effect = mock_list_files
+    mock.get_file_sizes.side_effect = lambda endpoint, files: {file: 400 for file in files}
 
     return mock
 
 
 @pytest.fixture
-def mock_mongo_db_manager():
+def mock_entries():
+    """Creates a mocked per-file cache entry collection holding 'file1.txt'."""
+    entries = {"file1.txt": {"_id": "e1", "file_name": "file1.txt", "size": 400, "last_access_time": time.time()}}
+    mock = MagicMock()
+
+    def mock_find_one(query, projection=None):
+        return entries.get(query.get("file_name"))
+
+    def mock_find(query, projection=None):
+        names = query.get("file_name", {})
+        matches = [e for name, e in entries.items()
+                   if name != names.get("$ne") and ("$in" not in names or name in names["$in"])]
+        cursor = MagicMock()
+        cursor.__iter__.side_effect = lambda: iter(matches)
+        cursor.sort.return_value = matches
+        return cursor
+
+    def mock_find_one_and_delete(query, projection=None):
+        entry = entries.get(query.get("file_name"))
+        if entry is None or ("pins.0" in query and entry.get("pins")):
+            return None
+        return entries.pop(query["file_name"])
+
+    def mock_delete_many(query):
+        deleted = [name for name in query["file_name"]["$in"]
+                   if name in entries and not ("pins.0" in query and entries[name].get("pins"))]
+        for name in deleted:
+            entries.pop(name)
+        return MagicMock(deleted_count=len(deleted))
+
+    mock.find_one.side_effect = mock_find_one
+    mock.find.side_effect = mock_find
+    mock.find_one_and_delete.side_effect = mock_find_one_and_delete
+    mock.delete_many.side_effect = mock_delete_many
+    return mock
+
+
+@pytest.fixture
+def mock_mongo_db_manager(mock_entries):
     """Creates a fully mocked MongoDBManager instance."""
     mock = MagicMock()
     mock.collection = MagicMock()  # Ensure 'collection' exists
+    other_collections = {}
+    mock.get_collection.side_effect = lambda name: (
+        mock_entries if name == ENTRY_COLLECTION else other_collections.setdefault(name, MagicMock())
+    )
 
     mock.collection.find_one.return_value = {
         "_id": "LRUCache",
         "capacity_bytes": 10000,
-        "current_bytes": 3000,
-        "files": [{"file_name": "file1.txt", "size": 400, "last_access_time": time.time()}]
+        "current_bytes": 3000
     }
     mock.collection.update_one.return_value = None
     return mock
@@ -60,55 +108,493 @@ def cache_manager(mock_rclone_manager, mock_mongo_db_manager):
                 cm.mongoDB_manager = mock_mongo_db_manager
                 cm.collection = mock_mongo_db_manager.collection
 
-                cm.set_primary_endpoint("test_primary/")
-                cm.set_secondary_endpoint("test_secondary/")
-                cm.set_files(["file1.txt", "file2.csv"])
-                cm.set_primary_folder("test_primary_folder")
-                cm.set_secondary_folder("test_secondary_folder")
-
                 return cm
 
 
-def test_cache_manager_initialization(cache_manager):
-    """Tests if CacheManager initializes correctly."""
-    assert cache_manager.primary_endpoint == "test_primary/"
-    assert cache_manager.secondary_endpoint == "test_secondary/"
-    assert isinstance(cache_manager.files, list)
-    assert "file1.txt" in cache_manager.files
+@pytest.fixture
+def staging_context():
+    """Provides the staging context of a workflow event requesting two files."""
+    return StagingContext("test_primary/", "test_primary_folder", "test_secondary/", "test_secondary_folder",
+                          ["file1.txt", "file2.csv"])
+
+
+def test_staging_context_is_immutable(staging_context):
+    """Tests that a staging context copies its files and cannot be changed."""
+    assert staging_context.files == ("file1.txt", "file2.csv")
+    assert staging_context.primary_path == "test_primary/test_primary_folder"
+    assert staging_context.secondary_path == "test_secondary/test_secondary_folder"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        staging_context.files = ("other.csv",)
 
 
-def test_start_process(cache_manager):
+def test_start_process(cache_manager, staging_context):
     """Tests the start process including file transfer handling."""
-    cache_manager.start()
+    cache_manager.start(staging_context)
+
+    cache_manager.rclone_manager.get_files_to_transfer.assert_called_once_with(
+        "test_primary/test_primary_folder", ["file1.txt", "file2.csv"], compare_with=None, compare_modtime=False
+    )
+    cache_manager.rclone_manager.get_file_sizes.assert_called_once_with(
+        "test_secondary/test_secondary_folder", ["file1.txt", "file2.csv"]
+    )
+    cache_manager.rclone_manager.list_files.assert_not_called()
+
 
-    cache_manager.rclone_manager.get_files_to_transfer.assert_called_once_with("test_primary/test_primary_folder",
-                                                                               ["file1.txt", "file2.csv"])
-    cache_manager.rclone_manager.list_files.assert_any_call("test_secondary/test_secondary_folder", "file1.txt")
+def test_start_verifies_transfers_against_secondary(cache_manager, staging_context):
+    """Tests that verify_transfers compares the primary copies with the secondary folder."""
+    cache_manager.cache_settings = {"verify_transfers": True, "verify_modtime": True}
+    cache_manager.start(staging_context)
+
+    cache_manager.rclone_manager.get_files_to_transfer.assert_called_once_with(
+        "test_primary/test_primary_folder", ["file1.txt", "file2.csv"],
+        compare_with="test_secondary/test_secondary_folder", compare_modtime=True
+    )
 
 
 def test_add_file(cache_manager):
     """Tests adding a file to the cache."""
     cache_manager.add_file("file3.json", 500)
-    cache_manager.mongoDB_manager.collection.update_one.assert_called()
+
+    cache_manager.entries.update_one.assert_called_once()
+    query, update = cache_manager.entries.update_one.call_args[0]
+    assert query == {"cache_id": "LRUCache", "file_name": "file3.json"}
+    assert update["$set"]["size"] == 500
+    cache_manager.mongoDB_manager.collection.update_one.assert_any_call(
+        {"_id": "LRUCache"}, {"$inc": {"current_bytes": 500}}
+    )
+    cache_manager.entries.delete_many.assert_not_called()
+
+
+def test_add_file_evicts_least_recently_used(cache_manager):
+    """Tests that adding a file beyond capacity evicts the oldest entries through the sorted index."""
+    callback = MagicMock()
+    cache_manager.eviction_callback = callback
+
+    assert cache_manager.add_file("big_file.csv", 7400)
+
+    cache_manager.entries.find.assert_called_with(
+        {"cache_id": "LRUCache", "pins.0": {"$exists": False}, "file_name": {"$ne": "big_file.csv"}},
+        ENTRY_PROJECTION
+    )
+    cache_manager.entries.delete_many.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": {"$in": ["file1.txt"]}, "pins.0": {"$exists": False}}
+    )
+    cache_manager.mongoDB_manager.collection.update_one.assert_any_call(
+        {"_id": "LRUCache"}, {"$inc": {"current_bytes": -400}, "$set": {"policy_state": {}}}
+    )
+    callback.assert_called_once_with("file1.txt", 400)
+
+
+def test_victim_pinned_after_selection_is_kept(cache_manager, mock_entries):
+    """Tests that a victim pinned by another request in the meantime is neither deleted nor accounted."""
+    victim = dict(mock_entries.find_one({"file_name": "file1.txt"}))
+    mock_entries.find_one({"file_name": "file1.txt"})["pins"] = [{"uid": "uid-2", "pinned_at": 0}]
+
+    cache_manager.mongoDB_manager.collection.update_one.reset_mock()
+    cache_manager._evict_entries([victim])
+
+    assert mock_entries.find_one({"file_name": "file1.txt"}) is not None
+    cache_manager.mongoDB_manager.collection.update_one.assert_not_called()
+
+
+def test_add_file_too_large(cache_manager):
+    """Tests that files larger than the cache capacity are not admitted."""
+    assert not cache_manager.add_file("huge_file.csv", 20000)
+    cache_manager.entries.update_one.assert_not_called()
+
+
+def test_add_file_rejected_when_unpinned_space_insufficient(cache_manager):
+    """Tests that nothing is evicted or written when unpinned entries cannot free enough space."""
+    assert not cache_manager.add_file("big_file.csv", 7500)
+
+    cache_manager.entries.update_one.assert_not_called()
+    cache_manager.entries.delete_many.assert_not_called()
+
+
+def test_add_file_with_pin(cache_manager):
+    """Tests that a file added for a workflow is pinned for that workflow."""
+    cache_manager.add_file("file3.json", 500, pin_uid="uid-1")
+
+    cache_manager.entries.update_many.assert_called_once()
+    query, update = cache_manager.entries.update_many.call_args[0]
+    assert query == {"cache_id": "LRUCache", "file_name": {"$in": ["file3.json"]}, "pins.uid": {"$ne": "uid-1"}}
+    assert update["$push"]["pins"]["uid"] == "uid-1"
+
+
+def test_start_pins_requested_files(cache_manager, staging_context):
+    """Tests that staging for a workflow pins its cached files before adding new ones."""
+    cache_manager.start(dataclasses.replace(staging_context, workflow_uid="uid-1"))
+
+    pinned = [c[0][0]["file_name"]["$in"] for c in cache_manager.entries.update_many.call_args_list
+              if "$push" in c[0][1]]
+    assert pinned == [["file1.txt", "file2.csv"], ["file2.csv"]]
+
+
+def test_release_pins(cache_manager):
+    """Tests releasing the pins of a workflow."""
+    cache_manager.release_pins("uid-1")
+
+    cache_manager.entries.update_many.assert_called_once_with(
+        {"cache_id": "LRUCache", "pins.uid": "uid-1"}, {"$pull": {"pins": {"uid": "uid-1"}}}
+    )
+
+
+def test_release_stale_pins(cache_manager):
+    """Tests that pins older than the timeout are released, at most once per minute."""
+    cache_manager.pin_timeout = 100
+
+    cache_manager.release_stale_pins()
+    cache_manager.release_stale_pins()
+
+    cache_manager.entries.update_many.assert_called_once()
+    query, update = cache_manager.entries.update_many.call_args[0]
+    assert query["pins.pinned_at"]["$lt"] == pytest.approx(time.time() - 100, abs=5)
+    assert update == {"$pull": {"pins": {"pinned_at": {"$lt": query["pins.pinned_at"]["$lt"]}}}}
+
+
+def test_refresh_pins_renews_running_workflow(cache_manager):
+    """Tests that the pins of a workflow are renewed on its events, at most once per minute."""
+    cache_manager.refresh_pins("uid-1")
+    cache_manager.refresh_pins("uid-1")
+
+    cache_manager.entries.update_many.assert_called_once()
+    query, update = cache_manager.entries.update_many.call_args[0]
+    assert query == {"cache_id": "LRUCache", "pins.uid": "uid-1"}
+    assert update["$set"]["pins.$.pinned_at"] == pytest.approx(time.time(), abs=5)
+
+    # Once released, the next run of the workflow renews its pins again
+    cache_manager.release_pins("uid-1")
+    cache_manager.refresh_pins("uid-1")
+    assert cache_manager.entries.update_many.call_count == 3
 
 
 def test_get_file(cache_manager):
     """Tests retrieving a file from the cache."""
     result = cache_manager.get_file("file1.txt")
-    assert result is not None
-    assert result[0] == "file1.txt"
+    assert result == ("file1.txt", 400)
+
+    # The touch is buffered instead of written immediately
+    cache_manager.entries.update_one.assert_not_called()
+    assert "file1.txt" in cache_manager._pending_touches
+
+
+def test_get_files_single_lookup(cache_manager):
+    """Tests that a batch lookup uses one query and buffers a touch per cached file."""
+    cached = cache_manager.get_files(["file1.txt", "file2.csv"])
+
+    assert cached == {"file1.txt": 400}
+    cache_manager.entries.find.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": {"$in": ["file1.txt", "file2.csv"]}}, ENTRY_PROJECTION
+    )
+    assert list(cache_manager._pending_touches) == ["file1.txt"]
+
+
+def test_flush_access_log(cache_manager):
+    """Tests that buffered touches are coalesced into one bulk write."""
+    cache_manager.record_access("file1.txt", 10.0)
+    cache_manager.record_access("file1.txt", 20.0)
+    cache_manager.record_access("file2.csv", 15.0)
+
+    cache_manager.flush_access_log()
+
+    requests = cache_manager.entries.bulk_write.call_args[0][0]
+    assert [r._doc for r in requests] == [
+        {"$set": {"priority": 20.0}, "$inc": {"hits": 2}, "$max": {"last_access_time": 20.0}},
+        {"$set": {"priority": 15.0}, "$inc": {"hits": 1}, "$max": {"last_access_time": 15.0}},
+    ]
+    assert cache_manager._pending_touches == {}
+
+    cache_manager.flush_access_log()
+    cache_manager.entries.bulk_write.assert_called_once()
+
+
+def test_start_flushes_touches_once(cache_manager, staging_context):
+    """Tests that a full staging pass writes its touches with a single bulk write."""
+    cache_manager.start(staging_context)
+
+    # Only the newly admitted file is written individually; the touch of file1.txt is batched
+    updated = [c[0][0]["file_name"] for c in cache_manager.entries.update_one.call_args_list]
+    assert updated == ["file2.csv"]
+    cache_manager.entries.bulk_write.assert_called_once()
+    assert cache_manager._pending_touches == {}
 
 
 def test_evict_file(cache_manager):
-    """Tests evicting a file from the cache."""
+    """Tests evicting a file from the cache, which leaves the state of the eviction policy alone."""
+    cache_manager.eviction_policy = MagicMock()
     cache_manager.evict_file("file1.txt")
-    cache_manager.mongoDB_manager.collection.update_one.assert_called()
+
+    cache_manager.eviction_policy.on_evict.assert_not_called()
+
+    cache_manager.entries.find_one_and_delete.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": "file1.txt"}
+    )
+    cache_manager.mongoDB_manager.collection.update_one.assert_any_call(
+        {"_id": "LRUCache"}, {"$inc": {"current_bytes": -400}}
+    )
+
+
+def test_start_skips_files_missing_on_secondary(cache_manager, staging_context):
+    """Tests that only files found in the secondary listing are admitted and copied."""
+    cache_manager.rclone_manager.get_file_sizes.side_effect = lambda endpoint, files: {"file2.csv": 500}
+    cache_manager.start(staging_context)
+
+    assert cache_manager.rclone_manager.copy_files_batch.call_args.kwargs["files"] == ["file2.csv"]
+
+
+def test_start_deletes_evicted_files(cache_manager, staging_context):
+    """Tests that files evicted while admitting new files are deleted from the primary folder."""
+    cache_manager.rclone_manager.get_file_sizes.side_effect = lambda endpoint, files: {file: 7400 for file in files}
+    cache_manager.start(staging_context)
+
+    cache_manager.rclone_manager.delete_file.assert_called_once_with("test_primary/test_primary_folder", "file1.txt")
+    cache_manager.rclone_manager.copy_files_batch.assert_called_once_with(
+        source="test_secondary/test_secondary_folder",
+        destination="test_primary/test_primary_folder",
+        files=["file1.txt", "file2.csv"],
+        parallel_files=2,
+        checkers=32,
+        options={},
+        file_done=ANY
+    )
+
+
+def test_start_deletes_victims_from_their_own_folder(cache_manager, staging_context, mock_entries):
+    """Tests that a victim staged by another workflow is deleted from the folder it was staged into."""
+    mock_entries.find_one({"file_name": "file1.txt"})["location"] = "other_primary/other_folder"
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.rclone_manager.get_file_sizes.side_effect = lambda endpoint, files: {file: 7400 for file in files}
+    cache_manager.start(staging_context)
+
+    cache_manager.rclone_manager.delete_file.assert_called_once_with("other_primary/other_folder", "file1.txt")
+    assert cache_manager.entries.update_one.call_args_list[0][0][1]["$set"]["location"] == \
+        "test_primary/test_primary_folder"
+
+
+def test_start_deletes_only_its_own_victims(cache_manager, staging_context):
+    """Tests that files evicted outside of a pass are not deleted by the next pass."""
+    cache_manager.add_file("big_file.csv", 7400)
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = []
+    cache_manager.start(staging_context)
+
+    cache_manager.rclone_manager.delete_file.assert_not_called()
+
+
+def test_start_copies_only_admitted_files(cache_manager, staging_context):
+    """Tests that Step 3 copies the requested files instead of every cached file."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.start(staging_context)
+
+    cache_manager.rclone_manager.delete_file.assert_not_called()
+    cache_manager.rclone_manager.copy_files_batch.assert_called_once_with(
+        source="test_secondary/test_secondary_folder",
+        destination="test_primary/test_primary_folder",
+        files=["file2.csv"],
+        parallel_files=1,
+        checkers=32,
+        options={},
+        file_done=ANY
+    )
+
+
+def test_start_evicts_files_that_failed_to_copy(cache_manager, staging_context):
+    """Tests that a file whose copy failed is removed from the cache index again."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.rclone_manager.copy_files_batch.return_value = (
+        False, {"copied": [], "unchanged": [], "failed": {"file2.csv": "object not found"}}
+    )
+    cache_manager.start(staging_context)
+
+    cache_manager.entries.find_one_and_delete.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": "file2.csv"}
+    )
+
+
+def test_start_submits_transfer_job(cache_manager, staging_context):
+    """Tests that Step 3 is queued as a transfer job whose completion evicts failed copies."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.transfer_job_manager = MagicMock()
+
+    job = cache_manager.start(staging_context)
+
+    assert job is cache_manager.transfer_job_manager.submit.return_value
+    cache_manager.rclone_manager.copy_files_batch.assert_not_called()
+    submit = cache_manager.transfer_job_manager.submit.call_args
+    assert submit.args == ("copy", "test_secondary/test_secondary_folder", "test_primary/test_primary_folder")
+    assert [batch["files"] for batch in submit.kwargs["batches"]] == [["file2.csv"]]
+
+    submit.kwargs["on_done"](MagicMock(results={"failed": {"file2.csv": "object not found"}}))
+    cache_manager.entries.find_one_and_delete.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": "file2.csv"}
+    )
 
 
-def test_remove_old_files(cache_manager):
-    """Tests removing files present in primary storage but not in the cache."""
-    cache_manager.start()
-    cache_manager.rclone_manager.delete_file.assert_called_with("test_primary/", "old_file.json")
+def test_finished_job_evicts_files_it_never_copied(cache_manager, staging_context):
+    """Tests that files a transfer job never got to (e.g. it was cancelled) leave the cache index."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.transfer_job_manager = MagicMock()
+    cache_manager.start(staging_context)
+
+    on_done = cache_manager.transfer_job_manager.submit.call_args.kwargs["on_done"]
+    on_done(MagicMock(results={"copied": [], "unchanged": [], "failed": {}}))
+
+    cache_manager.entries.find_one_and_delete.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": "file2.csv"}
+    )
+
+
+def test_full_transfer_queue_rolls_back_admitted_files(cache_manager, staging_context):
+    """Tests that files admitted for a copy that cannot be queued are removed from the index again."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.transfer_job_manager = MagicMock()
+    cache_manager.transfer_job_manager.submit.side_effect = TransferQueueFull("100 transfer jobs are queued")
+
+    with pytest.raises(TransferQueueFull):
+        cache_manager.start(dataclasses.replace(staging_context, workflow_uid="uid-1"))
+
+    cache_manager.entries.find_one_and_delete.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": "file2.csv"}
+    )
+
+
+def test_concurrent_passes_keep_their_own_context(cache_manager, staging_context):
+    """Tests that passes for different workflows running at the same time copy between their own folders."""
+    cache_manager.rclone_manager.get_files_to_transfer.side_effect = lambda primary, files, **kwargs: list(files)
+    cache_manager.transfer_job_manager = MagicMock()
+    other = StagingContext("other_primary/", "in", "other_secondary/", "in", ["other.csv"], "uid-2")
+
+    threads = [threading.Thread(target=cache_manager.start, args=(context,))
+               for context in (staging_context, other) * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    copies = {(c.args[1], c.args[2], tuple(c.kwargs["batches"][0]["files"]))
+              for c in cache_manager.transfer_job_manager.submit.call_args_list}
+    assert ("other_secondary/in", "other_primary/in", ("other.csv",)) in copies
+    assert all(source.startswith("other_") == ("other.csv" in files) for source, _, files in copies)
+
+
+def test_start_splits_mixed_sizes_into_tuned_batches(cache_manager, staging_context):
+    """Tests that small and large files are copied in separate batches with their own settings."""
+    cache_manager.rclone_manager.get_file_sizes.side_effect = lambda endpoint, files: {"file1.txt": 400, "file2.csv": 500}
+    cache_manager.transfer_tuner = TransferTuner(large_file_threshold=450)
+    cache_manager.start(staging_context)
+
+    batches = [c.kwargs for c in cache_manager.rclone_manager.copy_files_batch.call_args_list]
+    assert [batch["files"] for batch in batches] == [["file1.txt"], ["file2.csv"]]
+    assert batches[0]["options"] == {}
+    assert batches[1]["options"]["multi_thread_streams"] == 8
+
+
+def test_start_without_tuning_uses_configured_transfers(cache_manager, staging_context):
+    """Tests that disabling tuning copies all files in one batch with the configured settings."""
+    cache_manager.cache_settings = {"transfers": 6, "checkers": 12}
+    cache_manager.transfer_tuner = None
+    cache_manager.start(staging_context)
+
+    cache_manager.rclone_manager.copy_files_batch.assert_called_once_with(
+        source="test_secondary/test_secondary_folder",
+        destination="test_primary/test_primary_folder",
+        files=["file1.txt", "file2.csv"],
+        parallel_files=6,
+        checkers=12,
+        options={},
+        file_done=ANY
+    )
+
+
+def test_start_marks_files_ready_as_they_arrive(cache_manager, staging_context):
+    """Tests that admitted files are staging until the copy reports them, one by one."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+
+    def copy(**kwargs):
+        ready_updates = [c for c in cache_manager.entries.update_many.call_args_list
+                         if c.args[1] == {"$set": {"ready": True}}]
+        assert not ready_updates
+        kwargs["file_done"]("file2.csv", None)
+        return True, {"copied": ["file2.csv"], "unchanged": [], "failed": {}}
+
+    cache_manager.rclone_manager.copy_files_batch.side_effect = copy
+    cache_manager.start(staging_context)
+
+    added = next(c for c in cache_manager.entries.update_one.call_args_list if c.args[0].get("file_name") == "file2.csv")
+    assert added.args[1]["$set"]["ready"] is False
+    cache_manager.entries.update_many.assert_any_call(
+        {"cache_id": "LRUCache", "file_name": {"$in": ["file2.csv"]}}, {"$set": {"ready": True}}
+    )
+
+
+def test_start_copies_in_workflow_order_windows(cache_manager, staging_context):
+    """Tests that the files are copied in windows that follow the order of the event."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["c.csv", "a.csv", "b.csv"]
+    cache_manager.cache_settings = {"pipeline_window": 2}
+    cache_manager.set_capacity_bytes(10 ** 9)
+    cache_manager.start(dataclasses.replace(staging_context, files=["c.csv", "a.csv", "b.csv"]))
+
+    windows = [c.kwargs["files"] for c in cache_manager.rclone_manager.copy_files_batch.call_args_list]
+    assert windows == [["c.csv", "a.csv"], ["b.csv"]]
+
+
+def test_start_registers_files_and_notifies_waiters(cache_manager, staging_context):
+    """Tests that the workflow's files are registered for waiters, who are woken when a file arrives."""
+    cache_manager.readiness_tracker = MagicMock()
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.rclone_manager.copy_files_batch.side_effect = lambda **kwargs: (
+        kwargs["file_done"]("file2.csv", None), (True, {"copied": ["file2.csv"], "unchanged": [], "failed": {}}))[1]
+    cache_manager.start(dataclasses.replace(staging_context, workflow_uid="uid-1"))
+
+    cache_manager.readiness_tracker.register.assert_called_once_with("uid-1", ["file1.txt", "file2.csv"])
+    cache_manager.readiness_tracker.notify.assert_called()
+
+
+def test_get_readiness(cache_manager):
+    """Tests that files are ready, staging or missing, with entries without the field counting as ready."""
+    cache_manager.entries.find.side_effect = lambda query, projection=None: iter([
+        {"file_name": "file1.txt"}, {"file_name": "file2.csv", "ready": False}
+    ])
+
+    readiness = cache_manager.get_readiness(["file1.txt", "file2.csv", "file3.csv"])
+
+    assert readiness == {"file1.txt": "ready", "file2.csv": "staging", "file3.csv": "missing"}
+
+
+def test_sync_cache_with_explicit_folder(cache_manager):
+    """Tests reconciling a given primary folder: untracked files are added and the usage is measured."""
+    cache_manager.sync_cache("other_primary/", "other_folder")
+
+    cache_manager.rclone_manager.list_files.assert_any_call("other_primary/other_folder")
+    upserted = [c.args[0]["file_name"] for c in cache_manager.entries.update_one.call_args_list]
+    assert "/file2.csv" in upserted and "/old_file.json" in upserted
+
+
+def test_sync_cache_keeps_entries_that_are_still_being_copied(cache_manager, mock_entries):
+    """Tests that only ready, unpinned and not recently added entries missing on the remote are evicted."""
+    cache_manager.rclone_manager.list_files.side_effect = lambda remote, folder="": (True, [])
+
+    cache_manager.sync_cache("test_primary/", "folder")
+
+    query = cache_manager.entries.find_one_and_delete.call_args[0][0]
+    assert query["file_name"] == "file1.txt"
+    assert query["ready"] == {"$ne": False}
+    assert query["pins.0"] == {"$exists": False}
+    assert query["inserted_at"]["$not"]["$gt"] == pytest.approx(time.time() - 60, abs=5)
+
+
+def test_sync_cache_corrects_usage_with_increment(cache_manager):
+    """Tests that drift of the recorded usage is corrected with $inc instead of overwriting it."""
+    cache_manager.rclone_manager.list_files.side_effect = lambda remote, folder="": (
+        True, [{"file_name": "file1.txt", "size": 400}])
+    cache_manager.entries.aggregate.return_value = iter([{"_id": None, "bytes": 2500}])
+
+    cache_manager.sync_cache("test_primary/", "folder")
+
+    cache_manager.mongoDB_manager.collection.update_one.assert_any_call(
+        {"_id": "LRUCache"}, {"$inc": {"current_bytes": -500}}
+    )
+    assert all("$set" not in c.args[1] or "current_bytes" not in c.args[1]["$set"]
+               for c in cache_manager.mongoDB_manager.collection.update_one.call_args_list)
 
 
 def test_set_capacity_bytes(cache_manager):
@@ -160,11 +646,183 @@ def test_set_current_bytes_no_cache_doc(cache_manager):
 def test_evict_nonexistent_file(cache_manager):
     """Tests that evicting a file not in cache does nothing."""
     cache_manager.evict_file("missing_file.txt")
-    state = cache_manager._load_state()
-    assert "missing_file.txt" not in [f["file_name"] for f in state["files"]]
+    assert "missing_file.txt" not in cache_manager.get_cached_file_names()
+    assert all("$inc" not in c[0][1] for c in cache_manager.mongoDB_manager.collection.update_one.call_args_list)
 
 
 def test_get_missing_file(cache_manager):
     """Tests retrieving a file that doesn't exist in cache."""
     result = cache_manager.get_file("nonexistent_file.txt")
     assert result is None
+
+
+def test_add_file_uses_configured_policy(cache_manager):
+    """Tests that new entries get their priority from the selected eviction policy."""
+    cache_manager._load_eviction_policy("lfu", {"policy": "lfu", "policy_state": {"clock": 5.0}})
+
+    cache_manager.add_file("file3.json", 500)
+
+    update = cache_manager.entries.update_one.call_args[0][1]
+    assert update["$set"]["priority"] == 6.0
+    assert update["$set"]["hits"] == 1
+
+
+def test_policy_change_reprioritizes_entries(cache_manager):
+    """Tests that switching the eviction policy recomputes stored priorities once."""
+    cache_manager._load_eviction_policy("2q", {"policy": "lru"})
+
+    requests = cache_manager.entries.bulk_write.call_args[0][0]
+    assert requests[0]._doc["$set"]["segment"] == "am"
+    cache_manager.mongoDB_manager.collection.update_one.assert_called_with(
+        {"_id": "LRUCache"}, {"$set": {"policy": "2q", "policy_state": {"ghosts": []}}}
+    )
+
+
+def test_start_records_byte_hit_stats(cache_manager, staging_context):
+    """Tests that a staging pass records hits and misses in bytes."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+
+    cache_manager.start(staging_context)
+
+    cache_manager.mongoDB_manager.collection.update_one.assert_any_call({"_id": "LRUCache"}, {"$inc": {
+        "stats.hits": 1, "stats.hit_bytes": 400, "stats.misses": 1, "stats.miss_bytes": 400
+    }})
+
+
+def test_add_speculative_file(cache_manager):
+    """Tests that prefetched files are marked speculative and sorted before every other entry."""
+    assert cache_manager.add_file("companion.csv", 500, speculative=True)
+
+    fields = cache_manager.entries.update_one.call_args[0][1]["$set"]
+    assert fields["speculative"] is True
+    assert fields["priority"] < 0
+
+
+def test_add_speculative_file_never_evicts(cache_manager):
+    """Tests that speculative files only use spare capacity."""
+    assert not cache_manager.add_file("companion.csv", 7400, speculative=True)
+
+    cache_manager.entries.update_one.assert_not_called()
+    cache_manager.entries.delete_many.assert_not_called()
+
+
+def test_flush_counts_prefetch_hits(cache_manager):
+    """Tests that requesting a prefetched file promotes it and counts a prefetch hit."""
+    cache_manager.record_access("companion.csv", 10.0, {"file_name": "companion.csv", "size": 300,
+                                                        "speculative": True})
+    cache_manager.flush_access_log()
+
+    update = cache_manager.entries.bulk_write.call_args[0][0][0]._doc
+    assert update["$set"]["speculative"] is False
+    cache_manager.mongoDB_manager.collection.update_one.assert_called_with(
+        {"_id": "LRUCache"}, {"$inc": {"stats.prefetch_hits": 1, "stats.prefetch_hit_bytes": 300}}
+    )
+
+
+def test_prefetch_companions(cache_manager, staging_context):
+    """Tests that predicted companions are staged speculatively and accounted."""
+    cache_manager.prefetch_manager = MagicMock()
+    cache_manager.prefetch_manager.predict.return_value = ["file1.txt", "/companion.csv"]
+
+    cache_manager._prefetch_companions(staging_context)
+
+    cache_manager.prefetch_manager.record_file_set.assert_called_once_with(None, ["file1.txt", "file2.csv"])
+    # file1.txt is already cached, so only the companion is listed and added
+    cache_manager.rclone_manager.get_file_sizes.assert_called_once_with(
+        "test_secondary/test_secondary_folder", ["/companion.csv"]
+    )
+    cache_manager.rclone_manager.list_files.assert_not_called()
+    assert cache_manager.entries.update_one.call_args[0][1]["$set"]["speculative"] is True
+    cache_manager.mongoDB_manager.collection.update_one.assert_called_with(
+        {"_id": "LRUCache"}, {"$inc": {"stats.prefetch_staged": 1, "stats.prefetch_staged_bytes": 400}}
+    )
+
+
+def test_prefetch_companions_lists_candidates_once(cache_manager, staging_context):
+    """Tests that the sizes of all candidates come from one listing and absent candidates are skipped."""
+    cache_manager.prefetch_manager = MagicMock()
+    cache_manager.prefetch_manager.predict.return_value = ["/a.csv", "/b.csv", "/gone.csv"]
+    cache_manager.rclone_manager.get_file_sizes.side_effect = lambda endpoint, files: {"/a.csv": 100, "/b.csv": 200}
+
+    assert cache_manager._prefetch_companions(staging_context) == ["/a.csv", "/b.csv"]
+
+    cache_manager.rclone_manager.get_file_sizes.assert_called_once()
+    cache_manager.mongoDB_manager.collection.update_one.assert_called_with(
+        {"_id": "LRUCache"}, {"$inc": {"stats.prefetch_staged": 2, "stats.prefetch_staged_bytes": 300}}
+    )
+
+
+def test_prefetch_candidates_are_not_counted_as_accesses(cache_manager, staging_context):
+    """Tests that cached candidates are looked up once and not touched, so they stay speculative."""
+    cache_manager.prefetch_manager = MagicMock()
+    cache_manager.prefetch_manager.predict.return_value = ["file1.txt", "/a.csv", "/b.csv"]
+
+    cache_manager._prefetch_companions(staging_context)
+
+    cache_manager.entries.find.assert_called_once_with(
+        {"cache_id": "LRUCache", "file_name": {"$in": ["file1.txt", "/a.csv", "/b.csv"]}},
+        {"file_name": 1, "size": 1}
+    )
+    assert cache_manager._pending_touches == {}
+
+
+def test_start_lists_companions_after_copying_requested_files(cache_manager, staging_context):
+    """Tests that companion files are listed and copied only after the requested files were submitted."""
+    cache_manager.rclone_manager.get_files_to_transfer.return_value = ["file2.csv"]
+    cache_manager.prefetch_manager = MagicMock()
+    cache_manager.prefetch_manager.predict.return_value = ["/companion.csv"]
+    cache_manager.transfer_job_manager = MagicMock()
+    calls = []
+    cache_manager.transfer_job_manager.submit.side_effect = lambda *args, **kwargs: (calls.append(
+        [file for batch in kwargs["batches"] for file in batch["files"]]), MagicMock())[1]
+    sizes = cache_manager.rclone_manager.get_file_sizes.side_effect
+    cache_manager.rclone_manager.get_file_sizes.side_effect = lambda endpoint, files: (
+        calls.append(list(files)), sizes(endpoint, files))[1]
+
+    cache_manager.start(staging_context)
+
+    assert calls == [["file2.csv"], ["file2.csv"], ["/companion.csv"], ["/companion.csv"]]
+
+
+def test_add_file_rejected_by_admission_filter(cache_manager):
+    """Tests that a file less popular than its victims stays on the secondary endpoint."""
+    cache_manager.admission_filter.record(["file1.txt", "file1.txt"])
+
+    assert not cache_manager.add_file("big_file.csv", 7400)
+
+    cache_manager.entries.update_one.assert_not_called()
+    cache_manager.entries.delete_many.assert_not_called()
+    cache_manager.mongoDB_manager.collection.update_one.assert_called_with({"_id": "LRUCache"}, {"$inc": {
+        "stats.admission_rejected": 1, "stats.admission_rejected_bytes": 7400
+    }})
+
+
+def test_start_records_requests_and_saves_sketch(cache_manager, staging_context):
+    """Tests that staging counts the requested files and persists the sketch."""
+    cache_manager._last_admission_save = 0
+
+    cache_manager.start(staging_context)
+
+    assert cache_manager.admission_filter.sketch.estimate("file2.csv") == 1
+    cache_manager.mongoDB_manager.collection.update_one.assert_any_call(
+        {"_id": "LRUCache"}, {"$set": {"admission_sketch": cache_manager.admission_filter.get_state()}}
+    )
+
+
+def test_migrate_legacy_state(cache_manager):
+    """Tests that the old single-document 'files' array is moved into per-file entries."""
+    cache_manager.mongoDB_manager.collection.find_one.return_value = {
+        "_id": "LRUCache",
+        "files": [
+            {"file_name": "file1.txt", "size": 400, "last_access_time": 1.0},
+            {"file_name": "file2.csv", "size": 500, "last_access_time": 2.0},
+        ]
+    }
+
+    cache_manager._migrate_legacy_state()
+
+    requests = cache_manager.entries.bulk_write.call_args[0][0]
+    assert len(requests) == 2
+    cache_manager.mongoDB_manager.collection.update_one.assert_called_with(
+        {"_id": "LRUCache"}, {"$unset": {"files": ""}}
+    )
@@ -0,0 +1,59 @@
+import pytest
+import threading
+from unittest.mock import MagicMock
+from swagger_server.managers.cachereconciler import CacheReconciler
+
+
+@pytest.fixture
+def reconciler():
+    """Provides a CacheReconciler with a mocked CacheManager and no running thread."""
+    return CacheReconciler(MagicMock(), interval=60)
+
+
+def test_register_triggers_once(reconciler):
+    """Tests that a new primary folder is registered once and triggers a round."""
+    assert reconciler.register("primary:", "folder")
+    assert reconciler._wakeup.is_set()
+
+    reconciler._wakeup.clear()
+    assert not reconciler.register("primary:", "folder")
+    assert not reconciler._wakeup.is_set()
+
+
+def test_reconcile_all(reconciler):
+    """Tests that every registered folder is synced and its reconciliation time recorded."""
+    reconciler.register("primary:", "a")
+    reconciler.register("primary:", "b")
+
+    reconciler.reconcile_all()
+
+    reconciler.cache_manager.sync_cache.assert_any_call("primary:", "a")
+    reconciler.cache_manager.sync_cache.assert_any_call("primary:", "b")
+    assert all(target["last_reconciled"] for target in reconciler.get_status()["targets"])
+
+
+def test_reconcile_all_continues_after_error(reconciler):
+    """Tests that a failing folder does not stop the round."""
+    reconciler.cache_manager.sync_cache.side_effect = [Exception("listing failed"), None]
+    reconciler.register("primary:", "a")
+    reconciler.register("primary:", "b")
+
+    reconciler.reconcile_all()
+
+    assert reconciler.cache_manager.sync_cache.call_count == 2
+    last = {target["primary_folder"]: target["last_reconciled"] for target in reconciler.get_status()["targets"]}
+    assert last["a"] is None and last["b"] is not None
+
+
+def test_background_thread_runs_on_trigger(reconciler):
+    """Tests that the background thread reconciles when triggered and stops cleanly."""
+    synced = threading.Event()
+    reconciler.cache_manager.sync_cache.side_effect = lambda *args: synced.set()
+
+    reconciler.start()
+    reconciler.register("primary:", "folder")
+    assert synced.wait(timeout=5)
+    reconciler.stop(timeout=5)
+
+    reconciler.cache_manager.sync_cache.assert_called_with("primary:", "folder")
+    assert not reconciler._thread.is_alive()
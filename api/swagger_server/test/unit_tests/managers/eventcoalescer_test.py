@@ -0,0 +1,126 @@
+import threading
+import time
+import pytest
+from swagger_server.managers.eventcoalescer import EventCoalescer, merge_workflow_data
+
+WORKFLOW = {"unique_id": "uid-1", "primary_endpoint": "primary", "secondary_endpoint": "secondary",
+            "files": ["a.csv", "b.csv"], "status": "PENDING", "resource_version": "10"}
+
+
+def submit_concurrently(coalescer, events, process, delay=0.02):
+    """Submits the events one after the other from separate threads and returns their results."""
+    results = [None] * len(events)
+
+    def run(index, event):
+        results[index] = coalescer.submit(event["unique_id"], event, process)
+
+    threads = []
+    for index, event in enumerate(events):
+        thread = threading.Thread(target=run, args=(index, event))
+        thread.start()
+        threads.append(thread)
+        time.sleep(delay)
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_merge_keeps_files_of_both_and_latest_phase():
+    """Tests that merged events request the files of both in order and keep the latest values."""
+    newer = dict(WORKFLOW, files=["b.csv", "c.csv"], status="RUNNING", resource_version="11", primary_folder=None)
+
+    merged = merge_workflow_data(dict(WORKFLOW, primary_folder="in"), newer)
+
+    assert merged["files"] == ["a.csv", "b.csv", "c.csv"]
+    assert merged["status"] == "RUNNING" and merged["resource_version"] == "11"
+    assert merged["primary_folder"] == "in"
+
+
+def test_burst_is_merged_into_one_pass():
+    """Tests that events of one workflow within the window cause a single pass with the merged event."""
+    coalescer = EventCoalescer(window=0.2, max_delay=1)
+    passes = []
+
+    def process(workflow_data):
+        passes.append(workflow_data)
+        return "job-1"
+
+    results = submit_concurrently(coalescer, [WORKFLOW, dict(WORKFLOW, files=["c.csv"], status="RUNNING")], process)
+
+    assert results == ["job-1", "job-1"]
+    assert len(passes) == 1
+    assert passes[0]["files"] == ["a.csv", "b.csv", "c.csv"] and passes[0]["status"] == "RUNNING"
+    assert coalescer.get_stats() == {"events": 2, "passes": 1, "merged": 1, "window": 0.2, "max_delay": 1}
+
+
+def test_window_is_bounded_by_max_delay():
+    """Tests that a steady stream of events does not postpone the pass beyond max_delay."""
+    coalescer = EventCoalescer(window=0.1, max_delay=0.15)
+    started = []
+
+    def process(workflow_data):
+        started.append(time.monotonic())
+        return None
+
+    first = time.monotonic()
+    submit_concurrently(coalescer, [WORKFLOW] * 6, process, delay=0.05)
+
+    assert started[0] - first < 0.25
+    assert coalescer.get_stats()["passes"] >= 2
+
+
+def test_different_workflows_are_not_merged():
+    """Tests that events of different workflows run their own passes."""
+    coalescer = EventCoalescer(window=0.05)
+    passes = []
+
+    def process(workflow_data):
+        passes.append(workflow_data["unique_id"])
+        return workflow_data["unique_id"]
+
+    results = submit_concurrently(coalescer, [WORKFLOW, dict(WORKFLOW, unique_id="uid-2")], process, delay=0)
+
+    assert results == ["uid-1", "uid-2"]
+    assert sorted(passes) == ["uid-1", "uid-2"]
+
+
+def test_passes_of_a_workflow_do_not_overlap():
+    """Tests that an event arriving during a pass waits for it and runs in the next pass."""
+    coalescer = EventCoalescer(window=0.01)
+    running = []
+    overlapped = []
+
+    def process(workflow_data):
+        overlapped.append(bool(running))
+        running.append(1)
+        time.sleep(0.1)
+        running.pop()
+        return workflow_data["status"]
+
+    results = submit_concurrently(coalescer, [WORKFLOW, dict(WORKFLOW, status="RUNNING")], process, delay=0.05)
+
+    assert results == ["PENDING", "RUNNING"]
+    assert overlapped == [False, False]
+
+
+def test_error_is_raised_to_every_caller():
+    """Tests that an error of the merged pass reaches all callers of the window."""
+    coalescer = EventCoalescer(window=0.1)
+    errors = []
+
+    def process(workflow_data):
+        raise RuntimeError("listing failed")
+
+    def run():
+        with pytest.raises(RuntimeError):
+            coalescer.submit("uid-1", WORKFLOW, process)
+        errors.append(1)
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2
+    assert coalescer.get_stats()["passes"] == 1
@@ -0,0 +1,57 @@
+import time
+from swagger_server.managers.eventdeduplicator import EventDeduplicator, fingerprint_event
+
+WORKFLOW = {"primary_endpoint": "primary", "secondary_endpoint": "secondary", "primary_folder": "in",
+            "secondary_folder": "in", "files": ["a.csv", "b.csv"], "status": "RUNNING"}
+
+
+def test_fingerprint_ignores_status_changes():
+    """Tests that only the staged files, endpoints and folders and the terminal flag change the fingerprint."""
+    assert fingerprint_event(WORKFLOW, False) == fingerprint_event(dict(WORKFLOW, status="PENDING"), False)
+    assert fingerprint_event(WORKFLOW, False) != fingerprint_event(dict(WORKFLOW, files=["a.csv"]), False)
+    assert fingerprint_event(WORKFLOW, False) != fingerprint_event(WORKFLOW, True)
+
+
+def test_repeated_resource_version_is_skipped():
+    """Tests that an event with a known resourceVersion returns the outcome of the first one."""
+    dedupe = EventDeduplicator()
+
+    assert dedupe.begin("uid-1", "10", "fp-1") == (False, None)
+    dedupe.complete("uid-1", "job-1")
+
+    assert dedupe.begin("uid-1", "10", "fp-2") == (True, "job-1")
+    assert dedupe.get_stats()["duplicate_version"] == 1
+
+
+def test_unchanged_event_is_skipped_until_ttl():
+    """Tests that a new resourceVersion with the same fingerprint is skipped, but handled again after the ttl."""
+    dedupe = EventDeduplicator(ttl=60)
+    dedupe.begin("uid-1", "10", "fp-1")
+    dedupe.complete("uid-1", "job-1")
+
+    assert dedupe.begin("uid-1", "11", "fp-1") == (True, "job-1")
+    assert dedupe.begin("uid-1", "12", "fp-2") == (False, None)
+
+    dedupe.complete("uid-1", "job-2")
+    dedupe.workflows["uid-1"]["handled_at"] = time.time() - 120
+    assert dedupe.begin("uid-1", "13", "fp-2") == (False, None)
+    assert dedupe.get_stats() == {"handled": 3, "duplicate_version": 0, "unchanged": 1, "workflows": 1}
+
+
+def test_event_in_progress_is_skipped_and_abort_forgets():
+    """Tests that a repeat of an event still being handled is skipped, and that a failed event is retried."""
+    dedupe = EventDeduplicator()
+    dedupe.begin("uid-1", "10", "fp-1")
+
+    assert dedupe.begin("uid-1", "11", "fp-1") == (True, None)
+
+    dedupe.abort("uid-1")
+    assert dedupe.begin("uid-1", "11", "fp-1") == (False, None)
+
+
+def test_events_without_uid_are_always_handled():
+    """Tests that events without a workflow uid cannot be deduplicated."""
+    dedupe = EventDeduplicator()
+
+    assert dedupe.begin(None, "10", "fp-1") == (False, None)
+    assert dedupe.begin(None, "10", "fp-1") == (False, None)
@@ -0,0 +1,210 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from swagger_server.managers.eventcoalescer import EventCoalescer
+from swagger_server.managers.eventqueue import EventQueue, EventQueueFull, EventQueueClosed
+from swagger_server.managers.eventstore import SQLiteEventStore
+from swagger_server.managers.transferjobmanager import TransferJob
+
+
+def event(uid, status="RUNNING", files=None):
+    """Returns an event as parse_argo_workflow would; the tests pass it through unchanged."""
+    return {"unique_id": uid, "status": status, "files": files or ["a.csv"]}
+
+
+@pytest.fixture(autouse=True)
+def parse_unchanged():
+    with patch("swagger_server.managers.eventqueue.parse_argo_workflow", side_effect=lambda workflow: workflow):
+        yield
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_submit_returns_at_once_and_handles_in_background():
+    """Tests that submitting does not wait for the handler and records the transfer job of the event."""
+    release = threading.Event()
+    handler = MagicMock()
+    job = MagicMock(id="job-1")
+    handler.handle_workflow_data.side_effect = lambda data: release.wait(5) and job
+    queue = EventQueue(handler, max_workers=1)
+
+    task = queue.submit(event("uid-1"))
+    assert task.state in ("queued", "running")
+
+    release.set()
+    wait_until(lambda: task.state == "succeeded")
+    assert task.job_id == "job-1"
+    assert queue.get_task(task.id) is task
+    queue.shutdown()
+
+
+def test_full_queue_refuses_events():
+    """Tests that events beyond max_queued are refused and a closed queue refuses everything."""
+    queue = EventQueue(MagicMock(), EventCoalescer(window=10, max_delay=10), max_queued=2)
+
+    queue.submit(event("uid-1"))
+    queue.submit(event("uid-2"))
+    with pytest.raises(EventQueueFull):
+        queue.submit(event("uid-3"))
+    assert queue.get_stats()["rejected"] == 1
+
+    queue._closed = True
+    with pytest.raises(EventQueueClosed):
+        queue.submit(event("uid-4"))
+
+
+def test_concurrent_submissions_do_not_overfill_queue():
+    """Tests that submissions racing while the event store writes are still held to max_queued."""
+    store = MagicMock()
+    store.put.side_effect = lambda *args: time.sleep(0.1)
+    queue = EventQueue(MagicMock(), EventCoalescer(window=10, max_delay=10), event_store=store, max_queued=2)
+    refused = []
+
+    def submit(uid):
+        try:
+            queue.submit(event(uid))
+        except EventQueueFull:
+            refused.append(uid)
+
+    threads = [threading.Thread(target=submit, args=(f"uid-{index}",)) for index in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(refused) == 3
+    assert queue.get_stats()["queued"] == 2
+
+
+def test_failed_store_write_frees_its_slot():
+    """Tests that an event that could not be stored does not keep its reserved slot."""
+    store = MagicMock()
+    store.put.side_effect = RuntimeError("MongoDB unavailable")
+    queue = EventQueue(MagicMock(), event_store=store, max_queued=1)
+
+    with pytest.raises(RuntimeError):
+        queue.submit(event("uid-1"))
+    assert queue.queued == 0
+
+
+def test_events_of_a_workflow_keep_their_order_and_are_merged():
+    """Tests that events queued behind a running pass of their workflow are merged into the next pass."""
+    release = threading.Event()
+    passes = []
+
+    def handle(data):
+        passes.append(data)
+        release.wait(5)
+
+    handler = MagicMock()
+    handler.handle_workflow_data.side_effect = handle
+    queue = EventQueue(handler, max_workers=4)
+
+    first = queue.submit(event("uid-1", "PENDING"))
+    wait_until(lambda: passes)
+    second = queue.submit(event("uid-1", "RUNNING", ["b.csv"]))
+    third = queue.submit(event("uid-1", "SUCCEEDED", ["c.csv"]))
+    time.sleep(0.05)
+    assert len(passes) == 1  # The workflow is still busy
+
+    release.set()
+    wait_until(lambda: third.state == "succeeded")
+    assert [data["status"] for data in passes] == ["PENDING", "SUCCEEDED"]
+    assert passes[1]["files"] == ["b.csv", "c.csv"]
+    assert first.merged_events == 1 and second.merged_events == third.merged_events == 2
+    queue.shutdown()
+
+
+def test_different_workflows_run_in_parallel():
+    """Tests that a slow workflow does not hold back the events of another one."""
+    release = threading.Event()
+
+    def handle(data):
+        if data["unique_id"] == "slow":
+            release.wait(5)
+
+    handler = MagicMock()
+    handler.handle_workflow_data.side_effect = handle
+    queue = EventQueue(handler, max_workers=2)
+
+    slow = queue.submit(event("slow"))
+    fast = queue.submit(event("fast"))
+
+    wait_until(lambda: fast.state == "succeeded")
+    assert slow.state == "running"
+    release.set()
+    queue.shutdown()
+    assert slow.state == "succeeded"
+
+
+def test_failed_event_records_error():
+    """Tests that an error of the handler is recorded in the event instead of stopping the worker."""
+    handler = MagicMock()
+    handler.handle_workflow_data.side_effect = [RuntimeError("MongoDB unavailable"), None]
+    queue = EventQueue(handler, max_workers=1)
+
+    failed = queue.submit(event("uid-1"))
+    wait_until(lambda: failed.state == "failed")
+    handled = queue.submit(event("uid-2"))
+    queue.shutdown()
+
+    assert failed.error == "MongoDB unavailable"
+    assert handled.state == "succeeded"
+    assert queue.get_stats()["failed"] == 1 and queue.get_stats()["handled"] == 1
+
+
+def test_events_keep_their_workflow_pending_until_handled():
+    """Tests that the workflow of every accepted event is pending for readiness waits until its pass is over."""
+    release = threading.Event()
+    handler = MagicMock()
+    handler.handle_workflow_data.side_effect = lambda data: release.wait(5) and None
+    queue = EventQueue(handler, max_workers=1)
+
+    task = queue.submit(event("uid-1"))
+    handler.expect.assert_called_once_with("uid-1")
+    handler.settle.assert_not_called()
+
+    release.set()
+    wait_until(lambda: task.state == "succeeded")
+    handler.settle.assert_called_once_with("uid-1")
+    queue.shutdown()
+
+
+def test_stored_events_are_acked_once_their_files_are_staged(tmp_path):
+    """Tests that an event stays stored until the transfer job of its pass has finished."""
+    store = SQLiteEventStore(str(tmp_path / "events.sqlite"))
+    job = TransferJob("copy", [{"files": ["a.csv"], "parallel_files": 1}])
+    handler = MagicMock()
+    handler.handle_workflow_data.return_value = job
+    queue = EventQueue(handler, event_store=store, max_workers=1)
+
+    task = queue.submit(event("uid-1"))
+    wait_until(lambda: task.state == "succeeded")
+    assert store.count()["pending"] == 1
+
+    job.finish()
+    assert store.count()["pending"] == 0
+    queue.shutdown()
+
+
+def test_start_replays_interrupted_events(tmp_path):
+    """Tests that the events left by the previous run of the service are handled on start."""
+    path = str(tmp_path / "events.sqlite")
+    SQLiteEventStore(path, owner="host-1").put("event-1", "uid-1", event("uid-1"))
+    handler = MagicMock()
+    handler.handle_workflow_data.return_value = None
+    queue = EventQueue(handler, event_store=SQLiteEventStore(path, owner="host-1"), max_workers=1)
+
+    queue.start()
+    wait_until(lambda: queue.get_task("event-1") is not None and queue.get_task("event-1").state == "succeeded")
+    queue.shutdown()
+
+    handler.handle_workflow_data.assert_called_once_with(event("uid-1"))
+    assert queue.get_stats()["replayed"] == 1
+    assert queue.get_stats()["stored"] == {"pending": 0, "dead": 0}
@@ -0,0 +1,81 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+from swagger_server.managers.eventstore import SQLiteEventStore, MongoEventStore, create_event_store
+
+WORKFLOW = {"unique_id": "uid-1", "files": ["a.csv"], "status": "RUNNING"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Provides an SQLite event store in a temporary file."""
+    return SQLiteEventStore(str(tmp_path / "events.sqlite"), visibility_timeout=60, max_attempts=2, owner="host-1")
+
+
+def test_leased_events_are_not_recovered_until_expired(store):
+    """Tests that an event is only replayed once its lease has expired, and not after it was acked."""
+    store.put("event-1", "uid-1", WORKFLOW)
+    store.put("event-2", "uid-2", dict(WORKFLOW, unique_id="uid-2"))
+
+    assert store.recover() == []
+
+    store._connection.execute("UPDATE events SET leased_until = 0")
+    store.ack(["event-2"])
+    assert store.recover() == [("event-1", "uid-1", WORKFLOW)]
+    assert store.recover() == []  # Claimed with a new lease
+    assert store.count() == {"pending": 1, "dead": 0}
+
+
+def test_recover_on_boot_claims_events_of_the_same_owner(store, tmp_path):
+    """Tests that a restarted instance resumes its own events, but not those of another instance."""
+    store.put("event-1", "uid-1", WORKFLOW)
+    other = SQLiteEventStore(str(tmp_path / "events.sqlite"), owner="host-2")
+
+    assert other.recover(include_owned=True) == []
+    assert SQLiteEventStore(str(tmp_path / "events.sqlite"), owner="host-1").recover(include_owned=True) == [
+        ("event-1", "uid-1", WORKFLOW)]
+
+
+def test_extend_keeps_events_leased(store):
+    """Tests that extending a lease keeps an event from being replayed."""
+    store.put("event-1", "uid-1", WORKFLOW)
+    store._connection.execute("UPDATE events SET leased_until = ?", (time.time() - 1,))
+
+    store.extend(["event-1"])
+
+    assert store.recover() == []
+
+
+def test_events_are_given_up_after_max_attempts(store):
+    """Tests that an event that keeps failing is marked dead instead of being replayed forever."""
+    store.put("event-1", "uid-1", WORKFLOW)
+    store._connection.execute("UPDATE events SET leased_until = 0")
+    assert len(store.recover()) == 1
+
+    store._connection.execute("UPDATE events SET leased_until = 0")
+    assert store.recover() == []
+    assert store.count() == {"pending": 0, "dead": 1}
+
+
+def test_mongo_store_claims_events_one_by_one():
+    """Tests that the Mongo store claims each visible event atomically and counts the attempt."""
+    mongo_manager = MagicMock()
+    events = mongo_manager.get_collection.return_value
+    events.find.return_value.sort.return_value = [{"_id": "event-1"}, {"_id": "event-2"}]
+    events.find_one_and_update.side_effect = [
+        {"_id": "event-1", "workflow_uid": "uid-1", "data": WORKFLOW, "attempts": 2},
+        None,  # Claimed by another instance in the meantime
+    ]
+    store = MongoEventStore(mongo_manager, owner="host-1")
+
+    assert store.recover() == [("event-1", "uid-1", WORKFLOW)]
+    query, update = events.find_one_and_update.call_args_list[0][0]
+    assert query["_id"] == "event-1" and query["dead"] is False
+    assert update["$inc"] == {"attempts": 1} and update["$set"]["owner"] == "host-1"
+
+
+def test_create_event_store_rejects_unknown_backend():
+    """Tests choosing the backend from the settings."""
+    assert isinstance(create_event_store(MagicMock(), backend="mongo"), MongoEventStore)
+    with pytest.raises(ValueError):
+        create_event_store(MagicMock(), backend="redis")
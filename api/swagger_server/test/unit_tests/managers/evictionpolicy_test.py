@@ -0,0 +1,71 @@
+import pytest
+from swagger_server.managers.evictionpolicy import (
+    create_eviction_policy, LRUPolicy, LFUPolicy, GDSFPolicy, TwoQPolicy
+)
+
+
+def test_create_eviction_policy():
+    """Tests creating policies by (case-insensitive) name."""
+    assert isinstance(create_eviction_policy("LRU"), LRUPolicy)
+    assert isinstance(create_eviction_policy("lfu"), LFUPolicy)
+    assert isinstance(create_eviction_policy("gdsf"), GDSFPolicy)
+    assert isinstance(create_eviction_policy("2q"), TwoQPolicy)
+    assert isinstance(create_eviction_policy(None), LRUPolicy)
+
+
+def test_create_unknown_eviction_policy():
+    """Tests that an unknown policy name raises an error."""
+    with pytest.raises(ValueError, match="Unknown eviction policy 'mru'"):
+        create_eviction_policy("mru")
+
+
+def test_lru_priority_is_access_time():
+    """Tests that LRU orders entries by their last access."""
+    policy = LRUPolicy()
+    assert policy.on_insert({"file_name": "a", "size": 1}, 10.0) == {"priority": 10.0}
+    assert policy.on_access({"file_name": "a", "size": 1, "hits": 2}, 20.0) == {"priority": 20.0}
+
+
+def test_lfu_aging():
+    """Tests that the LFU clock ages out entries that were popular in the past."""
+    policy = LFUPolicy()
+    assert policy.on_access({"hits": 3}, 0)["priority"] == 3
+
+    policy.on_evict({"priority": 3})
+    assert policy.get_state() == {"clock": 3}
+    assert policy.on_insert({"file_name": "new", "size": 1}, 0)["priority"] == 4
+
+    restored = LFUPolicy(policy.get_state())
+    assert restored.clock == 3
+
+
+def test_gdsf_prefers_small_files():
+    """Tests that GDSF keeps a small file over a large file with the same frequency."""
+    policy = GDSFPolicy(bandwidth=1_000_000, fixed_cost=1.0)
+    small = policy.on_insert({"file_name": "small", "size": 1_000}, 0)["priority"]
+    large = policy.on_insert({"file_name": "large", "size": 1_000_000_000}, 0)["priority"]
+    assert small > large
+
+    # Frequency still counts for large files
+    popular_large = policy.on_access({"size": 1_000_000_000, "hits": 10}, 0)["priority"]
+    assert popular_large > large
+
+
+def test_two_q_segments():
+    """Tests probation, promotion and ghost re-admission of the 2Q policy."""
+    policy = TwoQPolicy(ghost_entries=1)
+    inserted = policy.on_insert({"file_name": "a", "size": 1}, 10.0)
+    assert inserted == {"priority": 10.0, "segment": "a1in"}
+
+    promoted = policy.on_access({"file_name": "a", "hits": 2, "segment": "a1in"}, 20.0)
+    assert promoted["segment"] == "am"
+    assert promoted["priority"] > inserted["priority"]
+
+    # An evicted probationary file that comes back goes straight to the protected segment
+    policy.on_evict({"file_name": "b", "segment": "a1in"})
+    assert policy.on_insert({"file_name": "b", "size": 1}, 30.0)["segment"] == "am"
+
+    # The ghost list is bounded
+    policy.on_evict({"file_name": "c", "segment": "a1in"})
+    policy.on_evict({"file_name": "d", "segment": "a1in"})
+    assert policy.get_state() == {"ghosts": ["d"]}
@@ -0,0 +1,92 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from swagger_server.managers.healthprober import HealthProber, HEALTHY, DEGRADED, UNHEALTHY, UNKNOWN
+
+
+@pytest.fixture
+def rclone_manager():
+    """Creates a mocked RcloneManager using the rc daemon, with two remotes."""
+    mock = MagicMock()
+    mock.daemon.is_running.return_value = True
+    mock.daemon.call.return_value = {"version": "v1.69.1"}
+    mock.endpoints = {"s3": {}, "local": {}}
+    mock.list_folders.return_value = (True, ["bucket"])
+    return mock
+
+
+@pytest.fixture
+def prober(rclone_manager):
+    """Creates a prober with a short timeout."""
+    prober = HealthProber(rclone_manager, MagicMock(), interval=60, timeout=0.2)
+    yield prober
+    prober.stop()
+
+
+def test_probe_records_latency_of_every_dependency(prober, rclone_manager):
+    """Tests that rclone, MongoDB and every remote are checked and their latency is recorded."""
+    assert prober.get_snapshot()["status"] == UNKNOWN
+
+    snapshot = prober.probe()
+
+    assert snapshot["status"] == HEALTHY
+    dependencies = snapshot["dependencies"]
+    assert dependencies["rclone"]["detail"] == "rclone rcd v1.69.1"
+    assert set(dependencies["remotes"]) == {"s3", "local"}
+    assert all(result["latency_ms"] >= 0 for result in [dependencies["rclone"], dependencies["mongodb"],
+                                                       *dependencies["remotes"].values()])
+    prober.mongoDB_manager.client.admin.command.assert_called_once_with("ping")
+    rclone_manager.daemon.call.assert_called_once_with("core/version")
+    assert prober.get_snapshot()["status"] == HEALTHY
+
+
+def test_unreachable_remote_degrades_and_failing_mongodb_fails(prober, rclone_manager):
+    """Tests that a failing remote only degrades the service, while failing MongoDB makes it unhealthy."""
+    rclone_manager.list_folders.side_effect = lambda remote: (False, "no route") if remote == "s3" else (True, [])
+    snapshot = prober.probe()
+    assert snapshot["status"] == DEGRADED
+    assert snapshot["dependencies"]["remotes"]["s3"]["healthy"] is False
+    assert snapshot["dependencies"]["remotes"]["s3"]["error"] == "no route"
+
+    prober.mongoDB_manager.client.admin.command.side_effect = RuntimeError("timed out")
+    snapshot = prober.probe()
+    assert snapshot["status"] == UNHEALTHY
+    assert snapshot["dependencies"]["mongodb"]["error"] == "timed out"
+
+
+def test_hanging_check_times_out_and_is_not_started_again(prober, rclone_manager):
+    """Tests that a check without answer fails after the timeout and is not piled up by later rounds."""
+    release = threading.Event()
+    rclone_manager.endpoints = {"slow": {}}
+    rclone_manager.list_folders.side_effect = lambda remote: release.wait(5) and (True, [])
+
+    started = time.monotonic()
+    assert prober.probe()["dependencies"]["remotes"]["slow"]["healthy"] is False
+    prober.probe()
+    assert time.monotonic() - started < 1
+
+    release.set()
+    time.sleep(0.05)
+    assert rclone_manager.list_folders.call_count == 1
+    assert prober.probe()["dependencies"]["remotes"]["slow"]["healthy"] is True
+
+
+def test_rclone_binary_is_checked_without_daemon(prober, rclone_manager):
+    """Tests that rclone is checked by running the binary when the daemon is not used."""
+    rclone_manager.daemon = None
+    with patch("swagger_server.managers.healthprober.subprocess.run") as run:
+        run.return_value = MagicMock(returncode=0, stdout="rclone v1.69.1\n- os/version: alpine")
+        snapshot = prober.probe()
+
+    assert snapshot["dependencies"]["rclone"]["detail"] == "rclone v1.69.1"
+
+
+def test_snapshot_is_stale_without_recent_probe(prober):
+    """Tests that the snapshot counts as stale before the first probe and once probes stop."""
+    assert prober.is_stale()
+    prober.probe()
+    assert not prober.is_stale()
+
+    prober._snapshot["checked_at"] -= 3 * prober.interval + prober.timeout + 1
+    assert prober.is_stale()
@@ -1,8 +1,18 @@
 import pytest
 from unittest.mock import patch, MagicMock
+from pymongo import ReadPreference
+from swagger_server.managers import mongodbmanager
 from swagger_server.managers.mongodbmanager import MongoDBManager
 
 
+@pytest.fixture(autouse=True)
+def shared_clients():
+    """Starts and ends every test without shared clients."""
+    mongodbmanager._shared_clients.clear()
+    yield mongodbmanager._shared_clients
+    mongodbmanager._shared_clients.clear()
+
+
 @pytest.fixture
 def mock_mongo_client():
     """Creates a mock MongoDB client."""
@@ -10,7 +20,7 @@ def mock_mongo_client():
     mock_db = MagicMock()
     mock_collection = MagicMock()
 
-    mock_client.__getitem__.return_value = mock_db
+    mock_client.get_database.return_value = mock_db
     mock_db.__getitem__.return_value = mock_collection
 
     return mock_client, mock_db, mock_collection
@@ -41,6 +51,42 @@ def test_mongo_manager_initialization(mongo_manager):
     assert mongo_manager.collection is not None
 
 
+def test_mongo_manager_reads_from_primary(mongo_manager, mock_mongo_client):
+    """Tests that the cache state is read from the primary despite the secondaryPreferred URI."""
+    mock_mongo_client[0].get_database.assert_called_once_with("test_db", read_preference=ReadPreference.PRIMARY)
+
+
+def test_managers_share_one_client(mock_aws_secret, mock_mongo_client, monkeypatch):
+    """Tests that the client is created and checked once per process with the configured pool options."""
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "20")
+    monkeypatch.setenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000")
+    with patch("swagger_server.managers.mongodbmanager.get_aws_secret", return_value=mock_aws_secret) as secret, \
+            patch("swagger_server.managers.mongodbmanager.MongoClient", return_value=mock_mongo_client[0]) as client:
+        first = MongoDBManager()
+        second = MongoDBManager(collection_name="workflowEvents")
+
+    assert first.client is second.client
+    client.assert_called_once()
+    secret.assert_called_once()
+    assert client.call_args.kwargs["maxPoolSize"] == 20
+    assert client.call_args.kwargs["serverSelectionTimeoutMS"] == 2000
+    mock_mongo_client[0].admin.command.assert_called_once_with("ping")
+    mock_mongo_client[0].list_database_names.assert_not_called()
+
+
+def test_failed_connection_is_not_shared(mock_aws_secret, mock_mongo_client, shared_clients):
+    """Tests that a client that cannot connect is closed and the next manager tries again."""
+    mock_mongo_client[0].admin.command.side_effect = [RuntimeError("No servers found"), {"ok": 1}]
+    with patch("swagger_server.managers.mongodbmanager.get_aws_secret", return_value=mock_aws_secret), \
+            patch("swagger_server.managers.mongodbmanager.MongoClient", return_value=mock_mongo_client[0]):
+        with pytest.raises(RuntimeError):
+            MongoDBManager()
+        assert shared_clients == {}
+        mock_mongo_client[0].close.assert_called_once()
+
+        assert MongoDBManager().client is mock_mongo_client[0]
+
+
 def test_insert_event(mongo_manager, mock_mongo_client):
     """Tests inserting an event into MongoDB."""
     mock_insert_result = MagicMock(inserted_id="12345")
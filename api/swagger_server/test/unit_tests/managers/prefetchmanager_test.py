@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import MagicMock
+from swagger_server.managers.prefetchmanager import PrefetchManager
+
+
+@pytest.fixture
+def mock_file_sets():
+    """Creates a mocked file set collection with a recurring base set."""
+    mock = MagicMock()
+    history = [
+        {"_id": "wf-1", "files": ["/base/a.csv", "/base/b.csv", "/base/c.csv"]},
+        {"_id": "wf-2", "files": ["/base/a.csv", "/base/b.csv", "/base/c.csv"]},
+        {"_id": "wf-3", "files": ["/base/a.csv", "/large/x.csv"]},
+    ]
+    mock.find.return_value.sort.return_value.limit.return_value = history
+    return mock
+
+
+@pytest.fixture
+def prefetch_manager(mock_file_sets):
+    """Provides a PrefetchManager backed by the mocked collection."""
+    mongo = MagicMock()
+    mongo.get_collection.return_value = mock_file_sets
+    return PrefetchManager(mongo, min_support=2, min_confidence=0.6)
+
+
+def test_predict_companions(prefetch_manager):
+    """Tests that files co-occurring with the request often enough are predicted."""
+    assert prefetch_manager.predict(["/base/b.csv"]) == ["/base/a.csv", "/base/c.csv"]
+
+
+def test_predict_respects_confidence(prefetch_manager):
+    """Tests that rare companions are not predicted."""
+    # a.csv occurs in 3 sets, x.csv only in one of them (confidence 1/3)
+    assert "/large/x.csv" not in prefetch_manager.predict(["/base/a.csv"])
+
+
+def test_predict_unknown_files(prefetch_manager):
+    """Tests that files without history yield no predictions."""
+    assert prefetch_manager.predict(["/other/file.csv"]) == []
+
+
+def test_predict_limits_files(prefetch_manager):
+    """Tests that the number of predicted files is bounded."""
+    prefetch_manager.max_files = 1
+    assert prefetch_manager.predict(["/base/b.csv"]) == ["/base/a.csv"]
+
+
+def test_record_file_set_once_per_workflow(prefetch_manager, mock_file_sets):
+    """Tests that repeated events of a workflow are stored and counted once."""
+    prefetch_manager.predict([])
+
+    prefetch_manager.record_file_set("wf-4", ["/new/p.csv", "/new/q.csv"])
+    prefetch_manager.record_file_set("wf-4", ["/new/p.csv", "/new/q.csv"])
+    prefetch_manager.record_file_set("wf-5", ["/new/p.csv", "/new/q.csv"])
+
+    assert mock_file_sets.update_one.call_count == 3
+    query, update = mock_file_sets.update_one.call_args[0]
+    assert query == {"_id": "wf-5"}
+    assert update["$set"]["files"] == ["/new/p.csv", "/new/q.csv"]
+    assert prefetch_manager.predict(["/new/p.csv"]) == ["/new/q.csv"]
+
+
+def test_record_single_file_set_ignored(prefetch_manager, mock_file_sets):
+    """Tests that sets without companions are not recorded."""
+    prefetch_manager.record_file_set("wf-6", ["/only.csv"])
+    mock_file_sets.update_one.assert_not_called()
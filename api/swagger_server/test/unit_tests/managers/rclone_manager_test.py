@@ -1,8 +1,13 @@
+import io
 import pytest
 import subprocess
 import os
+import threading
 import time
-from swagger_server.managers.rclonemanager import RcloneManager
+from unittest.mock import MagicMock, patch
+from swagger_server.managers.rclonedaemon import RcloneDaemonError, RcloneDaemonNoAnswer
+from swagger_server.managers.rclonemanager import RcloneManager, normalize_endpoint, parse_json_log, split_remote_path
+from swagger_server.managers.transfermetrics import TransferMetrics
 
 
 @pytest.fixture(scope="module")
@@ -101,3 +106,472 @@ def test_rclone_delete_folder(rclone, setup_rclone_remote):
 
     assert success, "Failed to delete folder"
     assert message == f"Folder '/test_folder' deleted in 'test_remote'"
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("minio:bucket/folder/file.csv", ("minio:bucket/folder", "file.csv")),
+    ("minio:file.csv", ("minio:", "file.csv")),
+    ("local:/tmp/file.csv", ("local:/tmp", "file.csv")),
+    ("/tmp/file.csv", ("/tmp", "file.csv")),
+])
+def test_split_remote_path(path, expected):
+    """Tests splitting remote paths into the rc fs and remote arguments."""
+    assert split_remote_path(path) == expected
+
+
+@pytest.fixture
+def rc_manager():
+    """Provides an RcloneManager on the rc backend with a mocked daemon."""
+    mock_daemon = MagicMock(external=False)
+    mock_daemon.call.return_value = {}
+    return RcloneManager(backend="rc", daemon=mock_daemon)
+
+
+def test_rc_backend_loads_endpoints(rc_manager):
+    """Tests that the endpoints are read with config/dump."""
+    rc_manager.daemon.call.return_value = {"minio": {"type": "s3", "endpoint": "http://minio:9000"}}
+    rc_manager.update_endpoints()
+
+    rc_manager.daemon.call.assert_called_with("config/dump")
+    assert rc_manager.endpoints["minio"]["type"] == "s3"
+
+
+def test_rc_backend_list_files(rc_manager):
+    """Tests listing a folder recursively through the daemon."""
+    rc_manager.daemon.call.side_effect = [
+        {"item": {"Name": "folder", "IsDir": True}},
+        {"list": [{"Path": "a.csv", "Size": 10}, {"Path": "sub/b.csv", "Size": 20}]},
+    ]
+
+    success, files = rc_manager.list_files("minio:bucket/", "folder")
+
+    assert success
+    assert files == [{"file_name": "a.csv", "size": 10}, {"file_name": "sub/b.csv", "size": 20}]
+    rc_manager.daemon.call.assert_any_call("operations/stat", fs="minio:bucket", remote="folder")
+    rc_manager.daemon.call.assert_any_call("operations/list", fs="minio:bucket/folder", remote="",
+                                           opt={"recurse": True, "filesOnly": True})
+
+
+def test_rc_backend_check_missing_file(rc_manager):
+    """Tests that a missing file is reported as not existing."""
+    rc_manager.daemon.call.return_value = {"item": None}
+
+    assert not rc_manager.check_data_exists("minio:bucket/missing.csv")
+
+
+def test_rc_backend_copy_files(rc_manager):
+    """Tests that every file is copied with operations/copyfile instead of a new process."""
+    success, _ = rc_manager.copy_files("secondary:bucket/", "primary:bucket/", files=["a.csv", "b.csv"])
+
+    assert success
+    rc_manager.daemon.call.assert_any_call("operations/copyfile", srcFs="secondary:bucket", srcRemote="a.csv",
+                                           dstFs="primary:bucket", dstRemote="a.csv")
+    assert [c.args[0] for c in rc_manager.daemon.call.call_args_list].count("operations/copyfile") == 2
+
+
+def test_rc_backend_reports_rclone_errors(rc_manager):
+    """Tests that an rc error fails the operation without falling back."""
+    rc_manager.daemon.call.side_effect = RuntimeError("bucket not found")
+
+    with patch("swagger_server.managers.rclonemanager.handle_rclone_command") as mock_command:
+        success, message = rc_manager.sync_folders("a:", "b:")
+
+    assert not success
+    assert "bucket not found" in message
+    mock_command.assert_not_called()
+
+
+def test_rc_backend_falls_back_to_subprocess(rc_manager):
+    """Tests that an unavailable daemon falls back to one rclone process per operation."""
+    rc_manager.daemon.ensure_started.side_effect = RcloneDaemonError("rclone rcd is unavailable")
+
+    with patch("swagger_server.managers.rclonemanager.handle_rclone_command",
+               return_value=(True, "")) as mock_command:
+        assert rc_manager.delete_file("minio:bucket/", "a.csv")
+
+    mock_command.assert_called_once_with(["rclone", "delete", "minio:bucket/a.csv", "--s3-no-check-bucket"])
+
+
+def test_rc_backend_does_not_rerun_unanswered_copy(rc_manager):
+    """Tests that a copy the daemon received but did not answer fails instead of running again in a subprocess."""
+    rc_manager.daemon.call.side_effect = RcloneDaemonNoAnswer("No answer from rclone rcd to operations/copyfile")
+
+    with patch("swagger_server.managers.rclonemanager.handle_rclone_command") as mock_command, \
+            patch("swagger_server.managers.rclonemanager.subprocess.Popen") as mock_popen:
+        success, message = rc_manager.copy_files("secondary:bucket/", "primary:bucket/", files=["a.csv"])
+        transferred, results = rc_manager.transfer("copy", "secondary:bucket", "primary:bucket")
+
+    assert not success and "No answer" in message
+    assert not transferred and "No answer" in results["failed"]["secondary:bucket"]
+    mock_command.assert_not_called()
+    mock_popen.assert_not_called()
+
+
+def test_parse_json_log():
+    """Tests extracting per-file results from rclone's JSON log."""
+    lines = [
+        '{"level":"info","msg":"Copied (new)","object":"a.csv","objectType":"*s3.Object"}',
+        '{"level":"error","msg":"Failed to copy: object not found","object":"b.csv"}',
+        'Transferred: 1 / 1, 100%',
+        '{"level":"info","msg":"There was nothing to transfer"}',
+    ]
+
+    results = parse_json_log(lines, ["a.csv", "b.csv", "c.csv"])
+
+    assert results == {"copied": ["a.csv"], "unchanged": ["c.csv"],
+                       "failed": {"b.csv": "Failed to copy: object not found"}}
+
+
+def test_parse_json_log_of_failed_transfer():
+    """Tests that files without a log entry are only unchanged if rclone exited successfully."""
+    lines = ['{"level":"error","msg":"Failed to copy: object not found","object":"b.csv"}']
+
+    results = parse_json_log(lines, ["a.csv", "b.csv"], succeeded=False, error="exited with code 1")
+
+    assert results == {"copied": [], "unchanged": [], "failed": {
+        "a.csv": "exited with code 1", "b.csv": "Failed to copy: object not found"}}
+
+
+def fake_process(returncode=0, stderr="", on_start=None):
+    """Returns a Popen replacement whose process exits with the given code and log output."""
+    def popen(command, **kwargs):
+        if on_start:
+            on_start(command)
+        process = MagicMock(returncode=returncode)
+        process.stderr = io.StringIO(stderr)
+        return process
+    return popen
+
+
+def test_copy_files_batch_subprocess():
+    """Tests that the subprocess backend copies all files in one rclone invocation."""
+    manager = RcloneManager(backend="subprocess")
+    written = {}
+
+    def on_start(command):
+        files_from = next(arg for arg in command if arg.startswith("--files-from-raw="))
+        with open(files_from.split("=", 1)[1]) as f:
+            written["files"] = f.read().split()
+        written["command"] = command
+
+    log = '{"level":"info","msg":"Copied (new)","object":"a.csv"}\n'
+    with patch("swagger_server.managers.rclonemanager.subprocess.Popen",
+               side_effect=fake_process(stderr=log, on_start=on_start)) as mock_popen:
+        success, results = manager.copy_files_batch("secondary:bucket/", "primary:bucket/", ["/a.csv", "b.csv"],
+                                                    parallel_files=8, checkers=16)
+
+    assert success
+    assert mock_popen.call_count == 1
+    assert written["files"] == ["a.csv", "b.csv"]
+    assert "--transfers=8" in written["command"] and "--checkers=16" in written["command"]
+    assert results == {"copied": ["a.csv"], "unchanged": ["b.csv"], "failed": {}}
+
+
+def test_copy_files_batch_subprocess_failure_without_file_errors():
+    """Tests that a failed copy without per-file errors fails every file."""
+    manager = RcloneManager(backend="subprocess")
+
+    with patch("swagger_server.managers.rclonemanager.subprocess.Popen",
+               side_effect=fake_process(returncode=1, stderr="directory not found")):
+        success, results = manager.copy_files_batch("secondary:bucket/", "primary:bucket/", ["a.csv"])
+
+    assert not success
+    assert results["failed"] == {"a.csv": "directory not found"}
+
+
+def test_copy_files_batch_subprocess_partial_failure():
+    """Tests that files rclone did not get to in a failed run are failed, not unchanged."""
+    manager = RcloneManager(backend="subprocess")
+    log = ('{"level":"info","msg":"Copied (new)","object":"a.csv"}\n'
+           '{"level":"error","msg":"Failed to copy: permission denied","object":"b.csv"}\n')
+
+    with patch("swagger_server.managers.rclonemanager.subprocess.Popen",
+               side_effect=fake_process(returncode=1, stderr=log)):
+        success, results = manager.copy_files_batch("secondary:bucket/", "primary:bucket/",
+                                                    ["a.csv", "b.csv", "c.csv"])
+
+    assert not success
+    assert results["copied"] == ["a.csv"] and results["unchanged"] == []
+    assert set(results["failed"]) == {"b.csv", "c.csv"}
+    assert results["failed"]["b.csv"] == "Failed to copy: permission denied"
+
+
+def test_transfer_subprocess_streams_stats():
+    """Tests that stats lines are reported while rclone runs and feed the endpoint metrics."""
+    metrics = TransferMetrics()
+    manager = RcloneManager(backend="subprocess", metrics=metrics)
+    updates = []
+    log = (
+        '{"level":"info","msg":"  Transferred: 100 B / 400 B","stats":{"bytes":100,"totalBytes":400,'
+        '"speed":100.0,"eta":3,"errors":0,"retries":0,"transfers":0,"transferring":[{"name":"a.csv"}]}}\n'
+        '{"level":"info","msg":"Copied (new)","object":"a.csv"}\n'
+        '{"level":"info","msg":"  Transferred: 400 B / 400 B","stats":{"bytes":400,"totalBytes":400,'
+        '"speed":200.0,"eta":0,"errors":1,"retries":2,"transfers":1,"transferring":null}}\n'
+    )
+
+    arrived = []
+    with patch("swagger_server.managers.rclonemanager.subprocess.Popen",
+               side_effect=fake_process(stderr=log)) as mock_popen:
+        success, results = manager.transfer("copy", "secondary:bucket/", "primary:bucket/", ["a.csv", "b.csv"],
+                                            progress=updates.append,
+                                            file_done=lambda name, error: arrived.append((name, len(updates))))
+
+    assert success
+    assert results["copied"] == ["a.csv"]
+    # a.csv is reported when its log line is read (after the first stats line), b.csv (unchanged) at the end
+    assert arrived == [("a.csv", 1), ("b.csv", 2)]
+    assert "--stats=1s" in mock_popen.call_args.args[0]
+    assert [update["bytes"] for update in updates] == [100, 400]
+    assert updates[0]["transferring"] == [{"name": "a.csv"}] and updates[1]["transferring"] == []
+
+    route = metrics.snapshot()["routes"][0]
+    assert (route["source"], route["destination"]) == ("secondary", "primary")
+    assert route["bytes"] == 400 and route["errors"] == 1 and route["retries"] == 2
+
+
+def test_transfer_subprocess_passes_tuning_flags():
+    """Tests that tuning options become rclone flags, with sizes in bytes."""
+    manager = RcloneManager(backend="subprocess")
+
+    with patch("swagger_server.managers.rclonemanager.subprocess.Popen", side_effect=fake_process()) as mock_popen:
+        manager.transfer("copy", "secondary:", "primary:", ["big.bin"], parallel_files=2,
+                         options={"multi_thread_streams": 8, "multi_thread_cutoff": 1024, "s3_upload_concurrency": 4})
+
+    command = mock_popen.call_args.args[0]
+    assert "--multi-thread-streams=8" in command
+    assert "--multi-thread-cutoff=1024B" in command
+    assert "--s3-upload-concurrency=4" in command
+
+
+def test_transfer_rc_passes_tuning_options(rc_manager):
+    """Tests that the daemon gets the multi-thread settings as config and S3 options in the connection string."""
+    rc_manager.endpoints = {"primary": {"type": "s3"}}
+    rc_manager.daemon.call.side_effect = lambda command, **params: (
+        {"jobid": 1} if command == "sync/copy" else {"finished": True, "success": True} if command == "job/status"
+        else {})
+
+    rc_manager.transfer("copy", "secondary:bucket", "primary:bucket", ["big.bin"],
+                        options={"multi_thread_streams": 8, "s3_chunk_size": 1024, "s3_upload_concurrency": 4})
+
+    copy_call = next(c for c in rc_manager.daemon.call.call_args_list if c.args[0] == "sync/copy")
+    assert copy_call.kwargs["_config"]["MultiThreadStreams"] == 8
+    assert copy_call.kwargs["dstFs"] == "primary,chunk_size=1024B,upload_concurrency=4:bucket"
+    assert copy_call.kwargs["srcFs"] == "secondary:bucket"
+
+
+def test_copy_files_batch_rc(rc_manager):
+    """Tests the batch copy as a daemon job, with per-file results from its transfer group."""
+    def fake_call(command, **params):
+        if command == "sync/copy":
+            return {"jobid": 7}
+        if command == "job/status":
+            return {"finished": True, "success": False, "error": "1 error"}
+        if command == "core/transferred":
+            return {"transferred": [{"name": "a.csv", "error": ""},
+                                    {"name": "b.csv", "error": "permission denied"}]}
+        if command == "operations/list":
+            return {"list": [{"Path": "c.csv", "Size": 10}]}
+        return {}
+
+    rc_manager.daemon.call.side_effect = fake_call
+
+    success, results = rc_manager.copy_files_batch("secondary:bucket/", "primary:bucket/", ["a.csv", "b.csv", "c.csv"])
+
+    assert not success
+    assert results == {"copied": ["a.csv"], "unchanged": ["c.csv"], "failed": {"b.csv": "permission denied"}}
+    rc_manager.daemon.call.assert_any_call("operations/list", fs="primary:bucket/", remote="",
+                                           opt={"recurse": True, "filesOnly": True})
+    copy_call = next(c for c in rc_manager.daemon.call.call_args_list if c.args[0] == "sync/copy")
+    assert copy_call.kwargs["_config"] == {"Transfers": 4, "Checkers": 8, "NoTraverse": True}
+    assert copy_call.kwargs["_async"] is True
+
+
+def test_copy_files_batch_rc_fails_files_missing_from_log_and_destination(rc_manager):
+    """Tests that a file the transfer log no longer lists only counts as unchanged if it is on the destination."""
+    def fake_call(command, **params):
+        if command == "sync/copy":
+            return {"jobid": 7}
+        if command == "job/status":
+            return {"finished": True, "success": True}
+        if command == "core/transferred":
+            return {"transferred": [{"name": "c.csv", "error": "", "checked": True}]}
+        if command == "operations/list":
+            return {"list": [{"Path": "a.csv", "Size": 10}]}
+        return {}
+
+    rc_manager.daemon.call.side_effect = fake_call
+
+    success, results = rc_manager.copy_files_batch("secondary:bucket/", "primary:bucket/", ["a.csv", "b.csv", "c.csv"])
+
+    assert not success
+    assert results == {"copied": [], "unchanged": ["c.csv", "a.csv"],
+                       "failed": {"b.csv": "Not on the destination after the transfer"}}
+
+
+def test_copy_files_batch_with_external_daemon_runs_locally(rc_manager):
+    """Tests that a file list is not handed to a daemon elsewhere, which cannot read the local list file."""
+    rc_manager.daemon.external = True
+    commands = []
+
+    with patch("swagger_server.managers.rclonemanager.subprocess.Popen",
+               side_effect=fake_process(on_start=commands.append)):
+        success, results = rc_manager.copy_files_batch("secondary:bucket/", "primary:bucket/", ["a.csv"])
+
+    assert success and results["unchanged"] == ["a.csv"]
+    assert any(arg.startswith("--files-from-raw=") for arg in commands[0])
+    assert "sync/copy" not in [c.args[0] for c in rc_manager.daemon.call.call_args_list]
+
+
+def test_transfer_rc_reports_progress_and_cancels(rc_manager):
+    """Tests that a running daemon job reports its progress and is stopped on cancellation."""
+    cancel_event = threading.Event()
+    updates = []
+    polls = {"count": 0}
+
+    def fake_call(command, **params):
+        if command == "sync/sync":
+            return {"jobid": 3}
+        if command == "job/status":
+            polls["count"] += 1
+            return {"finished": polls["count"] > 2, "success": False, "error": "context canceled"}
+        if command == "core/stats":
+            return {"bytes": 50, "totalBytes": 200, "speed": 25.0, "eta": 6,
+                    "transferring": [{"name": "a.csv", "bytes": 50, "size": 200}]}
+        return {}
+
+    def on_progress(progress):
+        updates.append(progress)
+        cancel_event.set()
+
+    rc_manager.daemon.call.side_effect = fake_call
+    rc_manager.poll_interval = 0
+
+    success, results = rc_manager.transfer("sync", "secondary:bucket", "primary:bucket", progress=on_progress,
+                                           cancel_event=cancel_event)
+
+    assert not success
+    assert results["failed"] == {"secondary:bucket": "context canceled"}
+    assert updates[0]["bytes"] == 50 and updates[0]["total_bytes"] == 200
+    rc_manager.daemon.call.assert_any_call("job/stop", jobid=3)
+    sync_call = next(c for c in rc_manager.daemon.call.call_args_list if c.args[0] == "sync/sync")
+    assert "_filter" not in sync_call.kwargs
+
+
+def test_get_files_to_transfer_single_listing(rc_manager):
+    """Tests that the missing files are found with one recursive listing of their common folder."""
+    rc_manager.daemon.call.side_effect = lambda command, **params: {
+        "list": [{"Path": "a.csv", "Size": 10}, {"Path": "other/c.csv", "Size": 5}]
+    }
+
+    missing = rc_manager.get_files_to_transfer("primary:bucket/", ["/data/a.csv", "data/b.csv"])
+
+    assert missing == ["data/b.csv"]
+    list_calls = [c for c in rc_manager.daemon.call.call_args_list if c.args[0] == "operations/list"]
+    assert len(list_calls) == 1
+    assert list_calls[0].kwargs["fs"] == "primary:bucket/data"
+
+
+def test_get_files_to_transfer_missing_folder(rc_manager):
+    """Tests that every file is missing when the primary folder does not exist yet."""
+    rc_manager.daemon.call.side_effect = RuntimeError("directory not found")
+
+    assert rc_manager.get_files_to_transfer("primary:bucket/", ["a.csv", "b.csv"]) == ["a.csv", "b.csv"]
+
+
+def test_get_files_to_transfer_detects_stale_copies(rc_manager):
+    """Tests that partial or outdated primary copies are transferred again."""
+    listings = {
+        "primary:bucket": [{"Path": "a.csv", "Size": 10, "ModTime": "2024-01-01T10:00:00Z"},
+                           {"Path": "b.csv", "Size": 3, "ModTime": "2024-01-01T10:00:00Z"},
+                           {"Path": "c.csv", "Size": 7, "ModTime": "2024-01-01T10:00:00Z"}],
+        "secondary:bucket": [{"Path": "a.csv", "Size": 10, "ModTime": "2024-01-01T10:00:00.5Z"},
+                             {"Path": "b.csv", "Size": 8, "ModTime": "2024-01-01T10:00:00Z"},
+                             {"Path": "c.csv", "Size": 7, "ModTime": "2024-03-01T10:00:00Z"}],
+    }
+    rc_manager.daemon.call.side_effect = lambda command, **params: {"list": listings[params["fs"]]}
+
+    files = ["a.csv", "b.csv", "c.csv"]
+    assert rc_manager.get_files_to_transfer("primary:bucket", files, compare_with="secondary:bucket") == ["b.csv"]
+    assert rc_manager.get_files_to_transfer("primary:bucket", files, compare_with="secondary:bucket",
+                                            compare_modtime=True) == ["b.csv", "c.csv"]
+
+
+def test_get_file_sizes_single_listing(rc_manager):
+    """Tests that the sizes of several files come from one listing, keyed by the requested names."""
+    rc_manager.daemon.call.side_effect = lambda command, **params: {
+        "list": [{"Path": "a.csv", "Size": 10}, {"Path": "sub/c.csv", "Size": 5}]
+    }
+
+    sizes = rc_manager.get_file_sizes("secondary:bucket/", ["/data/a.csv", "data/b.csv", "data/sub/c.csv"])
+
+    assert sizes == {"/data/a.csv": 10, "data/sub/c.csv": 5}
+    list_calls = [c for c in rc_manager.daemon.call.call_args_list if c.args[0] == "operations/list"]
+    assert len(list_calls) == 1
+    assert list_calls[0].kwargs["fs"] == "secondary:bucket/data"
+
+
+def test_get_file_sizes_failed_listing(rc_manager):
+    """Tests that a failed listing is reported instead of treating every file as absent."""
+    rc_manager.daemon.call.side_effect = RuntimeError("permission denied")
+
+    assert rc_manager.get_file_sizes("secondary:bucket", ["a.csv"]) is None
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTPS://MinIO.example.org:443/", ("https://minio.example.org", "minio.example.org")),
+    ("http://minio:9000/", ("http://minio:9000", "minio:9000")),
+    ("http://minio:80", ("http://minio", "minio")),
+    ("minio:9000", ("minio:9000", "minio:9000")),
+])
+def test_normalize_endpoint(url, expected):
+    """Tests normalizing scheme, default port and trailing slash of endpoint URLs."""
+    assert normalize_endpoint(url) == expected
+
+
+@pytest.fixture
+def alias_manager(tmp_path, monkeypatch):
+    """Provides an RcloneManager whose config file and dump are controlled by the test."""
+    config_file = tmp_path / "rclone.conf"
+    config_file.write_text("[minio]\n")
+    monkeypatch.setenv("RCLONE_CONFIG", str(config_file))
+
+    mock_daemon = MagicMock(external=False)
+    mock_daemon.call.return_value = {
+        "minio": {"type": "s3", "endpoint": "https://minio.example.org"},
+        "uva": {"type": "s3", "endpoint": "http://storage.uva.nl:9000/"},
+    }
+    manager = RcloneManager(backend="rc", daemon=mock_daemon)
+    manager.config_file_path = config_file
+    return manager
+
+
+def test_get_endpoint_name_uses_cached_index(alias_manager):
+    """Tests that repeated lookups do not dump the config again and match normalized URLs."""
+    assert alias_manager.get_endpoint_name("https://minio.example.org:443/") == "minio"
+    assert alias_manager.get_endpoint_name("storage.uva.nl:9000") == "uva"
+    assert alias_manager.get_endpoint_name("uva") == "uva"
+    assert alias_manager.get_endpoint_name("https://unknown.org") is None
+
+    assert alias_manager.daemon.call.call_count == 1
+
+
+def test_get_endpoint_name_reloads_after_config_change(alias_manager):
+    """Tests that the index is rebuilt when the config file changes."""
+    alias_manager.get_endpoint_name("minio")
+    alias_manager.daemon.call.return_value = {"lifewatch": {"type": "s3", "endpoint": "https://minio.example.org"}}
+
+    config_file = alias_manager.config_file_path
+    config_file.write_text("[lifewatch]\n")
+    os.utime(config_file, ns=(0, config_file.stat().st_mtime_ns + 1_000_000_000))
+
+    assert alias_manager.get_endpoint_name("https://minio.example.org") == "lifewatch"
+
+
+def test_get_endpoint_name_reloads_after_delete_remote(alias_manager):
+    """Tests that removing a remote through this service invalidates the index."""
+    alias_manager.get_endpoint_name("minio")
+    alias_manager.daemon.call.return_value = {}
+
+    alias_manager.delete_remote("minio")
+
+    assert alias_manager.get_endpoint_name("minio") is None
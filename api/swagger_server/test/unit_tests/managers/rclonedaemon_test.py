@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from swagger_server.managers.rclonedaemon import RcloneDaemon, RcloneDaemonError
+
+
+class FakeRcHandler(BaseHTTPRequestHandler):
+    """Answers rc calls like `rclone rcd`, echoing the command and parameters."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        params = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        self.server.calls.append((self.path, self.headers.get("Authorization"), self.client_address[1]))
+
+        if self.path == "/operations/fail":
+            status, body = 500, {"error": "directory not found"}
+        elif self.path == "/sync/slow":
+            time.sleep(0.5)
+            status, body = 200, {}
+        else:
+            status, body = 200, {"command": self.path.lstrip("/"), "params": params}
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def rc_server():
+    """Runs a fake rc server on a free local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRcHandler)
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def daemon(rc_server):
+    """Provides a daemon client for the fake rc server."""
+    client = RcloneDaemon(address=f"127.0.0.1:{rc_server.server_address[1]}", user="u", password="p")
+    yield client
+    client.stop()
+
+
+def test_call_sends_json_with_auth(daemon, rc_server):
+    """Tests that a call posts its parameters to the command path with basic authentication."""
+    result = daemon.call("operations/list", fs="remote:bucket", remote="")
+
+    assert result == {"command": "operations/list", "params": {"fs": "remote:bucket", "remote": ""}}
+    assert rc_server.calls[0][0] == "/operations/list"
+    assert rc_server.calls[0][1] == "Basic dTpw"
+
+
+def test_calls_reuse_keep_alive_connection(daemon, rc_server):
+    """Tests that sequential calls go over one pooled connection."""
+    for _ in range(5):
+        daemon.call("rc/noop")
+
+    assert len({port for _, _, port in rc_server.calls}) == 1
+
+
+def test_call_raises_rclone_error(daemon):
+    """Tests that an rc error response is raised with rclone's message."""
+    with pytest.raises(RuntimeError, match="directory not found"):
+        daemon.call("operations/fail")
+
+
+def test_call_unreachable_daemon():
+    """Tests that an unreachable daemon raises RcloneDaemonError."""
+    client = RcloneDaemon(address="127.0.0.1:1")
+
+    with pytest.raises(RcloneDaemonError):
+        client.call("rc/noop")
+
+
+def test_call_retries_unsent_request_on_fresh_connection(daemon, rc_server):
+    """Tests that a request that could not be sent on a pooled connection closed in the meantime is retried."""
+    daemon.call("rc/noop")
+    daemon._pool.queue[0][0].sock.close()
+
+    assert daemon.call("rc/noop")["command"] == "rc/noop"
+    assert len({port for _, _, port in rc_server.calls}) == 2
+
+
+def test_call_does_not_repeat_sent_request(rc_server):
+    """Tests that a command that was sent but not answered in time is not sent a second time."""
+    client = RcloneDaemon(address=f"127.0.0.1:{rc_server.server_address[1]}", timeout=0.1)
+    client.call("rc/noop")
+
+    with pytest.raises(RcloneDaemonError):
+        client.call("sync/slow")
+    time.sleep(0.5)
+
+    assert [path for path, _, _ in rc_server.calls].count("/sync/slow") == 1
+    client.stop()
+
+
+def test_idle_connections_are_not_reused(rc_server):
+    """Tests that pooled connections idle for longer than the idle timeout are replaced."""
+    client = RcloneDaemon(address=f"127.0.0.1:{rc_server.server_address[1]}", idle_timeout=0)
+    client.call("rc/noop")
+    client.call("rc/noop")
+
+    assert len({port for _, _, port in rc_server.calls}) == 2
+    client.stop()
+
+
+@patch("swagger_server.managers.rclonedaemon.atexit.register")
+@patch("swagger_server.managers.rclonedaemon.subprocess.Popen")
+def test_start_passes_credentials_in_environment(mock_popen, mock_register):
+    """Tests that the rc password is not on the command line and stop is registered once across restarts."""
+    mock_popen.return_value.poll.return_value = 1
+    client = RcloneDaemon()
+
+    for _ in range(2):
+        with pytest.raises(RcloneDaemonError):
+            client.start()
+
+    command, env = mock_popen.call_args.args[0], mock_popen.call_args.kwargs["env"]
+    assert not any(client.password in arg for arg in command)
+    assert env["RCLONE_RC_PASS"] == client.password
+    assert env["RCLONE_RC_USER"] == client.user
+    mock_register.assert_called_once_with(client.stop)
+
+
+@patch("swagger_server.managers.rclonedaemon.subprocess.Popen", side_effect=FileNotFoundError("rclone"))
+def test_ensure_started_backs_off_after_failure(mock_popen):
+    """Tests that a failed start is reported and not retried on every call."""
+    client = RcloneDaemon()
+
+    with pytest.raises(RcloneDaemonError):
+        client.ensure_started()
+    with pytest.raises(RcloneDaemonError):
+        client.ensure_started()
+
+    mock_popen.assert_called_once()
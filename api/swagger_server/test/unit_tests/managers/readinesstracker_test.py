@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from swagger_server.managers.readinesstracker import ReadinessTracker, TooManyWaiters
+
+
+def make_tracker(states):
+    """Provides a tracker over a mocked cache whose readiness is read from `states`."""
+    cache_manager = MagicMock()
+    cache_manager.get_readiness.side_effect = lambda files: {file: states.get(file, "missing") for file in files}
+    return ReadinessTracker(cache_manager, max_workflows=2)
+
+
+def test_wait_returns_at_once_when_ready():
+    """Tests that ready and uncached files of a handled workflow do not block."""
+    tracker = make_tracker({"/a.csv": "ready"})
+    tracker.register("uid-1", ["/a.csv", "/b.csv"])
+
+    assert tracker.wait("uid-1", timeout=5) == (True, {"/a.csv": "ready", "/b.csv": "missing"}, False)
+
+
+def test_wait_wakes_on_notify():
+    """Tests that a waiter returns as soon as the file is marked ready, without polling."""
+    states = {"/a.csv": "staging"}
+    tracker = make_tracker(states)
+
+    def copy():
+        time.sleep(0.1)
+        states["/a.csv"] = "ready"
+        tracker.notify()
+
+    threading.Thread(target=copy).start()
+    started = time.monotonic()
+    ready, readiness, _ = tracker.wait("uid-1", ["/a.csv"], timeout=5)
+
+    assert ready and readiness == {"/a.csv": "ready"}
+    assert time.monotonic() - started < 2
+    # One check before waiting and one after the notification
+    assert tracker.cache_manager.get_readiness.call_count == 2
+
+
+def test_wait_times_out_with_current_state():
+    """Tests that the current state is returned when the files are not ready in time."""
+    tracker = make_tracker({"/a.csv": "staging"})
+
+    assert tracker.wait("uid-1", ["/a.csv"], timeout=0.05) == (False, {"/a.csv": "staging"}, False)
+
+
+def test_wait_for_pending_workflow_until_its_event_is_handled():
+    """Tests that uncached files of a workflow whose event is still queued are waited for."""
+    states = {}
+    tracker = make_tracker(states)
+    tracker.expect("uid-1")
+
+    def handle():
+        time.sleep(0.1)
+        tracker.register("uid-1", ["/a.csv", "/b.csv"])
+        states["/a.csv"] = "ready"
+        tracker.settle("uid-1")
+
+    threading.Thread(target=handle).start()
+
+    # The requested files are waited for even though they are given explicitly
+    assert tracker.wait("uid-1", ["/a.csv"], timeout=5) == (True, {"/a.csv": "ready"}, False)
+    assert tracker.wait("uid-1", timeout=5) == (True, {"/a.csv": "ready", "/b.csv": "missing"}, False)
+
+
+def test_wait_reports_pending_workflow_without_files():
+    """Tests that a queued workflow whose files are not known yet is reported as pending, an unknown one not at all."""
+    tracker = make_tracker({})
+    tracker.expect("uid-1")
+
+    assert tracker.wait("uid-1", timeout=0.05) == (False, {}, True)
+    assert tracker.wait("uid-2", timeout=0.05) is None
+
+    tracker.settle("uid-1")
+    assert tracker.wait("uid-1", timeout=0.05) is None
+
+
+def test_wait_refuses_waiters_beyond_limit():
+    """Tests that only `max_waiters` requests wait at a time."""
+    tracker = make_tracker({"/a.csv": "staging"})
+    tracker.max_waiters = 1
+    waiter = threading.Thread(target=tracker.wait, args=("uid-1", ["/a.csv"], 0.5))
+    waiter.start()
+    time.sleep(0.1)
+
+    with pytest.raises(TooManyWaiters):
+        tracker.wait("uid-1", ["/a.csv"], timeout=0.1)
+    waiter.join()
+    assert tracker.wait("uid-1", ["/a.csv"], timeout=0) == (False, {"/a.csv": "staging"}, False)
+
+
+def test_register_keeps_latest_workflows():
+    """Tests that the files of the most recently registered workflows are kept."""
+    tracker = make_tracker({})
+    tracker.register("uid-1", ["/a.csv"])
+    tracker.register("uid-2", ["/b.csv"])
+    tracker.register("uid-1", ["/a.csv", "/c.csv"])
+    tracker.register("uid-3", ["/d.csv"])
+
+    assert tracker.get_files("uid-1") == ["/a.csv", "/c.csv"]
+    assert tracker.get_files("uid-2") is None
+
+    tracker.forget("uid-1")
+    assert tracker.get_files("uid-1") is None
@@ -0,0 +1,50 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from swagger_server.managers.serviceregistry import ServiceRegistry, ServiceUnavailable, WARMING, READY
+
+
+def test_services_are_built_once_on_first_use():
+    """Tests that nothing is built until the services are needed, and concurrent callers share one build."""
+    factory = MagicMock(side_effect=lambda: time.sleep(0.05) or "services")
+    registry = ServiceRegistry(factory)
+    assert registry.get_status()["state"] == WARMING
+    factory.assert_not_called()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["services"] * 4
+    factory.assert_called_once()
+    assert registry.get_status()["state"] == READY
+
+
+def test_warm_up_runs_in_background():
+    """Tests that warming up returns at once and requests get ServiceUnavailable until it has finished."""
+    release = threading.Event()
+    registry = ServiceRegistry(lambda: release.wait(5) and "services", wait_timeout=0.01)
+
+    registry.warm_up()
+    with pytest.raises(ServiceUnavailable) as error:
+        registry.get()
+    assert error.value.state == WARMING
+
+    release.set()
+    assert registry.get(timeout=5) == "services"
+
+
+def test_failed_warm_up_is_retried():
+    """Tests that a failing build (e.g. MongoDB not up yet) is reported and retried."""
+    factory = MagicMock(side_effect=[RuntimeError("MongoDB unavailable"), "services"])
+    registry = ServiceRegistry(factory, retry_interval=0.05)
+
+    registry.warm_up()
+
+    assert registry.get(timeout=5) == "services"
+    assert registry.get_status()["attempts"] == 2
+    assert registry.get_status()["error"] is None
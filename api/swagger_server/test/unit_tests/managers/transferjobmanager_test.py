@@ -0,0 +1,216 @@
+import threading
+import pytest
+from unittest.mock import MagicMock
+from swagger_server.managers.transferjobmanager import (
+    TransferBudget, TransferJobManager, TransferQueueFull, SUCCEEDED, FAILED, CANCELLED
+)
+
+
+@pytest.fixture
+def rclone_manager():
+    """Creates a mocked RcloneManager whose transfers report progress and succeed."""
+    mock = MagicMock()
+
+    def transfer(operation, source, destination, files, parallel_files, checkers, progress, cancel_event, options,
+                 file_done):
+        progress({"bytes": 100, "total_bytes": 100, "speed": 50.0, "eta": 0, "errors": 0, "retries": 1,
+                  "transferring": [{"name": name} for name in files or []]})
+        return True, {"copied": list(files or []), "unchanged": [], "failed": {}}
+
+    mock.transfer.side_effect = transfer
+    return mock
+
+
+@pytest.fixture
+def job_manager(rclone_manager):
+    """Provides a TransferJobManager with two workers and a budget of eight transfers."""
+    manager = TransferJobManager(rclone_manager, max_workers=2, max_transfers=8, max_queued=3)
+    yield manager
+    manager.shutdown()
+
+
+def test_submit_runs_job(job_manager, rclone_manager):
+    """Tests that a submitted copy runs in the background and records per-file results."""
+    done = MagicMock()
+    job = job_manager.submit("copy", "secondary:bucket/", "primary:bucket/", files=["a.csv", "b.csv"],
+                             parallel_files=4, on_done=done)
+
+    assert job.done_event.wait(timeout=5)
+    status = job.to_dict()
+    assert status["state"] == SUCCEEDED
+    assert status["bytes"] == 100
+    assert status["retries"] == 1
+    assert status["files"] == {"a.csv": SUCCEEDED, "b.csv": SUCCEEDED}
+    done.assert_called_once_with(job)
+    assert rclone_manager.transfer.call_args.kwargs["parallel_files"] == 4
+
+
+def test_done_callbacks_run_once_finished(job_manager, rclone_manager):
+    """Tests that done callbacks run when the job finishes, or at once when it already has."""
+    job = job_manager.submit("copy", "secondary:bucket/", "primary:bucket/", files=["a.csv"])
+    called = threading.Event()
+    before, after = MagicMock(side_effect=lambda _: called.set()), MagicMock()
+    job.add_done_callback(before)
+
+    assert called.wait(timeout=5)
+    before.assert_called_once_with(job)
+    job.add_done_callback(after)
+    after.assert_called_once_with(job)
+
+
+def test_sync_folders_run_as_steps(job_manager, rclone_manager):
+    """Tests that every folder of a sync is transferred in its own step."""
+    job = job_manager.submit("sync", "secondary:", "primary:", folders=["a", "b"])
+
+    assert job.done_event.wait(timeout=5)
+    sources = [c.args[1] for c in rclone_manager.transfer.call_args_list]
+    assert sources == ["secondary:a", "secondary:b"]
+    assert job.bytes == 200 and job.retries == 2
+
+
+def test_batches_run_with_their_own_settings(job_manager, rclone_manager):
+    """Tests that every batch runs as a step with its own transfers and options, within the budget."""
+    batches = [{"files": ["a.csv", "b.csv"], "parallel_files": 32, "checkers": 32, "options": {}},
+               {"files": ["big.bin"], "parallel_files": 2, "checkers": 8, "options": {"multi_thread_streams": 8}}]
+
+    job = job_manager.submit("copy", "secondary:", "primary:", batches=batches)
+
+    assert job.done_event.wait(timeout=5)
+    calls = [c.kwargs for c in rclone_manager.transfer.call_args_list]
+    assert [c["parallel_files"] for c in calls] == [8, 2]  # 32 is capped to the budget of 8
+    assert calls[1]["options"] == {"multi_thread_streams": 8}
+    assert job.to_dict()["files"] == {"a.csv": SUCCEEDED, "b.csv": SUCCEEDED, "big.bin": SUCCEEDED}
+    assert job_manager.budget.in_use == 0
+
+
+def test_files_are_reported_as_they_arrive(job_manager, rclone_manager):
+    """Tests that the job reports a file as soon as the transfer says it has arrived."""
+    arrived = []
+
+    def transfer(operation, source, destination, files, parallel_files, checkers, progress, cancel_event, options,
+                 file_done):
+        file_done("a.csv", None)
+        arrived.append(progress.__self__.to_dict()["files"]["a.csv"])
+        return True, {"copied": ["a.csv"], "unchanged": [], "failed": {}}
+
+    rclone_manager.transfer.side_effect = transfer
+    on_file = MagicMock()
+    job = job_manager.submit("copy", "secondary:", "primary:", files=["a.csv", "b.csv"], on_file=on_file)
+
+    assert job.done_event.wait(timeout=5)
+    assert arrived == [SUCCEEDED]  # while the transfer was still running
+    on_file.assert_called_once_with("a.csv", None)
+
+
+def test_failed_files_fail_the_job(job_manager, rclone_manager):
+    """Tests that a file that failed to copy fails the job."""
+    rclone_manager.transfer.side_effect = None
+    rclone_manager.transfer.return_value = (False, {"copied": ["a.csv"], "unchanged": [],
+                                                    "failed": {"b.csv": "permission denied"}})
+
+    job = job_manager.submit("copy", "secondary:", "primary:", files=["a.csv", "b.csv"])
+
+    assert job.done_event.wait(timeout=5)
+    assert job.state == FAILED
+    assert job.to_dict()["files"] == {"a.csv": SUCCEEDED, "b.csv": FAILED}
+
+
+def test_cancel_running_job(job_manager, rclone_manager):
+    """Tests that cancelling a running job stops its transfer."""
+    started = threading.Event()
+
+    def transfer(operation, source, destination, files, parallel_files, checkers, progress, cancel_event, options,
+                 file_done):
+        started.set()
+        cancel_event.wait(timeout=5)
+        return False, {"copied": [], "unchanged": [], "failed": {"a.csv": "context canceled"}}
+
+    rclone_manager.transfer.side_effect = transfer
+    job = job_manager.submit("copy", "secondary:", "primary:", files=["a.csv"])
+    assert started.wait(timeout=5)
+
+    assert job_manager.cancel(job.id)
+    assert job.done_event.wait(timeout=5)
+    assert job.state == CANCELLED
+    assert not job_manager.cancel(job.id)
+
+
+def test_job_cancelled_before_its_first_step_settles_its_files(job_manager, rclone_manager):
+    """Tests that the files of a job cancelled before it ran are cancelled and absent from its results."""
+    done = MagicMock()
+    job_manager.budget.in_use = job_manager.budget.total
+    job = job_manager.submit("copy", "secondary:bucket/", "primary:bucket/", files=["a.csv"], on_done=done)
+
+    job_manager.cancel(job.id)
+    assert job.done_event.wait(timeout=5)
+
+    assert job.to_dict()["files"] == {"a.csv": CANCELLED}
+    assert done.call_args.args[0].results == {"copied": [], "unchanged": [], "failed": {}}
+    rclone_manager.transfer.assert_not_called()
+
+
+def test_queue_limit(rclone_manager):
+    """Tests that submissions beyond max_queued unfinished jobs are refused."""
+    release = threading.Event()
+    rclone_manager.transfer.side_effect = lambda *args, **kwargs: (release.wait(timeout=5), {
+        "copied": [], "unchanged": [], "failed": {}})
+    manager = TransferJobManager(rclone_manager, max_workers=1, max_transfers=4, max_queued=2)
+
+    manager.submit("copy", "a:", "b:", files=["1"])
+    manager.submit("copy", "a:", "b:", files=["2"])
+    with pytest.raises(TransferQueueFull):
+        manager.submit("copy", "a:", "b:", files=["3"])
+
+    release.set()
+    manager.shutdown()
+
+
+def test_budget_caps_requests_and_wakes_waiters():
+    """Tests that a job waits for free slots and that oversized requests are capped to the total."""
+    budget = TransferBudget(8)
+    assert budget.acquire(6) == 6
+
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(budget.acquire(16)))
+    waiter.start()
+    waiter.join(timeout=0.2)
+    assert not granted
+
+    budget.release(6)
+    waiter.join(timeout=5)
+    assert granted == [8]
+    assert budget.in_use == 8
+
+
+def test_budget_serves_waiters_in_order():
+    """Tests that a request for many slots is not overtaken by later, smaller requests."""
+    budget = TransferBudget(8)
+    budget.acquire(6)
+    granted = []
+
+    large = threading.Thread(target=lambda: granted.append(("large", budget.acquire(8))), daemon=True)
+    large.start()
+    large.join(timeout=0.1)
+    small = threading.Thread(target=lambda: granted.append(("small", budget.acquire(2))), daemon=True)
+    small.start()
+    small.join(timeout=0.1)
+
+    # The two free slots would fit the small request, but the large one asked first
+    assert granted == []
+    budget.release(6)
+    large.join(timeout=5)
+    assert granted == [("large", 8)]
+
+    budget.release(8)
+    small.join(timeout=5)
+    assert granted == [("large", 8), ("small", 2)]
+
+
+def test_budget_wait_is_cancellable():
+    """Tests that a cancelled job stops waiting for slots."""
+    budget = TransferBudget(4)
+    budget.acquire(4)
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    assert budget.acquire(2, cancel_event) == 0
@@ -0,0 +1,40 @@
+import pytest
+from swagger_server.managers.transfermetrics import TransferMetrics
+
+
+def test_record_aggregates_routes_and_endpoints():
+    """Tests that transfers are summed per route and per endpoint, with throughput while busy."""
+    metrics = TransferMetrics()
+    metrics.record("secondary", "primary", {"bytes": 1000, "transfers": 2, "errors": 1, "retries": 3}, 10)
+    metrics.record("secondary", "primary", {"bytes": 3000, "transfers": 1}, 10)
+    metrics.record("primary", "backup", {"bytes": 500, "transfers": 1}, 5)
+
+    snapshot = metrics.snapshot()
+    route = next(r for r in snapshot["routes"] if r["destination"] == "primary")
+    assert route["transfers"] == 2 and route["files"] == 3
+    assert route["bytes"] == 4000 and route["throughput"] == 200
+    assert route["errors"] == 1 and route["retries"] == 3
+    assert route["peak_speed"] == 300
+
+    primary = next(e for e in snapshot["endpoints"] if e["endpoint"] == "primary")
+    assert primary["bytes_written"] == 4000 and primary["written_throughput"] == 200
+    assert primary["bytes_read"] == 500 and primary["read_throughput"] == 100
+
+
+def test_average_speed_is_smoothed():
+    """Tests that the route speed is an exponential moving average over transfers."""
+    metrics = TransferMetrics(smoothing=0.5)
+    metrics.record("a", "b", {"bytes": 100}, 1)
+    metrics.record("a", "b", {"bytes": 300}, 1)
+    metrics.record("a", "b", {}, 1)  # Transfers that moved nothing do not lower the rate
+
+    assert metrics.snapshot()["routes"][0]["average_speed"] == pytest.approx(200)
+
+
+def test_reset():
+    """Tests that reset forgets all routes."""
+    metrics = TransferMetrics()
+    metrics.record("a", "b", {"bytes": 100}, 1)
+    metrics.reset()
+
+    assert metrics.snapshot()["routes"] == []
@@ -0,0 +1,67 @@
+from swagger_server.managers.transfertuner import TransferTuner, MIB, split_into_windows
+
+
+def test_small_files_get_many_transfers():
+    """Tests that a batch of small files is copied with many parallel transfers, capped to the file count."""
+    tuner = TransferTuner()
+    batches = tuner.plan({f"file{i}.csv": 1000 for i in range(50)})
+
+    assert len(batches) == 1
+    assert batches[0]["parallel_files"] == 32
+    assert batches[0]["options"] == {}
+
+    assert tuner.plan({"a.csv": 1000, "b.csv": 2000})[0]["parallel_files"] == 2
+
+
+def test_large_files_get_multi_thread_settings():
+    """Tests that a batch of large files is copied with few transfers and parallel chunks."""
+    batches = TransferTuner().plan({"a.bin": 500 * MIB, "b.bin": 800 * MIB})
+
+    assert len(batches) == 1
+    assert batches[0]["parallel_files"] == 2
+    assert batches[0]["options"]["multi_thread_streams"] == 8
+    assert batches[0]["options"]["s3_chunk_size"] == 64 * MIB
+
+
+def test_mixed_sizes_are_split():
+    """Tests that a mix of small and large files is split into two batches, unknown sizes counting as small."""
+    batches = TransferTuner(large_file_threshold=10 * MIB).plan(
+        {"a.csv": 1000, "big.bin": 100 * MIB, "b.csv": None, "c.csv": 5 * MIB})
+
+    assert [batch["files"] for batch in batches] == [["a.csv", "b.csv", "c.csv"], ["big.bin"]]
+
+
+def test_preserve_order_splits_into_consecutive_runs():
+    """Tests that preserving the order gives one batch per run of small or large files."""
+    batches = TransferTuner(large_file_threshold=10 * MIB).plan(
+        {"big1.bin": 100 * MIB, "a.csv": 1000, "b.csv": 1000, "big2.bin": 100 * MIB}, preserve_order=True)
+
+    assert [batch["files"] for batch in batches] == [["big1.bin"], ["a.csv", "b.csv"], ["big2.bin"]]
+
+
+def test_split_into_windows():
+    """Tests that batches are cut into consecutive windows of twice their transfers, keeping their settings."""
+    batch = {"files": [f"file{i}" for i in range(5)], "parallel_files": 2, "checkers": 8, "options": {"x": 1}}
+
+    windows = split_into_windows([batch])
+
+    assert [window["files"] for window in windows] == [["file0", "file1", "file2", "file3"], ["file4"]]
+    assert all(window["options"] == {"x": 1} for window in windows)
+    assert split_into_windows([batch], window=0) == [batch]
+
+
+def test_endpoint_overrides():
+    """Tests that the overrides of the source and the destination endpoint apply, destination last."""
+    tuner = TransferTuner(small={"transfers": 16}, endpoints={
+        "secondary": {"large": {"multi_thread_streams": 4, "s3_upload_concurrency": 2}},
+        "primary": {"large": {"s3_upload_concurrency": 6}},
+    })
+
+    small = tuner.plan({f"file{i}": 1 for i in range(20)}, "secondary:bucket/", "primary:bucket/")[0]
+    large = tuner.plan({"a.bin": 500 * MIB}, "secondary:bucket/", "primary:bucket/")[0]
+    other = tuner.plan({"a.bin": 500 * MIB}, "other:bucket/", "primary:bucket/")[0]
+
+    assert small["parallel_files"] == 16
+    assert large["options"]["multi_thread_streams"] == 4
+    assert large["options"]["s3_upload_concurrency"] == 6
+    assert other["options"]["multi_thread_streams"] == 8
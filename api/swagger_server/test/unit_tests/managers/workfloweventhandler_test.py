@@ -2,6 +2,9 @@ import pytest
 from unittest.mock import MagicMock, patch
 from swagger_server.managers.workfloweventhandler import WorkflowEventHandler
 from swagger_server.managers.argofileextractor import parse_argo_workflow
+from swagger_server.managers.eventcoalescer import EventCoalescer
+from swagger_server.managers.eventdeduplicator import EventDeduplicator
+from swagger_server.managers.stagingcontext import StagingContext
 
 
 @pytest.fixture
@@ -9,11 +12,6 @@ def mock_cache_manager():
     """Creates a fully mocked CacheManager instance."""
     mock = MagicMock()
     mock.rclone_manager.get_endpoint_name.side_effect = lambda x: x  # Returns the endpoint name as is
-    mock.set_primary_endpoint.return_value = None
-    mock.set_secondary_endpoint.return_value = None
-    mock.set_primary_folder.return_value = None
-    mock.set_secondary_folder.return_value = None
-    mock.set_files.return_value = None
     mock.start.return_value = None
     return mock
 
@@ -43,15 +41,11 @@ def test_handle_workflow_event_success(mock_parse_argo_workflow, workflow_event_
     # Ensure parse_argo_workflow is called correctly
     mock_parse_argo_workflow.assert_called_once_with(workflow_json)
 
-    # Ensure CacheManager setters are called with correct values
-    mock_cache_manager.set_primary_endpoint.assert_called_once_with("s3://primary-bucket:")
-    mock_cache_manager.set_secondary_endpoint.assert_called_once_with("s3://secondary-bucket:")
-    mock_cache_manager.set_primary_folder.assert_called_once_with("primary-folder")
-    mock_cache_manager.set_secondary_folder.assert_called_once_with("secondary-folder")
-    mock_cache_manager.set_files.assert_called_once_with(["file1.txt", "file2.csv"])
-
-    # Ensure cache synchronization starts
-    mock_cache_manager.start.assert_called_once()
+    # Ensure cache synchronization starts with the context of the event
+    mock_cache_manager.start.assert_called_once_with(StagingContext(
+        "s3://primary-bucket:", "primary-folder", "s3://secondary-bucket:", "secondary-folder",
+        ("file1.txt", "file2.csv")
+    ))
 
 
 @patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
@@ -73,15 +67,8 @@ def test_handle_workflow_event_missing_fields(mock_parse_argo_workflow, workflow
     # Ensure parse_argo_workflow is called
     mock_parse_argo_workflow.assert_called_once_with(workflow_json)
 
-    # Ensure CacheManager setters are still called but with `None` or empty values
-    mock_cache_manager.set_primary_endpoint.assert_called_once_with("None:")
-    mock_cache_manager.set_secondary_endpoint.assert_called_once_with("None:")
-    mock_cache_manager.set_primary_folder.assert_called_once_with(None)
-    mock_cache_manager.set_secondary_folder.assert_called_once_with(None)
-    mock_cache_manager.set_files.assert_called_once_with([])
-
-    # Ensure cache synchronization starts
-    mock_cache_manager.start.assert_called_once()
+    # Ensure cache synchronization still starts, with "None:" endpoints and empty folders
+    mock_cache_manager.start.assert_called_once_with(StagingContext("None:", "", "None:", ""))
 
 
 @patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
@@ -100,10 +87,10 @@ def test_handle_workflow_event_no_files(mock_parse_argo_workflow, workflow_event
     workflow_event_handler.handle_workflow_event(workflow_json)
 
     mock_parse_argo_workflow.assert_called_once_with(workflow_json)
-    mock_cache_manager.set_files.assert_called_once_with([])
 
     # Ensure cache synchronization still starts
     mock_cache_manager.start.assert_called_once()
+    assert mock_cache_manager.start.call_args[0][0].files == ()
 
 
 @patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
@@ -119,11 +106,157 @@ def test_handle_workflow_event_invalid_json(mock_parse_argo_workflow, workflow_e
     mock_parse_argo_workflow.assert_called_once_with(workflow_json)
 
     # Ensure CacheManager was still called with "None:"
-    mock_cache_manager.set_primary_endpoint.assert_called_once_with("None:")
-    mock_cache_manager.set_secondary_endpoint.assert_called_once_with("None:")
-    mock_cache_manager.set_primary_folder.assert_called_once_with(None)
-    mock_cache_manager.set_secondary_folder.assert_called_once_with(None)
-    mock_cache_manager.set_files.assert_called_once_with([])
+    mock_cache_manager.start.assert_called_once_with(StagingContext("None:", "", "None:", ""))
+
+
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_pins_running_workflow(mock_parse_argo_workflow, workflow_event_handler,
+                                                     mock_cache_manager):
+    """Tests that a running workflow stages its files on behalf of its uid, so they are pinned."""
+    mock_parse_argo_workflow.return_value = {
+        "unique_id": "uid-1",
+        "status": "RUNNING",
+        "primary_endpoint": "s3://primary-bucket",
+        "secondary_endpoint": "s3://secondary-bucket",
+        "files": ["file1.txt"],
+    }
+
+    workflow_event_handler.handle_workflow_event({"workflow": "mocked-data"})
+
+    mock_cache_manager.start.assert_called_once()
+    assert mock_cache_manager.start.call_args[0][0].workflow_uid == "uid-1"
+    mock_cache_manager.release_pins.assert_not_called()
+
+
+@pytest.mark.parametrize("status", ["SUCCEEDED", "FAILED", "ERROR"])
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_releases_pins_on_terminal_phase(mock_parse_argo_workflow, status,
+                                                               workflow_event_handler, mock_cache_manager):
+    """Tests that a workflow in a terminal phase releases its pins without staging files."""
+    mock_parse_argo_workflow.return_value = {
+        "unique_id": "uid-1",
+        "status": status,
+        "files": ["file1.txt"],
+    }
+
+    workflow_event_handler.handle_workflow_event({"workflow": "mocked-data"})
+
+    mock_cache_manager.release_pins.assert_called_once_with("uid-1")
+    mock_cache_manager.start.assert_not_called()
+
+
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_registers_folder_with_reconciler(mock_parse_argo_workflow, mock_cache_manager):
+    """Tests that a configured reconciler takes the primary folder sync off the event path."""
+    reconciler = MagicMock()
+    handler = WorkflowEventHandler(cache_manager=mock_cache_manager, cache_reconciler=reconciler)
+    mock_parse_argo_workflow.return_value = {
+        "primary_endpoint": "s3://primary-bucket",
+        "secondary_endpoint": "s3://secondary-bucket",
+        "primary_folder": "primary-folder",
+        "secondary_folder": "secondary-folder",
+        "files": ["file1.txt"],
+    }
+
+    handler.handle_workflow_event({"workflow": "mocked-data"})
 
-    # Ensure cache synchronization does not start
+    reconciler.register.assert_called_once_with("s3://primary-bucket:", "primary-folder")
+    mock_cache_manager.sync_cache.assert_not_called()
     mock_cache_manager.start.assert_called_once()
+
+
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_skips_unchanged_updates(mock_parse_argo_workflow, mock_cache_manager):
+    """Tests that repeated UPDATE events of a workflow do not stage its files again."""
+    handler = WorkflowEventHandler(cache_manager=mock_cache_manager, event_deduplicator=EventDeduplicator())
+    job = MagicMock()
+    job.done_event.is_set.return_value = False
+    mock_cache_manager.start.return_value = job
+    event = {"unique_id": "uid-1", "resource_version": "1", "status": "RUNNING", "primary_endpoint": "p",
+             "secondary_endpoint": "s", "files": ["file1.txt"]}
+
+    mock_parse_argo_workflow.return_value = event
+    assert handler.handle_workflow_event({}) is job
+    mock_parse_argo_workflow.return_value = dict(event, resource_version="2", status="PENDING")
+    assert handler.handle_workflow_event({}) is job
+
+    job.done_event.is_set.return_value = True
+    assert handler.handle_workflow_event({}) is None
+    mock_cache_manager.start.assert_called_once()
+
+    # A changed file set is staged again
+    mock_parse_argo_workflow.return_value = dict(event, resource_version="3", files=["file1.txt", "file2.csv"])
+    handler.handle_workflow_event({})
+    assert mock_cache_manager.start.call_count == 2
+
+
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_refreshes_pins_of_running_workflow(mock_parse_argo_workflow, mock_cache_manager):
+    """Tests that every event of a running workflow renews its pins, even when it is skipped as unchanged."""
+    handler = WorkflowEventHandler(cache_manager=mock_cache_manager, event_deduplicator=EventDeduplicator())
+    event = {"unique_id": "uid-1", "resource_version": "1", "status": "RUNNING", "primary_endpoint": "p",
+             "secondary_endpoint": "s", "files": ["file1.txt"]}
+
+    mock_parse_argo_workflow.return_value = event
+    handler.handle_workflow_event({})
+    mock_parse_argo_workflow.return_value = dict(event, resource_version="2")
+    handler.handle_workflow_event({})
+
+    mock_cache_manager.start.assert_called_once()
+    assert mock_cache_manager.refresh_pins.call_count == 2
+
+    mock_parse_argo_workflow.return_value = dict(event, resource_version="3", status="SUCCEEDED")
+    handler.handle_workflow_event({})
+    assert mock_cache_manager.refresh_pins.call_count == 2
+
+    # Events handled by the event queue skip `handle_workflow_event`
+    handler.handle_workflow_data(dict(event, resource_version="4"))
+    assert mock_cache_manager.refresh_pins.call_count == 3
+
+
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_retries_failed_events(mock_parse_argo_workflow, mock_cache_manager):
+    """Tests that an event whose handling failed is not treated as handled."""
+    handler = WorkflowEventHandler(cache_manager=mock_cache_manager, event_deduplicator=EventDeduplicator())
+    mock_parse_argo_workflow.return_value = {"unique_id": "uid-1", "resource_version": "1", "files": ["file1.txt"]}
+    mock_cache_manager.start.side_effect = [RuntimeError("MongoDB unavailable"), None]
+
+    with pytest.raises(RuntimeError):
+        handler.handle_workflow_event({})
+    handler.handle_workflow_event({})
+
+    assert mock_cache_manager.start.call_count == 2
+
+
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_passes_through_coalescer(mock_parse_argo_workflow, mock_cache_manager):
+    """Tests that parsed events are handed to the coalescer, which runs the deduplicated handling."""
+    coalescer = MagicMock(wraps=EventCoalescer(window=0))
+    handler = WorkflowEventHandler(cache_manager=mock_cache_manager, event_coalescer=coalescer)
+    event = {"unique_id": "uid-1", "status": "RUNNING", "primary_endpoint": "p", "secondary_endpoint": "s",
+             "files": ["file1.txt"]}
+    mock_parse_argo_workflow.return_value = event
+
+    handler.handle_workflow_event({})
+
+    coalescer.submit.assert_called_once_with("uid-1", event, handler.handle_workflow_data)
+    mock_cache_manager.start.assert_called_once()
+    assert mock_cache_manager.start.call_args[0][0].files == ("file1.txt",)
+
+
+@patch("swagger_server.managers.workfloweventhandler.parse_argo_workflow")
+def test_handle_workflow_event_keeps_workflow_pending_while_handled(mock_parse_argo_workflow, workflow_event_handler,
+                                                                    mock_cache_manager):
+    """Tests that steps of a workflow wait for its files while its event is handled, even if handling fails."""
+    tracker = mock_cache_manager.readiness_tracker
+    mock_parse_argo_workflow.return_value = {"unique_id": "uid-1", "status": "RUNNING", "files": ["file1.txt"]}
+    mock_cache_manager.start.side_effect = lambda context: tracker.settle.assert_not_called()
+
+    workflow_event_handler.handle_workflow_event({})
+    mock_cache_manager.start.side_effect = RuntimeError("MongoDB unavailable")
+    with pytest.raises(RuntimeError):
+        workflow_event_handler.handle_workflow_event({})
+
+    assert tracker.expect.call_count == 2
+    assert tracker.settle.call_count == 2
+    tracker.settle.assert_called_with("uid-1")
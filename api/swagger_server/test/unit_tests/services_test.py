@@ -0,0 +1,35 @@
+import runpy
+from unittest.mock import patch
+from swagger_server import services as services_module
+from swagger_server.controllers import health_controller, workflow_controller
+
+
+@patch("waitress.serve")
+@patch("connexion.App")
+def test_python_m_swagger_server_warms_up_the_services_of_the_controllers(mock_app, mock_serve, monkeypatch):
+    """Tests that starting the app like the Dockerfile (`python -m swagger_server`) warms up the registry the
+    controllers answer from, rather than a second copy created by running `__main__` as a script."""
+    monkeypatch.setenv("API_SERVER", "waitress")
+    with patch.object(services_module.services, "warm_up") as warm_up:
+        runpy.run_module("swagger_server", run_name="__main__")
+
+        warm_up.assert_called_once()
+        assert workflow_controller.services is services_module.services
+        assert health_controller.services is services_module.services
+    mock_serve.assert_called_once()
+    assert mock_serve.call_args.args == (mock_app.return_value.app,)
+
+
+@patch("connexion.App")
+def test_dev_reloader_warms_up_only_in_the_serving_process(mock_app, monkeypatch):
+    """Tests that the reloader's parent process, which only restarts the server, builds no services."""
+    monkeypatch.setenv("API_SERVER", "dev")
+    monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+    with patch.object(services_module.services, "warm_up") as warm_up:
+        runpy.run_module("swagger_server", run_name="__main__")
+        warm_up.assert_not_called()
+
+        monkeypatch.setenv("WERKZEUG_RUN_MAIN", "true")
+        runpy.run_module("swagger_server", run_name="__main__")
+        warm_up.assert_called_once()
+    assert mock_app.return_value.run.call_count == 2
@@ -0,0 +1,253 @@
+"""
+Load benchmark for the workflow event endpoint: events per second for a growing number of server threads.
+
+Without --url, the benchmark builds the service itself, like `python -m swagger_server` does: the app from
+swagger.yaml and the real managers (cache, rclone daemon, transfer jobs, dedupe, coalescing, readiness),
+served from waitress. Every thread count gets a new service in a process of its own. Only the surroundings
+of a deployment are replaced: both endpoints are rclone alias remotes of local folders, MongoDB is an
+in-memory mongomock database and the settings are encrypted with a local key instead of one from AWS
+Secrets Manager. `rclone` must be on the PATH and `mongomock` (with pymongo < 4.9) installed.
+
+With --url, the events are posted to a running service and --threads only labels the result.
+
+    python serving_benchmark.py --threads 1,2,4,8,16 --events 800
+    python serving_benchmark.py --url http://localhost:8080/workflow/event --api-key <key> --events 800
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+FILES_PER_SET = 3
+
+
+def workflow_event(index: int, sets: int) -> bytes:
+    """An Argo ADD event of a workflow of its own, asking for the files of one of `sets` file sets."""
+    files = [f"set-{index % sets}/file-{n}.csv" for n in range(FILES_PER_SET)]
+    return json.dumps({"type": "ADD", "body": {
+        "metadata": {"uid": f"benchmark-{index}", "resourceVersion": "1",
+                     "labels": {"workflows.argoproj.io/phase": "Running"}},
+        "spec": {"arguments": {"parameters": [
+            {"name": "files", "value": json.dumps(files)},
+            {"name": "primary_endpoint", "value": "primary"},
+            {"name": "secondary_endpoint", "value": "secondary"},
+            {"name": "primary_folder", "value": "/data"},
+            {"name": "secondary_folder", "value": "/data"},
+        ]}},
+    }}).encode()
+
+
+def prepare_local_service(workdir: str, file_sets: int, file_size: int, queue: bool) -> str:
+    """
+    Writes the file sets, rclone remotes and encrypted settings of a local service to `workdir` and points
+    the managers at them and at an in-memory MongoDB. Returns the API key the app accepts.
+    """
+    import mongomock
+    from cryptography.fernet import Fernet
+    from swagger_server.managers import cachemanager, mongodbmanager
+
+    for set_index in range(file_sets):
+        folder = os.path.join(workdir, "secondary", "data", f"set-{set_index}")
+        os.makedirs(folder)
+        for n in range(FILES_PER_SET):
+            with open(os.path.join(folder, f"file-{n}.csv"), "wb") as file:
+                file.write(os.urandom(file_size))
+    os.makedirs(os.path.join(workdir, "primary", "data"))
+
+    # The service, and the rclone daemon it starts, use this config file
+    os.environ["RCLONE_CONFIG"] = os.path.join(workdir, "rclone.conf")
+    for name in ("primary", "secondary"):
+        subprocess.run(["rclone", "config", "create", name, "alias", "remote", os.path.join(workdir, name)],
+                       check=True, capture_output=True)
+
+    # The remotes are configured above, so the settings only hold the cache settings
+    key = Fernet.generate_key()
+    settings = {"caches": {"LRUCache": {"event_queue": {"enabled": queue}}}}
+    with open(os.path.join(workdir, "replication_settings.json.enc"), "wb") as file:
+        file.write(Fernet(key).encrypt(json.dumps(settings).encode()))
+
+    # Room for every file, so the passes admit files instead of rejecting them
+    client = mongomock.MongoClient()
+    client["benchmark"]["cacheState"].insert_one({
+        "_id": "LRUCache", "capacity_bytes": 2 * file_sets * FILES_PER_SET * file_size, "current_bytes": 0
+    })
+    mongodbmanager._shared_clients["replicationDB_secret"] = (client, "benchmark")
+    cachemanager.get_aws_secret = lambda secret_name: {"decryption-key": key.decode()}
+
+    # The API key check of swagger.yaml is not part of this tree; accept one generated key instead
+    api_key = Fernet.generate_key().decode()
+    authorization = types.ModuleType("swagger_server.controllers.authorization_controller")
+    authorization.check_apiKeyAuth = lambda value, required_scopes=None: {"sub": "benchmark"} \
+        if value == api_key else None
+    sys.modules.setdefault(authorization.__name__, authorization)
+
+    # CacheManager reads replication_settings.json.enc from the working directory
+    os.chdir(workdir)
+    return api_key
+
+
+def serve_local(threads: int):
+    """Starts waitress with the app on a free port; returns the server, its loop thread and the event URL."""
+    from waitress.server import create_server
+    from swagger_server.__main__ import create_app
+
+    # waitress warns about its task queue depth whenever all threads are busy, which is the point here
+    logging.getLogger("waitress").setLevel(logging.ERROR)
+    server = create_server(create_app().app, host="127.0.0.1", port=0, threads=threads, connection_limit=1000)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, thread, f"http://127.0.0.1:{server.effective_port}/workflow/event"
+
+
+def stop_local(server, thread) -> None:
+    """Stops waitress; its sockets are closed from its own loop thread, which is still polling them."""
+    from waitress import wasyncore
+
+    server.task_dispatcher.shutdown()
+    server.trigger.pull_trigger(lambda: wasyncore.close_all(server._map))
+    thread.join()
+
+
+def wait_until_idle(current) -> int:
+    """Waits until the local service has handled its queued events and finished its copies; returns the
+    number of copy jobs that failed."""
+    from swagger_server.managers.transferjobmanager import FAILED, QUEUED, RUNNING
+
+    def busy():
+        if current.event_queue is not None:
+            stats = current.event_queue.get_stats()
+            if stats["queued"] or stats["running"]:
+                return True
+        jobs = current.transfer_job_manager
+        return bool(jobs.list_jobs(QUEUED) or jobs.list_jobs(RUNNING))
+
+    while busy():
+        time.sleep(0.05)
+    return len(current.transfer_job_manager.list_jobs(FAILED))
+
+
+def run_load(url: str, events: int, concurrency: int, sets: int, offset: int = 0, api_key: str = None) -> dict:
+    """Posts `events` events with `concurrency` clients; returns the throughput and latency percentiles."""
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["X-API-KEY"] = api_key
+
+    def post(index):
+        started = time.perf_counter()
+        request = urllib.request.Request(url, data=workflow_event(offset + index, sets), headers=headers)
+        error = None
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            error = f"{e.code}: {e.read().decode(errors='replace')}"
+        return time.perf_counter() - started, error
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(post, range(events)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = [error for _, error in results if error]
+    return {"events_per_second": events / elapsed,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+            "errors": len(errors), "first_error": errors[0] if errors else None}
+
+
+@contextlib.contextmanager
+def service_output(verbose: bool):
+    """Hides what the local service prints, unless `verbose`."""
+    if verbose:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Event endpoint of a running service (default: serve a local one)")
+    parser.add_argument("--api-key", help="API key of the running service")
+    parser.add_argument("--threads", default="1,2,4,8,16", help="Comma separated server thread counts")
+    parser.add_argument("--events", type=int, default=800, help="Events posted per run")
+    parser.add_argument("--concurrency", type=int, default=32, help="Clients posting at the same time")
+    parser.add_argument("--sets", type=int, default=50, help="File sets the events ask for")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="Bytes per file of the local service")
+    parser.add_argument("--queue", action="store_true",
+                        help="Queue the events of the local service instead of handling them in the request")
+    parser.add_argument("--verbose", action="store_true", help="Show the log output of the local service")
+    parser.add_argument("--no-header", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    thread_counts = [int(count) for count in args.threads.split(",")]
+    if not args.no_header:
+        print(f"{'threads':>8} {'events/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}", flush=True)
+
+    if args.url is None and len(thread_counts) > 1:
+        # Every thread count gets a local service of its own, like a restart with another API_THREADS;
+        # a shared one would carry the cache entries of the earlier runs into the later ones
+        arguments = ["--events", str(args.events), "--concurrency", str(args.concurrency), "--sets", str(args.sets),
+                     "--file-size", str(args.file_size), "--no-header"]
+        arguments += ["--queue"] * args.queue + ["--verbose"] * args.verbose
+        for threads in thread_counts:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--threads", str(threads), *arguments],
+                           check=True)
+        return
+
+    api_key = args.api_key
+    workdir = current = None
+    if args.url is None:
+        from swagger_server.services import services
+
+        workdir = tempfile.TemporaryDirectory(prefix="serving-benchmark-")
+        api_key = prepare_local_service(workdir.name, args.sets, args.file_size, args.queue)
+        with service_output(args.verbose):
+            current = services.get()
+
+    try:
+        for run, threads in enumerate(thread_counts):
+            server = None
+            url = args.url
+            if url is None:
+                server, thread, url = serve_local(threads)
+            try:
+                # Every run uses new workflow uids, so the dedupe of the service skips none of them
+                with service_output(args.verbose):
+                    result = run_load(url, args.events, args.concurrency, args.sets, offset=run * args.events,
+                                      api_key=api_key)
+                    # Copies still running would count towards the next run, or be cut off by the cleanup
+                    failed = wait_until_idle(current) if current is not None else 0
+            finally:
+                if server is not None:
+                    stop_local(server, thread)
+            print(f"{threads:>8} {result['events_per_second']:>10.1f} {result['p50_ms']:>8.1f} "
+                  f"{result['p95_ms']:>8.1f} {result['errors']:>7}")
+            if result["first_error"]:
+                print(f"[WARNING] First failed request: {result['first_error']}")
+            if failed:
+                print(f"[WARNING] {failed} copy jobs of the local service failed")
+    finally:
+        if current is not None:
+            if current.event_queue is not None:
+                current.event_queue.shutdown()
+            current.transfer_job_manager.shutdown()
+        if workdir is not None:
+            os.chdir(os.path.dirname(os.path.abspath(__file__)))
+            workdir.cleanup()
+
+if __name__ == "__main__":
+    main()